@@ -0,0 +1,157 @@
+# audio_features.py
+"""
+Per-frame audio features for the avatar UIs, computed once on the server over each TTS chunk
+(vectorized NumPy) instead of a 2048-point analyser + RMS loop per animation frame on every
+display. Frames are FRAME_MS long and aligned to the message's PCM: frame i covers samples
+[i*F, (i+1)*F) from the first sample of the tts_begin/tts_end message, across chunks.
+
+Per chunk a FeatureStream produces:
+  intensity - rms (0-100 per frame) and band energies (0-100, nb bands per frame, row-major)
+  viseme    - viseme changes (each holds until the next): phoneme-aligned when KPipeline
+              results carry tokens with timings, else estimated from the spectrum
+`at` fields are seconds of audio from the start of the message (see ui/src/types.ts).
+"""
+import os
+import numpy as np
+
+FRAME_MS = int(os.getenv("ELYSIA_FEATURE_FRAME_MS", "20"))
+# Band edges in Hz: 8 log-ish bands over the speech range
+BAND_HZ = (0, 150, 300, 600, 1200, 2400, 4000, 6000, 12000)
+RMS_GAIN = 5.0       # rms 0.2 (a loud vowel) -> full scale
+DB_FLOOR = -70.0     # band energy dB mapped to 0..100 over [DB_FLOOR, DB_FLOOR + DB_RANGE]
+DB_RANGE = 60.0
+SILENCE = 4          # rms (0-100) below this is "sil"
+MIN_RUN = 2          # spectral visemes shorter than this many frames merge into the previous one
+
+# Oculus-style viseme set; misaki (Kokoro's G2P) phonemes -> viseme
+VISEMES = ("sil", "PP", "FF", "TH", "DD", "kk", "CH", "SS", "nn", "RR", "aa", "E", "ih", "oh", "ou")
+PHONEME_VISEME = {}
+for _v, _chars in {
+    "PP": "mbp", "FF": "fv", "TH": "θð", "DD": "tdɾ", "kk": "kɡgŋh", "CH": "ʃʒʧʤ", "SS": "sz",
+    "nn": "nl", "RR": "ɹr", "aa": "ɑæaʌɐIW", "E": "ɛeɜəᵊA", "ih": "iɪɨj", "oh": "ɔoOYQɒ", "ou": "uʊw",
+}.items():
+    for _c in _chars:
+        PHONEME_VISEME[_c] = _v
+_SKIP = set("ˈˌːˑ")  # stress / length marks ride on the previous phoneme
+
+class FeatureStream:
+    """Frame features for one message; push() each chunk in order, flush() at the end."""
+
+    def __init__(self, sample_rate: int, frame_ms: int = FRAME_MS, band_hz=BAND_HZ):
+        self.sr = sample_rate
+        self.frame = max(1, int(sample_rate * frame_ms / 1000))
+        self.frame_ms = 1000.0 * self.frame / sample_rate
+        freqs = np.fft.rfftfreq(self.frame, 1.0 / sample_rate)
+        self.band_hz = [e for e in band_hz if e <= sample_rate / 2] or [0, sample_rate / 2]
+        # bin index where each band starts; bins past the last edge fall in the last band
+        self._band_starts = np.searchsorted(freqs, self.band_hz[:-1])
+        self._freqs = freqs
+        self._hf = freqs >= 4000.0
+        self._window = np.hanning(self.frame).astype(np.float32)
+        self._rest = np.zeros(0, dtype=np.float32)  # samples of the current partial frame
+        self._samples = 0                           # samples pushed so far
+        self._frames = 0                            # frames emitted so far
+        self._last_viseme = None
+
+    def info(self) -> dict:
+        """What clients need to read the events (sent with tts_begin)."""
+        return {"frame_ms": round(self.frame_ms, 3), "band_hz": list(self.band_hz)}
+
+    def push(self, chunk: np.ndarray, tokens=None) -> list[dict]:
+        chunk = np.asarray(chunk, dtype=np.float32).reshape(-1)
+        chunk_start = self._samples
+        self._samples += len(chunk)
+        buf = np.concatenate([self._rest, chunk])
+        n = len(buf) // self.frame
+        self._rest = buf[n * self.frame:]
+        return self._events(buf[:n * self.frame].reshape(n, self.frame), (chunk_start, len(chunk)), tokens)
+
+    def flush(self) -> list[dict]:
+        """Last partial frame, zero-padded."""
+        if not len(self._rest):
+            return []
+        frames = np.zeros((1, self.frame), dtype=np.float32)
+        frames[0, :len(self._rest)] = self._rest
+        self._rest = self._rest[:0]
+        return self._events(frames, None, None)
+
+    def _events(self, frames: np.ndarray, chunk: tuple[int, int] | None, tokens) -> list[dict]:
+        if not len(frames):
+            return []
+        first = self._frames
+        self._frames += len(frames)
+        rms = np.sqrt(np.mean(frames * frames, axis=1))
+        power = np.abs(np.fft.rfft(frames * self._window, axis=1)) ** 2
+        bands = np.add.reduceat(power, self._band_starts, axis=1) / np.diff(np.append(self._band_starts, power.shape[1]))
+        rms_q = np.clip(rms * RMS_GAIN * 100.0, 0, 100).astype(np.int16)
+        db = 10.0 * np.log10(bands + 1e-12)
+        bands_q = np.clip((db - DB_FLOOR) * (100.0 / DB_RANGE), 0, 100).astype(np.int16)
+
+        at0 = first * self.frame / self.sr
+        events = [{"type": "intensity", "at": round(at0, 3), "value": round(float(rms_q.max()) / 100.0, 2),
+                   "rms": rms_q.tolist(), "nb": bands_q.shape[1], "bands": bands_q.ravel().tolist()}]
+        timed = chunk is not None and tokens and any(getattr(t, "start_ts", None) is not None for t in tokens)
+        if timed:
+            runs = self._phoneme_runs(tokens, chunk[0] / self.sr, chunk[1] / self.sr)
+            src = "phoneme"
+        else:
+            runs = self._spectral_runs(power, rms_q, at0)
+            src = "audio"
+        for at, vis, dur in runs:
+            if vis == self._last_viseme:
+                continue
+            self._last_viseme = vis
+            i = int((at - at0) * self.sr / self.frame)
+            j = max(i + 1, int((at + dur - at0) * self.sr / self.frame))
+            strength = float(rms_q[max(0, min(i, len(rms_q) - 1)):max(1, min(j, len(rms_q)))].mean()) / 100.0
+            events.append({"type": "viseme", "at": round(at, 3), "id": vis,
+                           "strength": round(strength if vis != "sil" else 0.0, 2), "src": src})
+        return events
+
+    def _spectral_runs(self, power: np.ndarray, rms_q: np.ndarray, at0: float) -> list[tuple[float, str, float]]:
+        """Viseme guess per frame from loudness, spectral centroid and the >4 kHz share."""
+        total = power.sum(axis=1) + 1e-12
+        centroid = (power * self._freqs).sum(axis=1) / total
+        hf = power[:, self._hf].sum(axis=1) / total
+        ids = np.select([rms_q < SILENCE, hf > 0.35, centroid < 450, centroid < 800, centroid < 1500, centroid < 2500],
+                        ["sil", "SS", "ou", "oh", "aa", "E"], default="ih")
+        # run-length, folding runs shorter than MIN_RUN frames into the previous run
+        change = np.flatnonzero(np.r_[True, ids[1:] != ids[:-1]])
+        lengths = np.diff(np.r_[change, len(ids)])
+        runs = []
+        for start, length in zip(change, lengths):
+            if runs and length < MIN_RUN:
+                runs[-1][2] += length
+                continue
+            runs.append([int(start), str(ids[start]), int(length)])
+        fs = self.frame / self.sr
+        return [(at0 + s * fs, vis, n * fs) for s, vis, n in runs]
+
+    @staticmethod
+    def _phoneme_runs(tokens, offset_s: float, chunk_s: float) -> list[tuple[float, str, float]]:
+        """Spreads each token's phonemes evenly over its [start_ts, end_ts] (chunk-relative);
+        gaps between words and the chunk's tail are "sil"."""
+        runs = []
+        prev_end = None
+        for tok in tokens:
+            start, end = getattr(tok, "start_ts", None), getattr(tok, "end_ts", None)
+            phonemes = [c for c in (getattr(tok, "phonemes", None) or "") if c not in _SKIP]
+            if start is None or end is None or end <= start:
+                continue
+            if prev_end is not None and start - prev_end > 0.06:
+                runs.append((offset_s + prev_end, "sil", start - prev_end))
+            prev_end = end
+            vis = [PHONEME_VISEME.get(c) for c in phonemes]
+            vis = [v for v in vis if v]
+            if not vis:
+                continue
+            step = (end - start) / len(vis)
+            for k, v in enumerate(vis):
+                if runs and runs[-1][1] == v:
+                    at, _, dur = runs[-1]
+                    runs[-1] = (at, v, dur + step)
+                else:
+                    runs.append((offset_s + start + k * step, v, step))
+        if prev_end is not None and chunk_s - prev_end > 0.06:
+            runs.append((offset_s + prev_end, "sil", chunk_s - prev_end))
+        return runs
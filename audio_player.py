@@ -0,0 +1,236 @@
+# audio_player.py
+import threading
+import logging
+import time
+import numpy as np
+import sounddevice as sd
+
+class PCMRingBuffer:
+    """
+    Bounded mono float32 ring buffer shared by the synthesis thread (writer) and the
+    PortAudio callback (reader). Frame positions are absolute (monotonic totals), so
+    callers can mark where an utterance starts/ends in the stream.
+    """
+
+    def __init__(self, capacity: int):
+        self._buf = np.zeros(capacity, dtype=np.float32)
+        self.capacity = capacity
+        self.read_total = 0
+        self.write_total = 0
+        self._lock = threading.Lock()
+        self._space = threading.Condition(self._lock)
+
+    def __len__(self):
+        return self.write_total - self.read_total
+
+    def write(self, data: np.ndarray, should_stop=None, poll: float = 0.05) -> int:
+        """Blocks while the buffer is full. Returns frames written (short if should_stop() fires)."""
+        data = np.asarray(data, dtype=np.float32).reshape(-1)
+        done = 0
+        with self._space:
+            while done < len(data):
+                # checked before every copy: a cancel frees space, and the rest of the chunk
+                # mustn't flow into it
+                if should_stop and should_stop():
+                    break
+                free = self.capacity - (self.write_total - self.read_total)
+                if free == 0:
+                    self._space.wait(poll)
+                    continue
+                n = min(free, len(data) - done)
+                start = self.write_total % self.capacity
+                first = min(n, self.capacity - start)
+                self._buf[start:start + first] = data[done:done + first]
+                if n > first:
+                    self._buf[:n - first] = data[done + first:done + n]
+                self.write_total += n
+                done += n
+        return done
+
+    def read_into(self, out: np.ndarray) -> int:
+        """Copies up to len(out) frames into out; returns how many. Never blocks (audio callback)."""
+        with self._lock:
+            n = min(len(out), self.write_total - self.read_total)
+            if n:
+                start = self.read_total % self.capacity
+                first = min(n, self.capacity - start)
+                out[:first] = self._buf[start:start + first]
+                if n > first:
+                    out[first:n] = self._buf[:n - first]
+                self.read_total += n
+                self._space.notify_all()
+        return n
+
+    def discard(self, lo: int, hi: int) -> int:
+        """
+        Drops absolute frames [lo, hi) that haven't been played yet. Returns how far frames
+        written after hi moved down (0 when the head was simply skipped).
+        """
+        with self._lock:
+            lo, hi = max(lo, self.read_total), min(hi, self.write_total)
+            if lo >= hi:
+                return 0
+            if lo == self.read_total:
+                self.read_total = hi  # dropping the head is just a skip, positions stay put
+                self._space.notify_all()
+                return 0
+            idx = np.arange(self.read_total, self.write_total) % self.capacity
+            keep = np.concatenate([self._buf[idx[:lo - self.read_total]],
+                                   self._buf[idx[hi - self.read_total:]]])
+            self.write_total = self.read_total + len(keep)
+            idx = np.arange(self.read_total, self.write_total) % self.capacity
+            self._buf[idx] = keep
+            self._space.notify_all()
+            return hi - lo
+
+class PlaybackHandle:
+    """Returned by TextToSpeechService.speak_async(); wait() for it or cancel() it."""
+
+    def __init__(self, player: "AudioPlayer"):
+        self._player = player
+        self._done = threading.Event()
+        self.cancelled = False
+        self.error = None
+        self.start_mark = None     # absolute frame where this utterance's audio begins
+        self.end_mark = None       # set once synthesis finishes
+        self.frames_written = 0
+        self.frames_played = None   # frozen once cancelled
+        self.segments = []          # (text, first frame, end frame) within this utterance
+        self.msg_id = None          # WS message id once audio went out to the UI
+        self.queued_at = time.perf_counter()
+        self.first_chunk_at = None  # perf_counter() when synthesis produced our first chunk
+        self.first_audio_at = None  # perf_counter() when the callback first played our audio
+        self.finished_at = None
+
+    def _mark_done(self):
+        self.finished_at = time.perf_counter()
+        self._done.set()
+
+    @property
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    def wait(self, timeout: float | None = None) -> bool:
+        """Blocks until the utterance finished playing (or was cancelled). False on timeout."""
+        return self._done.wait(timeout)
+
+    def cancel(self):
+        """Stops synthesis and drops any of this utterance's audio that hasn't played yet."""
+        if self.done:
+            return
+        self.cancelled = True
+        self._player.cancel(self)
+
+class AudioPlayer:
+    """
+    One persistent sounddevice.OutputStream fed from a PCMRingBuffer. Synthesis pushes chunks
+    as soon as they exist; the callback drains them back-to-back, so sentences play gaplessly
+    and nothing waits on the whole utterance.
+    """
+
+    def __init__(self, sample_rate: int, buffer_seconds: float = 4.0, blocksize: int = 1024):
+        self.sample_rate = sample_rate
+        self.blocksize = blocksize
+        self.ring = PCMRingBuffer(int(sample_rate * buffer_seconds))
+        self._handles = []  # utterances with audio still in (or headed for) the ring
+        self._lock = threading.Lock()
+        self._stream = None
+        self._taps = []     # fn(block, perf_counter) per played block, e.g. echo reference
+
+    def start(self):
+        if self._stream is not None:
+            return
+        self._stream = sd.OutputStream(
+            samplerate=self.sample_rate, channels=1, dtype="float32",
+            blocksize=self.blocksize, latency="low", callback=self._callback,
+        )
+        self._stream.start()
+        logging.info(f"AudioPlayer stream started ({self.sample_rate} Hz, block {self.blocksize}).")
+
+    def close(self):
+        if self._stream is not None:
+            self._stream.stop()
+            self._stream.close()
+            self._stream = None
+
+    def add_tap(self, fn):
+        """fn(block, t) sees every block as it goes to the speaker. Must be cheap (audio thread)."""
+        self._taps.append(fn)
+
+    @property
+    def active(self) -> bool:
+        """True while any utterance is queued or playing."""
+        with self._lock:
+            return bool(self._handles)
+
+    def _callback(self, outdata, frames, time_info, status):
+        out = outdata[:, 0]
+        n = self.ring.read_into(out)
+        if n < frames:
+            out[n:] = 0.0  # underrun -> silence, never garbage
+        for tap in self._taps:
+            tap(out, time.perf_counter())
+        played = self.ring.read_total
+        with self._lock:
+            for h in self._handles:
+                if h.first_audio_at is None and h.start_mark is not None and played > h.start_mark:
+                    h.first_audio_at = time.perf_counter()
+            finished = [h for h in self._handles if h.end_mark is not None and played >= h.end_mark]
+            for h in finished:
+                self._handles.remove(h)
+                h._mark_done()
+
+    # --- producer side (synthesis thread) ---
+    def begin(self, handle: PlaybackHandle):
+        self.start()
+        with self._lock:
+            self._handles.append(handle)
+
+    def write(self, handle: PlaybackHandle, chunk: np.ndarray) -> bool:
+        """Pushes one chunk for handle. Returns False if the handle got cancelled meanwhile."""
+        if handle.cancelled:
+            return False
+        if handle.start_mark is None:
+            handle.start_mark = self.ring.write_total
+            handle.first_chunk_at = time.perf_counter()
+        n = self.ring.write(chunk, should_stop=lambda: handle.cancelled)
+        handle.frames_written += n
+        return not handle.cancelled
+
+    def finish(self, handle: PlaybackHandle):
+        """Marks the end of handle's audio; it completes once the callback plays past it."""
+        with self._lock:
+            if handle.start_mark is None:
+                handle.start_mark = self.ring.write_total
+            handle.end_mark = self.ring.write_total
+            if self.ring.read_total >= handle.end_mark or handle.cancelled:
+                if handle in self._handles:
+                    self._handles.remove(handle)
+                handle._mark_done()
+
+    def cancel(self, handle: PlaybackHandle):
+        with self._lock:
+            if handle.start_mark is not None:
+                handle.frames_played = self.played_frames(handle)
+                hi = handle.end_mark if handle.end_mark is not None else self.ring.write_total
+                shift = self.ring.discard(handle.start_mark, hi)
+                # later utterances move down by whatever got cut out from under them
+                for h in self._handles:
+                    if h is not handle and h.start_mark is not None and h.start_mark >= hi:
+                        h.start_mark -= shift
+                        if h.end_mark is not None:
+                            h.end_mark -= shift
+            else:
+                handle.frames_played = 0
+            if handle in self._handles:
+                self._handles.remove(handle)
+            handle._mark_done()
+
+    def played_frames(self, handle: PlaybackHandle) -> int:
+        """How much of handle's audio has actually come out of the speaker so far."""
+        if handle.frames_played is not None:
+            return handle.frames_played
+        if handle.start_mark is None:
+            return 0
+        played = self.ring.read_total - handle.start_mark
+        return max(0, min(played, handle.frames_written))
@@ -0,0 +1,165 @@
+# benchmarks/bench_micro.py
+"""
+Component micro-benchmarks:
+  memory   - ChromaMemoryService add + retrieve at N stored memories (default 1k / 100k / 1M)
+  journal  - JournalWriter append throughput (the old _append_journal path) per fsync policy
+  ingest   - mem_sync_server /import-ndjson records/s, fresh and fully-duplicate uploads
+  fanout   - WSBroadcaster PCM fan-out to N local WebSocket clients
+"""
+import os, sys, time, socket, asyncio, hashlib, tempfile, threading
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+DIM = 384  # all-MiniLM-L6-v2, Chroma's default embedder
+
+class HashEmbedder:
+    """Cheap deterministic embedder so the memory bench measures storage/index cost, not ONNX."""
+
+    def __call__(self, texts):
+        out = np.zeros((len(texts), DIM), dtype=np.float32)
+        for i, t in enumerate(texts):
+            for w in t.lower().split():
+                out[i, int(hashlib.md5(w.encode()).hexdigest()[:8], 16) % DIM] += 1.0
+        out /= np.maximum(np.linalg.norm(out, axis=1, keepdims=True), 1e-12)
+        return list(out)
+
+def _stats(samples: list[float]) -> dict:
+    v = sorted(samples)
+    return {"p50_ms": round(v[len(v) // 2] * 1000, 3), "p95_ms": round(v[int(len(v) * 0.95)] * 1000, 3),
+            "mean_ms": round(sum(v) / len(v) * 1000, 3), "n": len(v)}
+
+def bench_memory(sizes=(1_000, 100_000, 1_000_000), queries: int = 50, adds: int = 50,
+                 real_embeddings: bool = False, fill_batch: int = 5_000) -> list[dict]:
+    from memory_service_chroma import ChromaMemoryService
+    rng = np.random.default_rng(0)
+    results = []
+    for size in sizes:
+        work = tempfile.mkdtemp(prefix="elysia_bench_mem_")
+        svc = ChromaMemoryService(db_path=os.path.join(work, "chroma_db"), journal_dir=os.path.join(work, "journal"),
+                                  write_behind=False)
+        if not real_embeddings:
+            svc._embed_fn = HashEmbedder()
+        t0 = time.perf_counter()
+        for start in range(0, size, fill_batch):
+            n = min(fill_batch, size - start)
+            vecs = rng.standard_normal((n, DIM)).astype(np.float32)
+            vecs /= np.linalg.norm(vecs, axis=1, keepdims=True)
+            svc._collection.add(ids=[f"fill_{start + i}" for i in range(n)],
+                                documents=[f"filler memory {start + i}" for i in range(n)],
+                                metadatas=[{"speaker": "user", "ts": float(start + i)} for i in range(n)],
+                                embeddings=vecs.tolist())
+        fill_s = time.perf_counter() - t0
+
+        add_lat = []
+        for i in range(adds):
+            t = time.perf_counter()
+            svc.add_memory(f"benchmark question {i} about sqlite locks", f"benchmark answer {i}")
+            add_lat.append(time.perf_counter() - t)
+        cold, warm = [], []
+        for i in range(queries):
+            q = f"what did we say about sqlite lock number {i}"
+            t = time.perf_counter()
+            svc.retrieve_relevant_memories(q)
+            cold.append(time.perf_counter() - t)
+            t = time.perf_counter()
+            svc.retrieve_relevant_memories(q)  # same text again: query-embedding cache hit
+            warm.append(time.perf_counter() - t)
+        results.append({"bench": "memory", "size": size, "fill_s": round(fill_s, 2),
+                        "add": _stats(add_lat), "retrieve": _stats(cold), "retrieve_repeat": _stats(warm),
+                        "service_stats": svc.stats(), "real_embeddings": real_embeddings})
+        svc.close()
+    return results
+
+def bench_journal(entries: int = 20_000, policies=("close", "interval", "always")) -> list[dict]:
+    from mem_journal import JournalWriter
+    results = []
+    for policy in policies:
+        n = entries if policy != "always" else min(entries, 2_000)  # fsync per entry is slow by design
+        w = JournalWriter(tempfile.mkdtemp(prefix="elysia_bench_journal_"), fsync=policy, compress=None)
+        t0 = time.perf_counter()
+        for i in range(n):
+            w.append({"type": "turn", "ts": time.time(), "turn_id": str(i), "speaker": "user",
+                      "text": f"benchmark journal entry {i} " * 4})
+        w.close()
+        dt = time.perf_counter() - t0
+        results.append({"bench": "journal", "fsync": policy, "entries": n,
+                        "entries_per_s": round(n / dt, 1), "us_per_entry": round(dt / n * 1e6, 2)})
+    return results
+
+def bench_ingest(records: int = 5_000, batch_size: int = 256) -> list[dict]:
+    work = tempfile.mkdtemp(prefix="elysia_bench_ingest_")
+    os.environ["ELYSIA_DB_PATH"] = os.path.join(work, "chroma_db")
+    os.environ.setdefault("ELYSIA_SYNC_TOKEN", "bench")
+    from fastapi.testclient import TestClient
+    import mem_sync_server as server
+    from mem_journal import entry_line
+
+    body = "".join(entry_line({"type": "turn", "ts": float(i), "turn_id": f"t{i // 2}",
+                               "speaker": "user" if i % 2 == 0 else "assistant",
+                               "text": f"ingest benchmark record {i}"})[0] for i in range(records))
+    client = TestClient(server.app)
+    out = []
+    for label in ("fresh", "duplicate"):
+        t0 = time.perf_counter()
+        r = client.post(f"/import-ndjson?batch_size={batch_size}", headers={"X-Auth": server.AUTH_TOKEN},
+                        files={"file": ("bench.ndjson", body.encode("utf-8"), "application/x-ndjson")})
+        dt = time.perf_counter() - t0
+        res = r.json()
+        out.append({"bench": "ingest", "upload": label, "records": records, "batch_size": batch_size,
+                    "records_per_s": round(records / dt, 1), "server": res})
+    return out
+
+async def _close(ws):
+    ws.server.close()
+    await ws.server.wait_closed()
+
+def bench_fanout(clients=(1, 10, 50), chunks: int = 200, chunk_ms: int = 40) -> list[dict]:
+    import websockets
+    from tts_ws import WSBroadcaster
+    results = []
+    samples = np.zeros(24000 * chunk_ms // 1000, dtype=np.float32)
+    for n in clients:
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            port = s.getsockname()[1]
+        ws = WSBroadcaster(host="127.0.0.1", port=port, max_queue=chunks + 8)
+        ws.start()
+        time.sleep(0.2)
+        got = [0] * n
+
+        async def _client(i, ready):
+            fmt = "i16" if i % 2 else "f32"  # half the clients on each wire format
+            async with websockets.connect(f"ws://127.0.0.1:{port}/?fmt={fmt}", max_size=None) as c:
+                ready.set()
+                while got[i] < chunks:
+                    if isinstance(await c.recv(), bytes):
+                        got[i] += 1
+
+        async def _all():
+            readies = [asyncio.Event() for _ in range(n)]
+            tasks = [asyncio.ensure_future(_client(i, readies[i])) for i in range(n)]
+            await asyncio.gather(*(r.wait() for r in readies))
+            await asyncio.sleep(0.2)  # let the server register every client
+            threading.Thread(target=_send, daemon=True).start()
+            await asyncio.wait_for(asyncio.gather(*tasks), timeout=60)
+
+        t0 = [0.0]
+
+        def _send():
+            t0[0] = time.perf_counter()
+            ws.tts_begin(24000, "bench")
+            for _ in range(chunks):
+                ws.tts_chunk("bench", time.time(), samples)
+            ws.tts_end("bench")
+
+        asyncio.run(_all())
+        dt = time.perf_counter() - t0[0]
+        asyncio.run_coroutine_threadsafe(_close(ws), ws.loop).result(timeout=10)
+        results.append({"bench": "fanout", "clients": n, "chunks": chunks, "chunk_ms": chunk_ms,
+                        "frames_per_s": round(n * chunks / dt, 1),
+                        "audio_x_realtime": round(chunks * chunk_ms / 1000 / dt, 1),
+                        "delivered": sum(got)})
+    return results
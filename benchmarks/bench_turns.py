@@ -0,0 +1,97 @@
+# benchmarks/bench_turns.py
+"""
+End-to-end turn benchmark: ConversationalAI driven through scripted utterances with the fake
+STT/TTS/audio/LLM backends from benchmarks.fakes, real ChromaMemoryService in a scratch dir.
+Per-turn stage timings come from the tracer's NDJSON export.
+
+One run per process: main_app, the tracer and Chroma's shared system are process-wide, so
+benchmarks.run starts each mode via `python -m benchmarks.bench_turns [--stream] --out X`.
+"""
+import os, sys, json, time, socket, logging, argparse, tempfile
+from collections import defaultdict
+
+from benchmarks import fakes
+
+DEFAULT_UTTERANCES = [
+    "What crashed last night?",
+    "Read the watchdog log and tell me why it restarted.",
+    "How do I stop the stale process?",
+    "Remind me what we said about the SQLite lock.",
+    "Thanks, that's all.",
+]
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def run(utterances=None, stream_tts: bool = False, **fake_kw) -> dict:
+    utterances = utterances or DEFAULT_UTTERANCES
+    cfg = fakes.install(fakes.FakeConfig(utterances=list(utterances), **fake_kw))
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    if root not in sys.path:
+        sys.path.insert(0, root)
+    work = tempfile.mkdtemp(prefix="elysia_bench_")
+    os.environ["ELYSIA_JOURNAL_DIR"] = os.path.join(work, "mem_journal")
+    os.environ["ELYSIA_TRACE_DIR"] = os.path.join(work, "traces")
+    os.environ.setdefault("ELYSIA_SUMMARY_MODE", "extractive")
+    cwd = os.getcwd()
+    os.chdir(work)  # response logs, elysia.log, chroma_db, crash_info all land in the scratch dir
+    try:
+        import tts_ws
+        tts_ws.WS.port = _free_port()
+        import main_app
+        from tracing import TRACER
+        TRACER.trace_dir = os.environ["ELYSIA_TRACE_DIR"]
+        logging.getLogger().setLevel(logging.WARNING)
+
+        t0 = time.perf_counter()
+        app = main_app.ConversationalAI(stream_tts=stream_tts)
+        startup = app.startup_report
+        app.run()  # returns when the scripted recorder runs out (KeyboardInterrupt path)
+        wall = time.perf_counter() - t0
+    finally:
+        os.chdir(cwd)
+
+    turns = defaultdict(dict)
+    trace_dir = os.path.join(work, "traces")
+    for name in sorted(os.listdir(trace_dir)) if os.path.isdir(trace_dir) else []:
+        with open(os.path.join(trace_dir, name), encoding="utf-8") as f:
+            for line in f:
+                rec = json.loads(line)
+                stages = turns[rec["turn_id"]]
+                stages[rec["stage"]] = stages.get(rec["stage"], 0.0) + rec["duration_ms"]
+    per_turn = list(turns.values())
+    e2e = sorted(t.get("turn", 0.0) for t in per_turn)
+    stages = {}
+    for stage in sorted({s for t in per_turn for s in t}):
+        v = sorted(t[stage] for t in per_turn if stage in t)
+        stages[stage] = {"p50_ms": v[len(v) // 2], "p95_ms": v[min(len(v) - 1, int(len(v) * 0.95))], "n": len(v)}
+    return {
+        "bench": "turns",
+        "mode": "stream" if stream_tts else "summary",
+        "turns": len(per_turn),
+        "wall_s": round(wall, 3),
+        "startup": startup,
+        "e2e_ms_p50": e2e[len(e2e) // 2] if e2e else None,
+        "e2e_ms_max": e2e[-1] if e2e else None,
+        "stages": stages,
+        "per_turn": per_turn,
+        "config": {k: v for k, v in cfg.__dict__.items() if k != "utterances"},
+    }
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="End-to-end turn benchmark (one mode per process)")
+    ap.add_argument("--stream", action="store_true", help="stream LLM output into TTS")
+    ap.add_argument("--out", default=None, help="write the result JSON here instead of stdout")
+    args = ap.parse_args(argv)
+    result = run(stream_tts=args.stream)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(result, f)
+    else:
+        print(json.dumps(result))
+
+if __name__ == "__main__":
+    main()
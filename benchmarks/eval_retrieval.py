@@ -0,0 +1,112 @@
+# benchmarks/eval_retrieval.py
+"""
+Recall/latency check for memory retrieval, vector-only vs hybrid (BM25 + vector, RRF).
+A scratch ChromaMemoryService is filled with filler turns plus planted "needle" memories that
+carry exact identifiers (file names, error strings, commands); each needle has a query that
+names its identifier, and one that only describes it.
+
+    python -m benchmarks.eval_retrieval                   # 2000 filler turns, hash embedder
+    python -m benchmarks.eval_retrieval --turns 10000 --real-embeddings
+"""
+import os, sys, json, time, random, argparse, tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+TOPICS = ["weather", "music", "dinner", "the garden", "a movie", "the car", "work", "the weekend",
+          "python", "the server", "sleep", "coffee", "the news", "a book", "the cat"]
+FILLER_Q = ["what do you think about {t}", "tell me something about {t}", "any ideas for {t} today",
+            "can you remind me about {t}", "I was thinking about {t} again"]
+FILLER_A = ["Sure. {t} is worth a look; start small and check back later.",
+            "I'd keep {t} simple this time and see how it goes.",
+            "Last time {t} came up we agreed to try again next week."]
+WORDS = ["alpha", "bravo", "cobalt", "delta", "ember", "falcon", "garnet", "harbor", "indigo", "juniper",
+         "kestrel", "lumen", "marble", "nectar", "onyx", "pylon", "quartz", "raven", "sierra", "tundra"]
+
+def _needles(rng: random.Random, n: int) -> list[dict]:
+    """[{"user", "assistant", "keyword_q", "semantic_q"}] with one unique identifier each."""
+    out = []
+    for i in range(n):
+        a, b = rng.sample(WORDS, 2)
+        kind = i % 3
+        if kind == 0:
+            ident = f"{a}_{b}_{i}.py"
+            user = f"The script {ident} keeps failing on start-up."
+            answer = f"{ident} imports a module that isn't installed; pin it in requirements and rerun."
+            sem = f"which script was failing when it started, the {a} one"
+        elif kind == 1:
+            ident = f"{a.title()}{b.title()}Error{i}"
+            user = f"Got {ident}: handle closed while the sync was running."
+            answer = f"{ident} means the sync handle was closed early; retry after the lock is released."
+            sem = f"what was that error about a closed handle during sync with {b}"
+        else:
+            ident = f"systemctl restart {a}-{b}-{i}"
+            user = f"How do I bring the {a} service back?"
+            answer = f"Run `{ident}` and then tail its journal to confirm it came up."
+            sem = f"how did we bring the {a} service back up"
+        out.append({"user": user, "assistant": answer, "ident": ident,
+                    "keyword_q": f"what about {ident}", "semantic_q": sem})
+    return out
+
+def _stats(samples: list[float]) -> dict:
+    v = sorted(samples)
+    return {"p50_ms": round(v[len(v) // 2] * 1000, 3), "p95_ms": round(v[int(len(v) * 0.95)] * 1000, 3)}
+
+def run(turns: int = 2000, needles: int = 60, k: int = 5, real_embeddings: bool = False, seed: int = 0) -> list[dict]:
+    from memory_service_chroma import ChromaMemoryService
+    from benchmarks.bench_micro import HashEmbedder
+    rng = random.Random(seed)
+    planted = _needles(rng, needles)
+    results = []
+    for hybrid in (False, True):
+        work = tempfile.mkdtemp(prefix="elysia_eval_ret_")
+        svc = ChromaMemoryService(db_path=os.path.join(work, "chroma_db"), journal_dir=os.path.join(work, "journal"),
+                                  write_behind=False, hybrid=hybrid, hot_index_size=256)
+        if not real_embeddings:
+            svc._embed_fn = HashEmbedder()
+        r = random.Random(seed)
+        slots = set(r.sample(range(turns), min(needles, turns)))
+        it = iter(planted)
+        for i in range(turns):
+            t = r.choice(TOPICS)
+            svc.add_memory(r.choice(FILLER_Q).format(t=t), r.choice(FILLER_A).format(t=t))
+            if i in slots:
+                nd = next(it)
+                svc.add_memory(nd["user"], nd["assistant"])
+
+        row = {"bench": "retrieval", "mode": "hybrid" if hybrid else "vector", "turns": turns,
+               "needles": needles, "k": k, "real_embeddings": real_embeddings}
+        for qkind in ("keyword_q", "semantic_q"):
+            hits, rr, lat = 0, 0.0, []
+            for nd in planted:
+                t0 = time.perf_counter()
+                docs = svc.retrieve_relevant_memories(nd[qkind], n_results=k)
+                lat.append(time.perf_counter() - t0)
+                rank = next((j for j, d in enumerate(docs) if nd["ident"] in d or nd["user"] in d), None)
+                if rank is not None:
+                    hits += 1
+                    rr += 1.0 / (rank + 1)
+            name = qkind[:-2]
+            row[name] = {f"recall_at_{k}": round(hits / len(planted), 3), "mrr": round(rr / len(planted), 3),
+                         **_stats(lat)}
+        row["service_stats"] = svc.stats()
+        results.append(row)
+        svc.close()
+    return results
+
+def main(argv=None):
+    import logging
+    ap = argparse.ArgumentParser(description="Memory retrieval recall/latency: vector-only vs hybrid")
+    ap.add_argument("--turns", type=int, default=2000)
+    ap.add_argument("--needles", type=int, default=60)
+    ap.add_argument("-k", type=int, default=5)
+    ap.add_argument("--real-embeddings", action="store_true", help="use Chroma's ONNX embedder")
+    args = ap.parse_args(argv)
+    logging.getLogger().setLevel(logging.WARNING)
+    for row in run(args.turns, args.needles, args.k, args.real_embeddings):
+        row.pop("service_stats")
+        print(json.dumps(row))
+
+if __name__ == "__main__":
+    main()
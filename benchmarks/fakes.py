@@ -0,0 +1,234 @@
+# benchmarks/fakes.py
+"""
+Drop-in stand-ins for the hardware/model-bound dependencies, so the full turn pipeline can be
+benchmarked offline: RealtimeSTT.AudioToTextRecorder, kokoro.KPipeline, sounddevice and the
+`llm` model API. Latencies and rates come from a FakeConfig. install() puts them in
+sys.modules, so it must run before main_app / the services are imported.
+"""
+import sys, time, types, threading
+import numpy as np
+
+class FakeConfig:
+    """Knobs for the fakes (seconds unless noted)."""
+
+    def __init__(self, **kw):
+        self.utterances = kw.get("utterances", [])       # scripted user turns, in order
+        self.speech_s = kw.get("speech_s", 0.0)          # user talking before VAD stop
+        self.stt_latency_s = kw.get("stt_latency_s", 0.15)  # VAD stop -> transcript
+        self.llm_first_token_s = kw.get("llm_first_token_s", 0.35)
+        self.llm_tokens_per_s = kw.get("llm_tokens_per_s", 40.0)
+        self.llm_response = kw.get("llm_response", (
+            "The watchdog restarted the process because the Chroma client could not open its database. "
+            "Another instance was still holding the SQLite lock. Stop the stale process, then restart "
+            "Elysia and the lock will be released. If it happens again, check the crash report in memory."))
+        self.tts_rtf = kw.get("tts_rtf", 0.1)            # synthesis seconds per second of audio
+        self.tts_chars_per_s = kw.get("tts_chars_per_s", 15.0)  # speaking rate -> audio length
+        self.sample_rate = kw.get("sample_rate", 24000)
+        self.playback_speed = kw.get("playback_speed", 20.0)  # >1 plays faster than real time
+        self.blocksize = kw.get("blocksize", 1024)
+
+CONFIG = FakeConfig()
+
+# --- RealtimeSTT -----------------------------------------------------------------------------
+
+class AudioToTextRecorder:
+    def __init__(self, model=None, language=None, on_recording_start=None, on_recording_stop=None, **kwargs):
+        self.model = model
+        self.on_recording_start = on_recording_start
+        self.on_recording_stop = on_recording_stop
+        self.kwargs = kwargs
+        self._script = list(CONFIG.utterances)
+
+    def text(self, on_transcription_finished=None):
+        if not self._script:
+            raise KeyboardInterrupt  # script exhausted: ends ConversationalAI.run() cleanly
+        utterance = self._script.pop(0)
+        if self.on_recording_start:
+            self.on_recording_start()
+        partial = self.kwargs.get("on_realtime_transcription_stabilized")
+        if partial and CONFIG.speech_s > 0:
+            # stabilized partials grow word by word over the utterance, like the realtime model's
+            words = utterance.split(" ")
+            for i in range(1, len(words) + 1):
+                time.sleep(CONFIG.speech_s / len(words))
+                partial(" ".join(words[:i]))
+        else:
+            time.sleep(CONFIG.speech_s)
+        if self.on_recording_stop:
+            self.on_recording_stop()
+        time.sleep(CONFIG.stt_latency_s)
+        if on_transcription_finished:
+            on_transcription_finished(utterance)
+        return utterance
+
+    def shutdown(self):
+        pass
+
+# --- kokoro ----------------------------------------------------------------------------------
+
+class _FakeTensor:
+    def __init__(self, arr):
+        self._arr = arr
+
+    def detach(self):
+        return self
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self._arr
+
+class _Result:
+    def __init__(self, graphemes, audio):
+        self.graphemes = graphemes
+        self.phonemes = graphemes
+        self.tokens = None
+        self.audio = audio
+
+class KPipeline:
+    def __init__(self, lang_code="a", **kwargs):
+        self.lang_code = lang_code
+
+    def __call__(self, text, voice=None, **kwargs):
+        for seg in [s for s in text.replace("! ", ". ").replace("? ", ". ").split(". ") if s.strip()]:
+            seconds = max(0.2, len(seg) / CONFIG.tts_chars_per_s)
+            time.sleep(seconds * CONFIG.tts_rtf)
+            n = int(seconds * CONFIG.sample_rate)
+            t = np.arange(n, dtype=np.float32) / CONFIG.sample_rate
+            audio = (0.2 * np.sin(2 * np.pi * 180.0 * t)).astype(np.float32)
+            yield _Result(seg, _FakeTensor(audio))
+
+# --- sounddevice -----------------------------------------------------------------------------
+
+class OutputStream:
+    """Calls the callback from a thread at playback_speed x real time."""
+
+    def __init__(self, samplerate=24000, channels=1, dtype="float32", blocksize=1024, callback=None, **kwargs):
+        self.samplerate = samplerate
+        self.channels = channels
+        self.blocksize = blocksize or CONFIG.blocksize
+        self.callback = callback
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="fake-sd", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        period = self.blocksize / self.samplerate / CONFIG.playback_speed
+        out = np.zeros((self.blocksize, self.channels), dtype=np.float32)
+        nxt = time.perf_counter()
+        while not self._stop.is_set():
+            self.callback(out, self.blocksize, None, None)
+            nxt += period
+            time.sleep(max(0.0, nxt - time.perf_counter()))
+
+    def stop(self):
+        self._stop.set()
+
+    def close(self):
+        self._stop.set()
+
+def play(data, samplerate=None, **kwargs):
+    time.sleep(len(data) / (samplerate or CONFIG.sample_rate) / CONFIG.playback_speed)
+
+def wait():
+    pass
+
+# --- llm -------------------------------------------------------------------------------------
+
+class Toolbox:
+    """Enough of llm.Toolbox for ElysiaTools to subclass."""
+
+class _Response:
+    def __init__(self, text):
+        self._text = text
+        self.response_json = {}
+
+    def text(self):
+        return self._text
+
+    def __iter__(self):
+        yield self._text
+
+class _Chain:
+    def __init__(self, text):
+        self._text = text
+
+    def __iter__(self):
+        time.sleep(CONFIG.llm_first_token_s)
+        words = self._text.split(" ")
+        gap = 1.0 / CONFIG.llm_tokens_per_s
+        for i, w in enumerate(words):
+            if i:
+                time.sleep(gap)
+            yield (" " if i else "") + w
+
+class _ConvChain(_Chain):
+    """Chain on a conversation: a fully read reply is recorded like llm does, with Ollama-style stats."""
+
+    def __init__(self, text, conversation, prompt):
+        super().__init__(text)
+        self._conversation = conversation
+        self._prompt = prompt
+
+    def __iter__(self):
+        t0 = time.perf_counter()
+        yield from super().__iter__()
+        resp = _Response(self._text)
+        first = CONFIG.llm_first_token_s
+        resp.response_json = {
+            "prompt_eval_count": len(self._prompt) // 4, "prompt_eval_duration": int(first * 1e9),
+            "eval_count": len(self._text.split(" ")),
+            "eval_duration": int(max(0.0, time.perf_counter() - t0 - first) * 1e9),
+        }
+        self._conversation.responses.append(resp)
+
+class _Conversation:
+    def __init__(self, model):
+        self.model = model
+        self.responses = []
+
+    def chain(self, prompt, system=None, tools=None, **kwargs):
+        return _ConvChain(CONFIG.llm_response, self, prompt)
+
+    def prompt(self, prompt, system=None, **kwargs):
+        return self.model.prompt(prompt, system=system, **kwargs)
+
+class FakeModel:
+    model_id = "fake"
+
+    def prompt(self, prompt, system=None, tools=None, **kwargs):
+        time.sleep(CONFIG.llm_first_token_s)
+        return _Response("Ok.")
+
+    def chain(self, prompt, system=None, tools=None, **kwargs):
+        return _Chain(CONFIG.llm_response)
+
+    def conversation(self, **kwargs):
+        return _Conversation(self)
+
+def get_model(model_id=None):
+    return FakeModel()
+
+# --- install ---------------------------------------------------------------------------------
+
+def install(config: FakeConfig | None = None) -> FakeConfig:
+    """Registers the fakes as RealtimeSTT / kokoro / sounddevice / llm. Returns the live config."""
+    if config is not None:
+        CONFIG.__dict__.update(config.__dict__)
+    here = sys.modules[__name__]
+    mods = {
+        "RealtimeSTT": {"AudioToTextRecorder": AudioToTextRecorder},
+        "kokoro": {"KPipeline": KPipeline},
+        "sounddevice": {"OutputStream": OutputStream, "play": play, "wait": wait},
+        "llm": {"get_model": get_model, "Toolbox": Toolbox},
+    }
+    for name, attrs in mods.items():
+        mod = types.ModuleType(name)
+        mod.__dict__.update(attrs)
+        mod.__fake__ = here
+        sys.modules[name] = mod
+    return CONFIG
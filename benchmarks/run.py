@@ -0,0 +1,132 @@
+# benchmarks/run.py
+"""
+Offline benchmark runner. Writes one JSON file per run to bench_results/<timestamp>_<gitsha>.json.
+
+    python -m benchmarks.run                          # turns (summary + stream) and all micro benches
+    python -m benchmarks.run --only turns,journal
+    python -m benchmarks.run --only retrieval         # recall@k/MRR/latency, vector-only vs hybrid
+    python -m benchmarks.run --sizes 1000,100000      # memory bench sizes (default 1k,100k,1M)
+    python -m benchmarks.run --compare bench_results/old.json [new.json]
+"""
+import os, sys, json, time, argparse, platform, tempfile, subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, "bench_results")
+ALL = ("turns", "memory", "retrieval", "journal", "ingest", "fanout")
+
+def _git_sha() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return "nogit"
+
+def _flatten(obj, prefix="") -> dict:
+    """{"turns/summary/e2e_ms_p50": 812.0, ...} - numeric leaves only, keyed by path."""
+    out = {}
+    if isinstance(obj, dict):
+        for k, v in obj.items():
+            if k in ("config", "per_turn", "startup", "service_stats", "server"):
+                continue
+            out.update(_flatten(v, f"{prefix}/{k}" if prefix else str(k)))
+    elif isinstance(obj, (int, float)) and not isinstance(obj, bool):
+        out[prefix] = obj
+    return out
+
+def _key(result: dict) -> str:
+    """Stable name for one benchmark result so runs can be compared."""
+    parts = [result["bench"]]
+    for k in ("mode", "size", "fsync", "upload", "clients"):
+        if k in result:
+            parts.append(f"{k}={result[k]}")
+    return "/".join(parts)
+
+def _run_turns(stream: bool) -> dict:
+    """One bench_turns mode in a fresh interpreter: main_app, TRACER and Chroma's cached
+    shared system are per-process, and a second ConversationalAI in the same process
+    would reopen sqlite relative to the new scratch cwd."""
+    fd, out = tempfile.mkstemp(prefix="elysia_turns_", suffix=".json")
+    os.close(fd)
+    try:
+        cmd = [sys.executable, "-m", "benchmarks.bench_turns", "--out", out] + (["--stream"] if stream else [])
+        subprocess.run(cmd, cwd=ROOT, check=True)
+        with open(out, encoding="utf-8") as f:
+            return json.load(f)
+    finally:
+        os.remove(out)
+
+def run(only, sizes, real_embeddings: bool) -> dict:
+    from benchmarks import bench_micro, eval_retrieval
+    results = []
+    if "turns" in only:
+        for stream in (False, True):
+            print(f"turns ({'stream' if stream else 'summary'})...", flush=True)
+            results.append(_run_turns(stream))
+    if "memory" in only:
+        print(f"memory {sizes}...", flush=True)
+        results += bench_micro.bench_memory(sizes=sizes, real_embeddings=real_embeddings)
+    if "retrieval" in only:
+        print("retrieval (vector vs hybrid)...", flush=True)
+        results += eval_retrieval.run(real_embeddings=real_embeddings)
+    if "journal" in only:
+        print("journal...", flush=True)
+        results += bench_micro.bench_journal()
+    if "ingest" in only:
+        print("ingest...", flush=True)
+        results += bench_micro.bench_ingest()
+    if "fanout" in only:
+        print("fanout...", flush=True)
+        results += bench_micro.bench_fanout()
+    return {"git_sha": _git_sha(), "ts": time.time(), "python": platform.python_version(),
+            "machine": platform.machine(), "platform": platform.platform(), "results": results}
+
+def compare(old_path: str, new_path: str):
+    with open(old_path, encoding="utf-8") as f:
+        old = json.load(f)
+    with open(new_path, encoding="utf-8") as f:
+        new = json.load(f)
+    olds = {_key(r): _flatten(r) for r in old["results"]}
+    print(f"{old['git_sha']} -> {new['git_sha']}")
+    for r in new["results"]:
+        key = _key(r)
+        before = olds.get(key, {})
+        for metric, val in sorted(_flatten(r).items()):
+            if metric.rsplit("/", 1)[-1] in ("size", "clients", "chunks", "chunk_ms", "entries", "records", "batch_size", "n", "turns", "needles", "k"):
+                continue
+            prev = before.get(metric)
+            if prev is None:
+                print(f"  {key:32} {metric:28} {val:>12}  (new)")
+            elif prev:
+                print(f"  {key:32} {metric:28} {prev:>12} -> {val:<12} {100.0 * (val - prev) / prev:+7.1f}%")
+            else:
+                print(f"  {key:32} {metric:28} {prev:>12} -> {val:<12}")
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Elysia offline benchmarks")
+    ap.add_argument("--only", default=",".join(ALL), help=f"comma list of {', '.join(ALL)}")
+    ap.add_argument("--sizes", default="1000,100000,1000000", help="memory bench collection sizes")
+    ap.add_argument("--real-embeddings", action="store_true", help="use Chroma's ONNX embedder in the memory bench")
+    ap.add_argument("--out", default=None, help="output path (default bench_results/<ts>_<sha>.json)")
+    ap.add_argument("--compare", nargs="+", metavar="JSON", help="old.json [new.json]: print deltas and exit")
+    args = ap.parse_args(argv)
+
+    if args.compare:
+        if len(args.compare) == 1:
+            newest = sorted(os.path.join(RESULTS_DIR, n) for n in os.listdir(RESULTS_DIR) if n.endswith(".json"))
+            args.compare.append(newest[-1])
+        compare(*args.compare[:2])
+        return
+
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    only = [s.strip() for s in args.only.split(",") if s.strip()]
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    report = run(only, sizes, args.real_embeddings)
+    out = args.out or os.path.join(RESULTS_DIR, f"{time.strftime('%Y%m%d_%H%M%S')}_{report['git_sha']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"wrote {out}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+# echo_suppressor.py
+import threading
+from collections import deque
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+def _rms(x: np.ndarray) -> float:
+    x = np.asarray(x, dtype=np.float32)
+    return float(np.sqrt(np.mean(x * x))) if x.size else 0.0
+
+class EchoSuppressor:
+    """
+    Echo canceller + residual gate for full-duplex listening. The AudioPlayer callback hands
+    every block it sends to the speaker to reference(); it is resampled to the mic rate and
+    kept in a ring. Each mic block is cross-correlated against the last tail_s of that
+    reference to find the speaker -> room -> mic delay (re-found every block, which also
+    absorbs audio-callback timing jitter); from there an adaptive FIR filter (block NLMS,
+    filter_s long, so it covers the early room reverb) predicts the echo from the reference
+    and it is subtracted. What is left decides: a residual no louder than the learned
+    cancellation leaves is echo and becomes silence before VAD/STT; a clearly louder one is
+    the user talking over us (double talk) and passes, echo removed, with a short hangover so
+    words aren't chopped. The user's voice doesn't correlate with the reference, so it
+    survives the subtraction however loud the TTS is. The filter and the residual level only
+    adapt on blocks judged to be echo.
+    Until a delay has been found (or without reference history) it falls back to a level
+    gate: mic level vs. the loudest recent reference level times a learned echo gain.
+    """
+
+    def __init__(self, mic_rate: int = 16000, ref_rate: int = 24000, tail_s: float = 0.35,
+                 filter_s: float = 0.064, step: float = 0.5, margin: float = 2.5,
+                 hangover_s: float = 0.4, ref_floor: float = 0.003, noise_floor: float = 0.004,
+                 corr_min: float = 0.3):
+        self.mic_rate = mic_rate
+        self.ref_rate = ref_rate        # AudioPlayer's rate; main_app sets it from the TTS
+        self.tail_s = tail_s
+        self.taps = int(filter_s * mic_rate)
+        self.step = step                # NLMS step size (0..1)
+        self.margin = margin
+        self.hangover_s = hangover_s
+        self.ref_floor = ref_floor
+        self.noise_floor = noise_floor
+        self.corr_min = corr_min        # normalized correlation that counts as "echo found"
+        self.gain = 0.5                 # level gate: mic rms / speaker rms when only echo is present
+        self.residual_ratio = 0.3       # canceller: residual rms / reference rms on echo-only blocks
+        self.delay = None               # direct-path echo delay, samples before the block's reference
+        self._w = np.zeros(self.taps, dtype=np.float32)  # echo path; _w[-1] is the direct path
+        self._ref = deque(maxlen=512)   # (perf_counter, rms) per output block
+        self._buf = np.zeros(int((tail_s + filter_s + 1.0) * mic_rate), dtype=np.float32)
+        self._written = 0               # reference samples (mic rate) written so far
+        self._last_t = None             # perf_counter() of the newest reference sample
+        self._phase = 0.0               # resampler position carried into the next block
+        self._lock = threading.Lock()
+        self._hold_until = 0.0
+        self.last_near_end_at = None    # perf_counter() of the last block judged to be the user
+        self.suppressed = 0
+        self.passed = 0
+        self.cancelled = 0              # blocks decided on the echo-subtracted residual
+
+    def reference(self, block: np.ndarray, t: float):
+        """Called from the audio output callback with each block as it is played."""
+        block = np.asarray(block, dtype=np.float32)
+        level = _rms(block)
+        step = self.ref_rate / self.mic_rate
+        pos = np.arange(self._phase, len(block), step)
+        pcm = np.interp(pos, np.arange(len(block)), block).astype(np.float32)
+        self._phase = (pos[-1] + step - len(block)) if len(pos) else self._phase - len(block)
+        with self._lock:
+            self._ref.append((t, level))
+            idx = (self._written + np.arange(len(pcm))) % len(self._buf)
+            self._buf[idx] = pcm
+            self._written += len(pcm)
+            self._last_t = t
+
+    def _ref_level(self, t: float) -> float:
+        lo = t - self.tail_s
+        with self._lock:
+            return max((lvl for ts, lvl in reversed(self._ref) if lo <= ts <= t + 0.05), default=0.0)
+
+    def _window(self, t: float, n: int) -> np.ndarray | None:
+        """Reference for a mic block of n samples ending at t: the block's own span plus tail_s
+        and the filter length before it. None without enough history."""
+        length = self.taps + int(self.tail_s * self.mic_rate) + n
+        with self._lock:
+            if self._last_t is None:
+                return None
+            end = min(self._written, self._written - int(round((self._last_t - t) * self.mic_rate)))
+            start = end - length
+            if start < max(0, self._written - len(self._buf)):
+                return None
+            return self._buf[np.arange(start, end) % len(self._buf)]
+
+    @staticmethod
+    def _align(ref: np.ndarray, mic: np.ndarray) -> tuple[int, float]:
+        """(offset into ref, normalized correlation) of the best match for mic, via FFT."""
+        n, size = len(mic), 1 << (len(ref) + len(mic)).bit_length()
+        corr = np.fft.irfft(np.fft.rfft(ref, size) * np.conj(np.fft.rfft(mic, size)), size)
+        corr = corr[:len(ref) - n + 1]
+        sq = np.concatenate(([0.0], np.cumsum(ref.astype(np.float64) ** 2)))
+        energy = sq[n:] - sq[:-n]
+        rho = np.abs(corr) / np.sqrt(np.maximum(energy * float(mic @ mic), 1e-12))
+        j = int(np.argmax(rho))
+        return j, float(rho[j])
+
+    def playing(self, t: float) -> bool:
+        return self._ref_level(t) >= self.ref_floor
+
+    def process(self, mic: np.ndarray, t: float) -> tuple[np.ndarray, bool]:
+        """Returns (block to feed STT, near_end) for a float mic block captured at t."""
+        mic = np.asarray(mic, dtype=np.float32)
+        level = _rms(mic)
+        ref_win = self._window(t, len(mic))
+        if ref_win is not None and _rms(ref_win[self.taps:]) >= self.ref_floor and level > 0.0:
+            out, near, echo = self._cancel(mic, ref_win, t)
+        else:
+            out, near, echo = self._gate(mic, level, t)
+        if near:
+            self.last_near_end_at = t
+            self._hold_until = t + self.hangover_s
+        if echo and not near and t >= self._hold_until:
+            self.suppressed += 1
+            return np.zeros_like(mic), False
+        self.passed += 1
+        return out, near
+
+    def _cancel(self, mic: np.ndarray, ref_win: np.ndarray, t: float) -> tuple[np.ndarray, bool, bool]:
+        n, taps = len(mic), self.taps
+        tail = len(ref_win) - taps - n
+        j, rho = self._align(ref_win[taps:], mic)   # ref_win[taps + j + i] reaches the mic at i
+        if rho >= self.corr_min:
+            delay = tail - j
+            if self.delay is None or abs(delay - self.delay) > taps // 2:
+                # first echo path, or the device latency changed: start over from one tap
+                direct = ref_win[taps + j:taps + j + n]
+                self._w[:] = 0.0
+                self._w[-1] = float(mic @ direct) / max(float(direct @ direct), 1e-12)
+            self.delay = delay
+        if self.delay is None:
+            # no echo path found yet (double talk from the start, or nothing couples back)
+            return self._gate(mic, _rms(mic), t)
+        # row i: the taps reference samples ending with the direct-path one for mic sample i
+        first = tail - self.delay + 1
+        x = sliding_window_view(ref_win, taps)[first:first + n]
+        residual = mic - x @ self._w
+        # against the whole tail, not just this block: reverb of earlier words outlasts them
+        ref, res = _rms(ref_win[taps:]), _rms(residual)
+        near = res > self.margin * self.residual_ratio * ref + self.noise_floor
+        if not near and t >= self._hold_until:
+            power = float(np.einsum("ij,ij->", x, x)) / n  # per-row: n NLMS steps folded into one
+            if power > 1e-9:
+                self._w += (self.step / power) * (x.T @ residual)
+            self.residual_ratio = min(4.0, max(0.005, 0.95 * self.residual_ratio + 0.05 * (res / ref)))
+        self.cancelled += 1
+        return residual, near, True
+
+    def _gate(self, mic: np.ndarray, level: float, t: float) -> tuple[np.ndarray, bool, bool]:
+        ref = self._ref_level(t)
+        if ref < self.ref_floor:
+            # nothing of ours is playing: plain listening
+            return mic, level > self.noise_floor, False
+        near = level > self.margin * self.gain * ref + self.noise_floor
+        if not near and t >= self._hold_until:
+            self.gain = min(4.0, max(0.01, 0.95 * self.gain + 0.05 * (level / ref)))
+        return mic, near, True
+
+    def near_end_since(self, t: float) -> bool:
+        """Did the user (not our echo) make sound at or after t?"""
+        return self.last_near_end_at is not None and self.last_near_end_at >= t
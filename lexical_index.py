@@ -0,0 +1,238 @@
+# lexical_index.py
+"""
+Incremental BM25 inverted index for the memory store, kept next to the Chroma DB.
+Embedding search misses exact identifiers (file names, error strings, command names) and
+costs an embedding per query; this catches those, with no model in the loop.
+
+Persistence is an append-only op log (<db_path>/lexical.ndjson, one {"op": "add"|"del"} per
+line) replayed at start-up; compact() rewrites it once deletes pile up. add()/remove() only
+buffer their ops, flush() appends them through a handle kept open (ChromaMemoryService calls
+it from its write-behind worker). If the log is missing or out of step with the collection,
+e.g. after a crash lost the buffer, it's rebuilt from the collection.
+"""
+import os, re, json, math, logging, threading
+from collections import Counter, namedtuple
+
+K1 = float(os.getenv("ELYSIA_BM25_K1", "1.2"))
+B = float(os.getenv("ELYSIA_BM25_B", "0.75"))
+
+# Identifier-friendly: main_app.py, 0x1f, ModuleNotFoundError, /usr/bin/ollama stay whole
+# (their parts are indexed too), plain words split as usual.
+_TOKEN = re.compile(r"[a-z0-9_]+(?:[.\-/:][a-z0-9_]+)*")
+_SPLIT = re.compile(r"[.\-/:]")
+STOPWORDS = frozenset("""a about an and any are as at be but by can could did do does for from had has have he
+her his how i if in into is it its just me my no not of on or our she so some tell that the their
+them then there these they this to up was we were what when where which who why will with would
+you your said responded""".split())
+
+# terms: distinct query terms matched; ident: one of them is identifier-shaped (see is_identifier)
+LexHit = namedtuple("LexHit", "score id doc ts coverage terms ident")
+
+def tokenize(text: str) -> list[str]:
+    out = []
+    for tok in _TOKEN.findall(text.lower()):
+        if tok in STOPWORDS:
+            continue
+        out.append(tok)
+        if _SPLIT.search(tok):
+            out.extend(p for p in _SPLIT.split(tok) if p and p not in STOPWORDS)
+    return out
+
+def is_identifier(term: str) -> bool:
+    """main_app.py, persona_memory, /usr/bin/ollama: names something, unlike a plain word."""
+    return any(c in term for c in "._/")
+
+class LexicalIndex:
+    def __init__(self, path: str | None = None, k1: float = K1, b: float = B):
+        """
+        :param path: Op log file (None = in-memory only).
+        :param k1, b: BM25 parameters.
+        """
+        self.path = path
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.k1, self.b = k1, b
+        self._lock = threading.RLock()
+        self._io_lock = threading.RLock()  # taken before _lock; keeps flushed ops in order
+        self._reset()
+        self._dead = 0  # log lines describing removed docs; compact() reclaims them
+        self._unlogged = []  # ops not yet appended to the log, see flush()
+        self._file = None
+        if path:
+            self._replay()
+
+    def _reset(self):
+        self._docs = {}      # id -> (text, ts, Counter of terms, length)
+        self._postings = {}  # term -> {id: tf}
+        self._total_len = 0
+
+    def __len__(self):
+        return len(self._docs)
+
+    def __contains__(self, doc_id):
+        return doc_id in self._docs
+
+    def ts(self, doc_id: str) -> float | None:
+        d = self._docs.get(doc_id)
+        return d[1] if d else None
+
+    # --- persistence ---
+    def _replay(self):
+        if not os.path.exists(self.path):
+            return
+        lines = 0
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    op = json.loads(line)
+                except ValueError:
+                    continue  # torn last line after a crash
+                lines += 1
+                if op.get("op") == "add":
+                    self._index(op["id"], op.get("text", ""), op.get("ts"))
+                elif op.get("op") == "del":
+                    for doc_id in op.get("ids", []):
+                        self._unindex(doc_id)
+        self._dead = lines - len(self._docs)
+        logging.info(f"Lexical index loaded: {len(self._docs)} docs from {self.path}.")
+
+    def _log(self, ops: list[dict]):
+        if self.path and ops:
+            self._unlogged.extend(ops)
+
+    def flush(self):
+        """Appends the buffered ops to the log. Off the turn's path: add() doesn't touch the disk."""
+        if not self.path:
+            return
+        with self._io_lock:
+            with self._lock:
+                ops, self._unlogged = self._unlogged, []
+            if not ops:
+                return
+            try:
+                if self._file is None:
+                    self._file = open(self.path, "a", encoding="utf-8")
+                self._file.write("".join(json.dumps(op, ensure_ascii=False) + "\n" for op in ops))
+                self._file.flush()
+            except OSError as e:
+                logging.warning(f"Lexical index log write failed: {e}")
+
+    def close(self):
+        self.flush()
+        with self._io_lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def compact(self, min_dead: int = 1000):
+        """Rewrites the op log with only live docs, once at least min_dead lines are stale."""
+        if not self.path:
+            return
+        with self._io_lock, self._lock:
+            if self._dead < min_dead:
+                return
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            tmp = self.path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                for doc_id, (text, ts, _, _) in self._docs.items():
+                    f.write(json.dumps({"op": "add", "id": doc_id, "text": text, "ts": ts}, ensure_ascii=False) + "\n")
+            os.replace(tmp, self.path)
+            self._unlogged = []  # the rewrite holds the current state, buffered ops included
+            logging.info(f"Lexical index compacted: dropped {self._dead} stale lines.")
+            self._dead = 0
+
+    def rebuild(self, collection, page: int = 1000):
+        """Re-indexes everything in a Chroma collection and rewrites the log."""
+        with self._io_lock, self._lock:
+            self._reset()
+            total = collection.count()
+            for off in range(0, total, page):
+                got = collection.get(offset=off, limit=page, include=["documents", "metadatas"])
+                for doc_id, doc, meta in zip(got["ids"], got["documents"], got.get("metadatas") or [{}] * len(got["ids"])):
+                    self._index(doc_id, doc or "", (meta or {}).get("ts"))
+            self._dead = 1 if self.path else 0
+            self.compact(min_dead=1)
+            logging.info(f"Lexical index rebuilt from collection: {len(self._docs)} docs.")
+
+    # --- updates ---
+    def _index(self, doc_id: str, text: str, ts):
+        if doc_id in self._docs:
+            self._unindex(doc_id)
+        terms = Counter(tokenize(text))
+        length = sum(terms.values())
+        self._docs[doc_id] = (text, ts, terms, length)
+        self._total_len += length
+        for term, tf in terms.items():
+            self._postings.setdefault(term, {})[doc_id] = tf
+
+    def _unindex(self, doc_id: str) -> bool:
+        d = self._docs.pop(doc_id, None)
+        if d is None:
+            return False
+        self._total_len -= d[3]
+        for term in d[2]:
+            posting = self._postings.get(term)
+            if posting is not None:
+                posting.pop(doc_id, None)
+                if not posting:
+                    del self._postings[term]
+        return True
+
+    def add(self, ids: list[str], docs: list[str], metadatas: list[dict] | None = None):
+        metadatas = metadatas or [{}] * len(ids)
+        with self._lock:
+            ops = []
+            for doc_id, doc, meta in zip(ids, docs, metadatas):
+                ts = (meta or {}).get("ts")
+                self._index(doc_id, doc, ts)
+                ops.append({"op": "add", "id": doc_id, "text": doc, "ts": ts})
+            self._log(ops)
+
+    def remove(self, ids: list[str]):
+        with self._lock:
+            gone = [doc_id for doc_id in ids if self._unindex(doc_id)]
+            if gone:
+                self._dead += len(gone) + 1
+                self._log([{"op": "del", "ids": gone}])
+
+    # --- search ---
+    def _idf(self, term: str) -> float:
+        n, df = len(self._docs), len(self._postings.get(term, ()))
+        return math.log(1.0 + (n - df + 0.5) / (df + 0.5))
+
+    def search(self, query: str, k: int = 10) -> list[LexHit]:
+        """
+        Top-k BM25 hits. coverage is the share of the query's idf mass the doc matches
+        (1.0 = every query term, rare ones weighing most); unknown query terms count as rare.
+        Stopwords don't count, so a one-content-word query has coverage 1.0 on any doc with
+        that word: check terms/ident before trusting it.
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        with self._lock:
+            if not terms or not self._docs:
+                return []
+            avgdl = self._total_len / len(self._docs) or 1.0
+            idfs = {t: self._idf(t) for t in terms}
+            mass = sum(idfs.values()) or 1.0
+            scores, matched, hits = {}, {}, {}
+            for t in terms:
+                posting = self._postings.get(t)
+                if not posting:
+                    continue
+                idf = idfs[t]
+                for doc_id, tf in posting.items():
+                    dl = self._docs[doc_id][3]
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (
+                        tf + self.k1 * (1 - self.b + self.b * dl / avgdl))
+                    matched[doc_id] = matched.get(doc_id, 0.0) + idf
+                    hits.setdefault(doc_id, []).append(t)
+            top = sorted(scores, key=scores.get, reverse=True)[:k]
+            return [LexHit(scores[d], d, self._docs[d][0], self._docs[d][1], matched[d] / mass,
+                           len(hits[d]), any(is_identifier(t) for t in hits[d])) for d in top]
+
+    def max_idf(self, query: str) -> float:
+        """Rarest known query term's idf (high = the query names something specific)."""
+        with self._lock:
+            return max((self._idf(t) for t in set(tokenize(query)) if t in self._postings), default=0.0)
@@ -1,14 +1,62 @@
 # llm_service.py
 import llm
+import os
+import time
 import logging
+import threading
+from collections import deque
+
+from summarizer_service import ExtractiveSummarizer
+from tracing import TRACER
 
 DEFAULT_MODEL = "elysia"  # your Ollama model name; change if needed
+# Rough context budget for the running conversation (system + kept turns). Keep it under the
+# model's num_ctx; when exceeded, the oldest turns are summarized and dropped down to CTX_KEEP.
+CTX_TOKENS = int(os.getenv("ELYSIA_CTX_TOKENS", "3000"))
+CTX_KEEP = float(os.getenv("ELYSIA_CTX_KEEP", "0.5"))    # fraction of the budget kept after a trim
+SUMMARY_CHARS = int(os.getenv("ELYSIA_CTX_SUMMARY_CHARS", "800"))
+
+def _est_tokens(text: str | None) -> int:
+    return len(text or "") // 4 + 1  # ~4 chars/token; good enough for a budget
+
+def _ollama_timings(responses) -> dict:
+    """Sums Ollama's prompt-eval (prefill) and eval (generation) stats over a chain's responses."""
+    t = {"prefill_ms": 0.0, "generate_ms": 0.0, "prompt_tokens": 0, "output_tokens": 0}
+    seen = False
+    for r in responses:
+        j = getattr(r, "response_json", None) or {}
+        if "prompt_eval_duration" not in j and "eval_duration" not in j:
+            continue
+        seen = True
+        t["prefill_ms"] += (j.get("prompt_eval_duration") or 0) / 1e6  # ns
+        t["generate_ms"] += (j.get("eval_duration") or 0) / 1e6
+        t["prompt_tokens"] += j.get("prompt_eval_count") or 0
+        t["output_tokens"] += j.get("eval_count") or 0
+    return t if seen else {}
 
 class LLMService:
     """LLM wrapper using Simon Willison's `llm` Python API, with tool support."""
 
-    def __init__(self, model_id: str = DEFAULT_MODEL):
+    def __init__(self, model_id: str = DEFAULT_MODEL, model=None):
         self.model_id = model_id
+        self._prefill_broken = False
+        # NEW: one long-lived conversation per session (see begin_session)
+        self.persona = None
+        self.system = None
+        self.tools = []
+        self.conversation = None
+        self._turns = deque()      # (responses, user text, answer, est. tokens) per kept turn
+        self._summary = []         # one line per turn trimmed out of the conversation
+        self._summary_pending = False
+        self._lock = threading.Lock()
+        self.last_timings = {}
+        self._totals = {"turns": 0, "prefill_ms": 0.0, "generate_ms": 0.0, "prompt_tokens": 0,
+                        "output_tokens": 0, "trims": 0}
+        self._extractive = ExtractiveSummarizer(max_sentences=1, max_chars=160)
+        self.trace = True  # record llm_prefill/llm_generate spans on the current (voice) turn
+        if model is not None:
+            self.model = model  # fork(): the model is already loaded
+            return
         logging.info(f"Initializing LLMService via llm: model='{self.model_id}'")
         try:
             self.model = llm.get_model(self.model_id)
@@ -16,6 +64,162 @@ class LLMService:
             logging.error(f"llm.get_model('{self.model_id}') failed: {e}")
             raise
 
+    def warmup(self):
+        """Short ping so Ollama has the model loaded before the first real turn."""
+        self.model.prompt("ping", system="Reply with one word.").text()
+
+    # --- session (stable prefix + rolling history) ---
+    @staticmethod
+    def tool_docs(tools: list) -> str:
+        """One line per tool method: name + first docstring line, in definition order."""
+        lines = []
+        for box in tools:
+            for name, fn in vars(type(box)).items():
+                doc = (getattr(fn, "__doc__", None) or "").strip()
+                if name.startswith("_") or not callable(fn) or not doc:
+                    continue
+                lines.append(f"- {name}: {doc.splitlines()[0]}")
+        return "\n".join(lines)
+
+    def begin_session(self, persona: str, tools: list | None = None):
+        """
+        Starts the long-lived conversation. The system prompt (persona + tool docs) is fixed
+        for the whole session, so every request shares it as a prefix and the server's prompt
+        (KV) cache stays valid across turns; per-turn context goes into the turn's user message.
+        """
+        self.persona = persona
+        self.tools = tools or []
+        docs = self.tool_docs(self.tools)
+        self.system = persona + ("\n\nTools:\n" + docs if docs else "")
+        with self._lock:
+            self.conversation = self.model.conversation()
+            self._turns.clear()
+            self._summary, self._summary_pending = [], False
+        logging.info(f"LLM session started: system prefix ~{_est_tokens(self.system)} tokens, "
+                     f"budget {CTX_TOKENS}.")
+
+    def fork(self, tools: list | None = None) -> "LLMService":
+        """
+        Another session on the same loaded model (turn_engine: one per conversation): its own
+        history, summary and timings, the same persona and, unless tools is given, the same
+        tools, so the system prefix stays identical. Its spans stay out of the voice turn's trace.
+        """
+        other = LLMService(self.model_id, model=self.model)
+        other.trace = False
+        other._prefill_broken = self._prefill_broken
+        if self.persona is not None:
+            other.begin_session(self.persona, self.tools if tools is None else tools)
+        return other
+
+    def _turn_message(self, text: str, memories: list[str] | None) -> str:
+        # context first, user's words last: a speculative prefill on a partial transcript then
+        # shares everything up to where the partial and the final text diverge
+        parts = ["Relevant context:\n" + ("\n".join(memories or []) or "[none]")]
+        if self._summary_pending and self._summary:
+            parts.append("Earlier in this conversation (older turns, summarized):\n" + "\n".join(self._summary))
+        parts.append("User: " + text)
+        return "\n\n".join(parts)
+
+    def _trim(self):
+        """Summarizes and drops the oldest turns once the conversation is over its token budget."""
+        used = _est_tokens(self.system) + sum(t[3] for t in self._turns)
+        if used <= CTX_TOKENS or len(self._turns) <= 1:
+            return
+        # trim well below the budget: every trim shifts the history, costing one full re-prefill
+        dropped = 0
+        while len(self._turns) > 1 and used > CTX_TOKENS * CTX_KEEP:
+            n, user, answer, tokens = self._turns.popleft()
+            del self.conversation.responses[:n]
+            used -= tokens
+            dropped += 1
+            gist = self._extractive.summarize(answer) or answer[:160]
+            self._summary.append(f"- User: {user[:120]} | Elysia: {gist}")
+        while sum(map(len, self._summary)) > SUMMARY_CHARS and len(self._summary) > 1:
+            self._summary.pop(0)
+        self._summary_pending = True
+        self._totals["trims"] += 1
+        logging.info(f"LLM context trimmed: {dropped} oldest turn(s) summarized, ~{used} tokens kept.")
+
+    def stream_turn(self, text: str, memories: list[str] | None = None,
+                    cancel: threading.Event | None = None):
+        """
+        One user turn on the session conversation: like stream(), but history is carried over
+        and the retrieved memories ride in this turn's message after the fixed system prefix.
+        Records prefill vs generation time (Ollama's prompt_eval/eval durations) per turn.
+        """
+        with self._lock:
+            message = self._turn_message(text, memories)
+            conv = self.conversation
+            n0 = len(conv.responses) if conv is not None else 0
+        if conv is None:
+            yield from self.stream(message, system=self.system, tools=self.tools, cancel=cancel)
+            return
+        parts = []
+        completed = False
+        try:
+            for chunk in self._iterate(conv.chain(message, system=self.system, tools=self.tools), cancel):
+                parts.append(chunk)
+                yield chunk
+            completed = not (cancel is not None and cancel.is_set())
+        finally:
+            t_end = time.perf_counter()
+            with self._lock:
+                added = conv.responses[n0:]
+                timings = _ollama_timings(added)
+                if completed:
+                    answer = "".join(parts)
+                    self._turns.append((len(added), text, answer, _est_tokens(message) + _est_tokens(answer)))
+                    self._summary_pending = False
+                    self._trim()
+                else:
+                    # interrupted: leave no half-finished exchange (or dangling tool call) behind
+                    del conv.responses[n0:]
+                self.last_timings = timings
+                if timings:
+                    self._totals["turns"] += 1
+                    for k, v in timings.items():
+                        self._totals[k] += v
+            if timings and self.trace:
+                # Ollama reports durations, not timestamps: lay them out back to back before t_end
+                gen_start = t_end - timings["generate_ms"] / 1000
+                TRACER.record("llm_prefill", gen_start - timings["prefill_ms"] / 1000, gen_start,
+                              tokens=timings["prompt_tokens"])
+                TRACER.record("llm_generate", gen_start, t_end, tokens=timings["output_tokens"])
+
+    def prefill(self, prompt: str, memories: list[str] | None = None):
+        """
+        Evaluates the next turn's full prefix (system, kept history, this turn's message for
+        prompt) and generates a single token, so the server's KV cache holds it (Ollama reuses
+        the longest common prefix of the previous request). The following stream_turn() with
+        the same memories and a final text starting the same way skips most of its prefill.
+        """
+        if self._prefill_broken:
+            return
+        with self._lock:
+            message = self._turn_message(prompt, memories)
+            target = self.model
+            if self.conversation is not None:
+                # throwaway copy: the 1-token reply must not become part of the real history
+                target = self.model.conversation()
+                target.responses = list(self.conversation.responses)
+        try:
+            target.prompt(message, system=self.system or "", tools=self.tools, num_predict=1).text()
+        except (TypeError, ValueError) as e:
+            # model plugin without a num_predict option (llm validates options); a full reply
+            # would cost more than the prefill saves
+            self._prefill_broken = True
+            logging.warning(f"LLM prefill unsupported by '{self.model_id}', disabled: {e}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            s = dict(self._totals)
+            s["kept_turns"] = len(self._turns)
+            s["context_tokens_est"] = _est_tokens(self.system) + sum(t[3] for t in self._turns)
+        for k in ("prefill_ms", "generate_ms"):
+            s[k] = round(s[k], 1)
+        return s
+
+    # --- stateless calls (summaries, one-offs) ---
     def prompt(self, prompt: str, system: str | None = None, tools: list | None = None) -> str:
         """
         One-shot prompt. If tools provided, model may call them; use chain() for auto-return.
@@ -24,14 +228,32 @@ class LLMService:
         # If tools were requested, caller can handle resp.tool_calls() etc.
         return resp.text()
 
+    @staticmethod
+    def _iterate(chain, cancel: threading.Event | None):
+        chain = iter(chain)
+        try:
+            for chunk in chain:
+                if cancel is not None and cancel.is_set():
+                    logging.info("LLM chain cancelled.")
+                    break
+                yield chunk
+        finally:
+            close = getattr(chain, "close", None)
+            if close:
+                close()  # drops the in-flight response instead of reading it to the end
+
+    def stream(self, prompt: str, system: str | None = None, tools: list | None = None,
+               cancel: threading.Event | None = None):
+        """
+        Same agent-style chain as chain(), but yields text chunks as the model produces them
+        so callers (TTS) can start working before the chain finishes. Setting cancel stops
+        the chain at the next chunk (barge-in); no further tool calls are made.
+        """
+        yield from self._iterate(self.model.chain(prompt, system=system or "", tools=tools or []), cancel)
+
     def chain(self, prompt: str, system: str | None = None, tools: list | None = None) -> str:
         """
         Run an agent-style chain (model can call tools; results fed back automatically).
         Returns final stitched text.
         """
-        chain = self.model.chain(prompt, system=system or "", tools=tools or [])
-        # Gather the full final text
-        chunks = []
-        for chunk in chain:
-            chunks.append(chunk)
-        return "".join(chunks)
+        return "".join(self.stream(prompt, system=system, tools=tools))
@@ -1,28 +1,113 @@
 # main_app.py
-import logging, os, datetime, traceback
+import logging, os, sys, traceback, time, json, threading
+from concurrent.futures import ThreadPoolExecutor
 
 from stt_service import SpeechToTextService
 from tts_service import TextToSpeechService
 from llm_service import LLMService
 from memory_service_chroma import ChromaMemoryService as MemoryService
 from tool_service import ElysiaTools
+from python_workers import get_pool
+from tool_cache import TOOL_CACHE
+from project_index import get_index
+from speech_segmenter import segment_stream
+from summarizer_service import SpokenSummarizer
+from speculation import Speculator
+from response_store import ResponseStore
+from memory_consolidation import Consolidator
+from turn_engine import TurnEngine, LLMScheduler, PRIORITY_VOICE, VOICE_SESSION
+from tts_ws import WS
+from tracing import TRACER
 
 logging.basicConfig(
     level=logging.INFO,
     format="%(asctime)s - %(levelname)s - %(message)s",
     handlers=[logging.FileHandler("elysia.log", mode="a", encoding="utf-8"),
-              logging.StreamHandler()]
+              logging.StreamHandler()],
+    force=True,  # an import above may already have logged (and so configured a bare handler)
 )
 
+# Fixed lines spoken by the app itself; pre-rendered into the TTS audio cache at startup
+SYSTEM_PHRASES = (
+    "System online. Ready.",
+    "Shutting down. Goodbye.",
+    "Encountered an internal error. Attempting recovery.",
+)
+
+def _start_service(name: str, factory, warm: bool) -> tuple[object, dict]:
+    """Builds one service (and warms it up) on a startup pool thread; returns it with timings."""
+    t0 = time.perf_counter()
+    svc = factory()
+    timing = {"init_s": round(time.perf_counter() - t0, 3), "warmup_s": 0.0}
+    if warm and hasattr(svc, "warmup"):
+        t1 = time.perf_counter()
+        try:
+            svc.warmup()
+        except Exception as e:
+            # a failed warm-up just means a slower first turn; don't refuse to start over it
+            logging.warning(f"Warm-up of {name} failed: {e}")
+        timing["warmup_s"] = round(time.perf_counter() - t1, 3)
+    logging.info(f"Startup: {name} ready (init {timing['init_s']}s, warm-up {timing['warmup_s']}s)")
+    return svc, timing
+
 class ConversationalAI:
-    def __init__(self):
-        self.llm = LLMService()  # uses llm.get_model("elysia")
-        self.stt = SpeechToTextService()
-        self.tts = TextToSpeechService()
-        self.memory = MemoryService()
-        self.tools = ElysiaTools()  # llm toolbox (read/write/exec/gemini_cli)
-        self.response_log_dir = "response_logs"
-        os.makedirs(self.response_log_dir, exist_ok=True)
+    def __init__(self, stream_tts: bool | None = None, warmup: bool | None = None, standby: bool = False):
+        # Services are independent, so build them concurrently; each one defers its heavy
+        # imports (torch, kokoro, RealtimeSTT, chromadb) into its constructor.
+        if warmup is None:
+            warmup = os.getenv("ELYSIA_WARMUP", "1") == "1"
+        t0 = time.perf_counter()
+        factories = {
+            "llm": LLMService,             # uses llm.get_model("elysia")
+            "stt": lambda: SpeechToTextService(standby=standby),  # a standby never opens the mic
+            "tts": TextToSpeechService,
+            "memory": lambda: MemoryService(standby=standby),  # nor the Chroma store
+            "tools": ElysiaTools,          # llm toolbox (read/write/exec/gemini_cli)
+            "python": get_pool,            # warm worker processes behind execute_python
+            "index": get_index,            # inverted index behind search_project
+        }
+        with ThreadPoolExecutor(max_workers=len(factories), thread_name_prefix="startup") as pool:
+            futures = {name: pool.submit(_start_service, name, f, warmup) for name, f in factories.items()}
+            built, timings = {}, {}
+            for name, fut in futures.items():
+                built[name], timings[name] = fut.result()  # re-raises the first init failure
+        self.llm, self.stt, self.tts = built["llm"], built["stt"], built["tts"]
+        self.memory, self.tools = built["memory"], built["tools"]
+        t1 = time.perf_counter()
+        try:
+            self.tts.prerender(SYSTEM_PHRASES)  # no-op once they're on disk
+        except Exception as e:
+            logging.warning(f"TTS pre-render failed: {e}")
+        prerender_s = round(time.perf_counter() - t1, 3)
+        self.startup_report = {
+            "wall_s": round(time.perf_counter() - t0, 3),
+            "prerender_s": prerender_s,
+            "serial_s": round(sum(t["init_s"] + t["warmup_s"] for t in timings.values()), 3),
+            "services": timings,
+        }
+        logging.info("Startup report: " + json.dumps(self.startup_report))
+        try:
+            with open("startup_report.json", "w", encoding="utf-8") as f:
+                json.dump(self.startup_report, f, indent=2)
+        except Exception as e:
+            logging.warning(f"Could not write startup_report.json: {e}")
+
+        self.responses = None  # opened by activate()
+        self.consolidator = None  # started by activate(): only the live worker consolidates
+        # Streaming mode: speak the answer sentence-by-sentence while the chain is still running
+        # (no summary pass). Off by default; ELYSIA_STREAM_TTS=1 turns it on.
+        if stream_tts is None:
+            stream_tts = os.getenv("ELYSIA_STREAM_TTS", "0") == "1"
+        self.stream_tts = stream_tts
+        # What to say out loud for long answers (ELYSIA_SUMMARY_MODE=tagged|extractive|llm)
+        # only the llm strategy calls the model, so only it takes a scheduler slot (set up below)
+        self.summarizer = SpokenSummarizer(
+            self.llm, slot=lambda: self.scheduler.slot(PRIORITY_VOICE, who=VOICE_SESSION))
+        if self.stream_tts and self.summarizer.mode == "tagged":
+            # streaming speaks the answer as it comes and never summarizes: a SPOKEN line would
+            # just be read out (and stored) verbatim
+            logging.warning("ELYSIA_SUMMARY_MODE=tagged doesn't apply with ELYSIA_STREAM_TTS=1; using 'extractive'.")
+            self.summarizer.mode = "extractive"
 
         # Persona + capability note (keep short; details in memory context)
         self.persona_prompt = (
@@ -30,82 +115,258 @@ class ConversationalAI:
             "Use tools when they improve accuracy or enable real action. "
             "Prefer concrete steps over vague generalities. Avoid corporate tone."
         )
+        if self.summarizer.persona_note():
+            self.persona_prompt += " " + self.summarizer.persona_note()
+        # One conversation for the whole session; persona + tool docs are its fixed system prefix
+        self.llm.begin_session(self.persona_prompt, tools=[self.tools])
+
+        # Every model request (voice, WS text sessions, prefill, LLM summaries) takes a slot here
+        self.scheduler = LLMScheduler()
+
+        # Barge-in (full duplex STT): user speech during a reply cancels TTS and the LLM chain
+        self._cancel = threading.Event()
+        self._replying = threading.Event()
+        if self.stt.full_duplex:
+            self.stt.echo.ref_rate = self.tts.player.sample_rate  # resampled to the mic rate
+            self.tts.player.add_tap(self.stt.echo.reference)
+            self.stt.on_speech_start = self._on_user_speech
+
+        # Speculative retrieval + prompt prefill on stabilized partial transcripts
+        self.speculator = None
+        if self.stt.speculative:
+            self.speculator = Speculator(self.memory, prefill=self._prefill)
+            self.stt.on_partial = self.speculator.on_partial
 
-        # Ingest prior crash info (from watchdog or last run)
+        # Mic + WS text sessions on one asyncio loop (see turn_engine.py); run() drives it
+        self.engine = TurnEngine(self, self.scheduler)
+
+        # Standby (see supervisor.py): models loaded and warm, but off the mic, WS port and
+        # stores until activate(). Otherwise go live right away.
+        self.standby = standby
+        if standby:
+            self.stt.set_active(False)
+            logging.info("Standby: services warm, waiting to be promoted.")
+        else:
+            self.activate()
+
+    def activate(self, died_at: float | None = None) -> float | None:
+        """
+        Takes the process live: mic, WS/metrics ports, response store, crash report handoff.
+        died_at (time.time()) is when the previous worker died; returns the failover time in ms.
+        """
+        if self.standby:
+            self.stt.set_active(True)
+            self.memory.open()  # the previous worker is gone, the store is ours now
+            self.standby = False
+        WS.start()
+        TRACER.serve_prometheus()  # only if ELYSIA_METRICS_PORT is set
+
+        # Full responses: one indexed, append-only store keyed by turn_id (was response_logs/*.txt)
+        self.responses = ResponseStore()
+        try:
+            self.responses.migrate_dir("response_logs")
+        except Exception as e:
+            logging.warning(f"Migrating response_logs failed (left in place): {e}")
+
+        failover_ms = None
+        if died_at is not None:
+            failover_ms = round(1000 * (time.time() - died_at), 1)
+            logging.info(f"Failover: promoted {failover_ms} ms after the previous worker died.")
+
+        # Ingest prior crash info (from the supervisor, watchdog or last run)
         if os.path.exists("crash_info.txt"):
             try:
                 crash = open("crash_info.txt", "r", encoding="utf-8").read()
-                self.memory.add_system_memory(f"(Last crash report captured on restart)\n{crash}")
+                note = "(Last crash report captured on restart)"
+                if failover_ms is not None:
+                    note += f" (standby took over in {failover_ms} ms)"
+                self.memory.add_system_memory(f"{note}\n{crash}")
                 logging.info("Loaded crash_info.txt into memory and removed it.")
                 os.remove("crash_info.txt")
             except Exception as e:
                 logging.error(f"Failed to load crash_info.txt: {e}")
 
-    def _muzzle_and_save(self, full_response: str) -> tuple[str, str]:
+        # Background memory tiering: dedup, summaries, cold archive (ELYSIA_CONSOLIDATE_EVERY_S=0 disables)
+        self.consolidator = Consolidator(self.memory, idle=self.engine.idle)
+        self.consolidator.start()
+        return failover_ms
+
+    def _muzzle_and_save(self, full_response: str, turn_id: str) -> tuple[str, str]:
         """
-        Create a one/two-sentence spoken summary and save the full response to file.
-        If summarization fails, speak a truncation.
+        Create a one/two-sentence spoken summary and save the full response under turn_id.
+        Returns (spoken summary, response text with any SPOKEN tag line removed).
+        The summarizer falls back tagged -> extractive -> LLM -> truncation.
         """
-        # Summarize using the same model (no tools)
+        summary = self.summarizer.summarize(full_response)
+        self._save_response(summary.text, turn_id)
+        return summary.spoken, summary.text
+
+    def _save_response(self, full_response: str, turn_id: str):
+        self.responses.put(turn_id, full_response)
+        logging.info(f"Saved full response for turn {turn_id} ({len(full_response)} chars)")
+
+    def _on_user_speech(self, started_at: float):
+        """STT callback (its thread): the user started talking. Mid-reply, that's a barge-in."""
+        if not self._replying.is_set() or self._cancel.is_set():
+            return
+        # only speech the echo gate attributed to the user may interrupt us, not our own voice
+        if self.stt.echo and not self.stt.echo.near_end_since(started_at - 1.0):
+            return
+        self._cancel.set()
+        cut = self.tts.cancel_all()
+        now = time.perf_counter()
+        WS.state("listening")
+        TRACER.record("barge_in", started_at, now, cancelled=cut)
+        logging.info(f"Barge-in: reply cancelled {1000 * (now - started_at):.0f} ms after speech start")
+
+    def _prefill(self, prompt: str, memories: list[str] | None = None):
+        """Speculative prefill, only if a model slot is free right now: it never queues."""
+        with self.scheduler.slot(PRIORITY_VOICE, who=VOICE_SESSION, wait=False) as waited:
+            if waited is not None:
+                self.llm.prefill(prompt, memories)
+
+    def _llm_chunks(self, prompt: str, memories: list[str]):
+        """
+        LLM turn chunks, traced as llm_queue (waiting for a scheduler slot) / llm_first_token /
+        llm_total. Stops on barge-in, also while still queued.
+        """
+        t0 = time.perf_counter()
+        first = None
         try:
-            summary = self.llm.prompt(
-                "Summarize succinctly in 1-2 sentences for speech:\n\n" + full_response,
-                system="Be direct, no fluff."
-            )
-        except Exception as e:
-            logging.error(f"Summary failed: {e}")
-            summary = (full_response[:150] + "...") if len(full_response) > 150 else full_response
+            with self.scheduler.slot(PRIORITY_VOICE, who=VOICE_SESSION, cancel=self._cancel) as waited:
+                if waited is None:
+                    return
+                TRACER.record("llm_queue", t0, t0 + waited)
+                for chunk in self.llm.stream_turn(prompt, memories, cancel=self._cancel):
+                    if first is None:
+                        first = time.perf_counter()
+                        TRACER.record("llm_first_token", t0, first)
+                    yield chunk
+        finally:
+            TRACER.record("llm_total", t0, time.perf_counter())
+
+    def _stream_and_save(self, prompt: str, memories: list[str], turn_id: str):
+        """
+        Streaming mode: LLM chunks -> sentence segmenter -> TTS, all overlapping.
+        Returns the full stitched response (saved under turn_id) and the playback handle.
+        """
+        parts = []
 
-        ts = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-        fp = os.path.join(self.response_log_dir, f"response_{ts}.txt")
-        with open(fp, "w", encoding="utf-8") as f:
-            f.write(full_response)
-        logging.info(f"Saved full response to {fp}")
-        return summary, fp
+        def _tee():
+            for chunk in self._llm_chunks(prompt, memories):
+                parts.append(chunk)
+                yield chunk
 
-    def run(self):
-        self.tts.speak("System online. Ready.")
-        logging.info("Elysia running.")
+        handle = self.tts.speak_stream(segment_stream(_tee()))
+        full_response = "".join(parts)
+        self._save_response(full_response, turn_id)
+        return full_response, handle
 
-        while True:
-            try:
-                # 1) STT
-                user_input = self.stt.listen()
-                if not user_input:
-                    continue
-                logging.info(f"USER: {user_input}")
+    def voice_turn(self, user_input: str):
+        """
+        One spoken turn, after 1) STT in turn_engine's mic session: retrieve, reply, speak, persist.
+        Runs off the engine's loop; raising ends run() (crash path).
+        """
+        logging.info(f"USER: {user_input}")
+        turn_start = time.perf_counter()
+        # the turn clock starts when VAD ended the utterance, so STT latency is in it
+        stop_at = self.stt.last_record_stop_at
+        if stop_at is None or stop_at > turn_start:
+            stop_at = turn_start
+        turn_id = TRACER.begin_turn(started_at=stop_at)  # also the memory/response-store key
+        TRACER.record("stt", stop_at, turn_start)
+        self._cancel.clear()
+        self._replying.set()
+        self.tts.last_first_audio_at = None  # only this turn's audio counts towards its TTFA
 
-                # 2) Memory retrieval (hybrid could be extended later)
+        # 2) Memory retrieval (hybrid BM25 + vector, see memory_service_chroma); reuses the speculative
+        # retrieval from the partial transcript when the final text still matches it
+        with TRACER.span("retrieve") as sp:
+            memories = self.speculator.take(user_input) if self.speculator else None
+            sp["speculative"] = memories is not None
+            if memories is None:
                 memories = self.memory.retrieve_relevant_memories(user_input)
-                memory_context = "\n".join(memories)
 
-                # 3) Build system + prompt (short system, stuff context in system too)
-                system = self.persona_prompt + "\n\nRelevant context:\n" + (memory_context or "[none]")
-                prompt = user_input
+        # 3) Prompt: the session's fixed system prefix + history, then memories + user_input
+        prompt = user_input
 
+        handle = None
+        try:
+            if self.stream_tts:
+                # 4+5) Chain with tools, speaking sentences as they are generated; save long
+                full_response, handle = self._stream_and_save(prompt, memories, turn_id)
+            else:
                 # 4) Chain with tools (model decides to call them)
-                full_response = self.llm.chain(prompt, system=system, tools=[self.tools])
+                full_response = "".join(self._llm_chunks(prompt, memories))
 
                 # 5) Speak short; save long
-                spoken_summary, path = self._muzzle_and_save(full_response)
-                self.tts.speak(spoken_summary)
+                if self._cancel.is_set():
+                    self._save_response(full_response, turn_id)
+                else:
+                    with TRACER.span("summary"):
+                        spoken_summary, full_response = self._muzzle_and_save(full_response, turn_id)
+                    handle = self.tts.speak(spoken_summary)
+        finally:
+            self._replying.clear()
 
-                # 6) Persist memory
-                self.memory.add_memory(user_input, full_response)
-                self.memory.add_system_memory(f"(Saved full response to {path})")
+        # interrupted: remember what the user actually heard, not what we meant to say
+        memory_response = full_response
+        if self._cancel.is_set():
+            spoken = self.tts.spoken_text(handle) if handle else ""
+            memory_response = (spoken + " " if spoken else "") + "[interrupted by user]"
 
-            except KeyboardInterrupt:
-                logging.info("Shutdown requested.")
-                self.tts.speak("Shutting down. Goodbye.")
-                break
-            except Exception as e:
-                logging.error("Fatal error in main loop: %s", e)
-                logging.error("--- TRACEBACK ---\n" + traceback.format_exc())
-                self.tts.speak("Encountered an internal error. Attempting recovery.")
-                # write crash info for watchdog + next boot
-                with open("crash_info.txt", "w", encoding="utf-8") as cf:
-                    cf.write(str(e) + "\n" + traceback.format_exc())
-                break  # let watchdog restart
+        if self.tts.last_first_audio_at is not None:
+            ttfa = self.tts.last_first_audio_at - turn_start
+            TRACER.record("time_to_first_audio", turn_start, self.tts.last_first_audio_at)
+            logging.info(f"Turn metrics: time_to_first_audio={ttfa:.3f}s "
+                         f"mode={'stream' if self.stream_tts else 'summary'} "
+                         f"tool_cache={json.dumps(TOOL_CACHE.stats()['tools'])}"
+                         + (f" speculation={json.dumps(self.speculator.stats())}" if self.speculator else "")
+                         + f" llm={json.dumps(self.llm.last_timings)}")
+
+        # 6) Persist memory
+        with TRACER.span("memory_write"):
+            self.memory.add_memory(user_input, memory_response, turn_id=turn_id)
+
+        WS.metrics(TRACER.end_turn(), turn_id)
+
+    def run(self) -> bool:
+        """Main loop. True after a requested shutdown, False after a crash (crash_info.txt written)."""
+        self.tts.speak("System online. Ready.")
+        logging.info("Elysia running.")
+
+        try:
+            # mic turns (voice_turn) + WS text sessions; only returns by raising
+            self.engine.run()
+        except KeyboardInterrupt:
+            logging.info("Shutdown requested.")
+            # the turn in flight runs on an engine thread, not here: stop it and let it finish
+            # writing before the stores close
+            self._cancel.set()
+            self.tts.cancel_all()
+            if not self.engine.drain(timeout=10):
+                logging.warning("Shutdown: a turn was still running after 10s; closing the stores anyway.")
+            self.tts.speak("Shutting down. Goodbye.")
+            if self.consolidator:
+                self.consolidator.stop()
+            self.memory.close()
+            self.responses.close()
+            return True
+        except Exception as e:
+            TRACER.end_turn()  # keep the partial spans of the turn that blew up
+            logging.error("Fatal error in main loop: %s", e)
+            logging.error("--- TRACEBACK ---\n" + traceback.format_exc())
+            self.tts.speak("Encountered an internal error. Attempting recovery.")
+            # don't lose queued memory writes on the way down
+            try:
+                if not self.memory.flush(timeout=10):
+                    logging.error("Memory flush timed out; some queued writes may be lost.")
+            except Exception as fe:
+                logging.error(f"Memory flush failed: {fe}")
+            # write crash info for watchdog + next boot
+            with open("crash_info.txt", "w", encoding="utf-8") as cf:
+                cf.write(str(e) + "\n" + traceback.format_exc())
+            return False  # let the supervisor (or watchdog) restart us
 
 if __name__ == "__main__":
-    ConversationalAI().run()
+    sys.exit(0 if ConversationalAI().run() else 1)
@@ -0,0 +1,215 @@
+# mem_journal.py
+import os, re, io, json, gzip, time, hashlib, logging, threading
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Segment names: <day>.ndjson, then <day>.<n>.ndjson after a size rollover.
+# Sealed segments get compressed in place: <day>[.<n>].ndjson.gz / .zst
+_SEGMENT = re.compile(r'^(\d{4}-\d{2}-\d{2})(?:\.(\d+))?\.ndjson(\.gz|\.zst)?$')
+FSYNC_POLICIES = ("always", "interval", "close")
+
+def entry_line(entry: dict) -> tuple[str, str]:
+    """
+    Serializes entry once: the canonical (sorted-key) JSON is hashed, and the hash is spliced
+    in as the last key of that same string. Same hash the ingester has always deduped on.
+    """
+    body = {k: v for k, v in entry.items() if k != "hash"}
+    canon = json.dumps(body, sort_keys=True, ensure_ascii=False)
+    h = hashlib.sha256(canon.encode("utf-8")).hexdigest()
+    sep = ", " if body else ""
+    return canon[:-1] + f'{sep}"hash": "{h}"}}\n', h
+
+def parse_segment_name(name: str):
+    """Returns (day, index, compression suffix) or None if name isn't a journal segment."""
+    m = _SEGMENT.match(os.path.basename(name))
+    if not m:
+        return None
+    return m.group(1), int(m.group(2) or 0), m.group(3) or ""
+
+def segment_name(day: str, index: int) -> str:
+    return f"{day}.ndjson" if index == 0 else f"{day}.{index}.ndjson"
+
+def list_segments(directory: str) -> list[str]:
+    """All segments (plain and compressed) in write order."""
+    found = []
+    for name in os.listdir(directory) if os.path.isdir(directory) else []:
+        parsed = parse_segment_name(name)
+        if parsed:
+            found.append((parsed[0], parsed[1], os.path.join(directory, name)))
+    return [p for _, _, p in sorted(found)]
+
+def open_segment(path: str):
+    """Opens a plain, .gz or .zst segment as a binary stream of NDJSON bytes."""
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb")
+    if path.endswith(".zst"):
+        if zstandard is None:
+            raise RuntimeError(f"{path} is zstd-compressed but `zstandard` isn't installed")
+        return zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True)
+    return open(path, "rb")
+
+def iter_entries(path_or_dir: str):
+    """Yields journal entries (dicts) from one segment or every segment of a directory."""
+    paths = list_segments(path_or_dir) if os.path.isdir(path_or_dir) else [path_or_dir]
+    for path in paths:
+        with open_segment(path) as raw:
+            for line in io.TextIOWrapper(raw, encoding="utf-8", errors="ignore"):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue  # torn tail line from a crash
+
+def compress_segment(path: str, method: str = "gzip") -> str:
+    """Compresses a sealed plain segment next to itself and removes the original."""
+    if method == "zstd" and zstandard is not None:
+        dst = path + ".zst"
+        with open(path, "rb") as src, open(dst + ".tmp", "wb") as out:
+            zstandard.ZstdCompressor(level=6).copy_stream(src, out)
+    else:
+        dst = path + ".gz"
+        with open(path, "rb") as src, gzip.open(dst + ".tmp", "wb", compresslevel=6) as out:
+            while True:
+                block = src.read(1 << 20)
+                if not block:
+                    break
+                out.write(block)
+    os.replace(dst + ".tmp", dst)
+    os.remove(path)
+    return dst
+
+class JournalWriter:
+    """
+    Long-lived, buffered NDJSON journal writer.
+    - fsync: "always" (every entry), "interval" (every fsync_interval_ms) or "close"
+    - rotates to a new segment on a new day or once a segment passes max_segment_bytes
+    - sealed segments are compressed in the background (compress="gzip" | "zstd" | None)
+    """
+
+    def __init__(self, directory: str, fsync: str = "interval", fsync_interval_ms: int = 1000,
+                 max_segment_bytes: int = 8 * 1024 * 1024, compress: str | None = "gzip",
+                 buffer_size: int = 64 * 1024):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"fsync must be one of {FSYNC_POLICIES}")
+        if compress == "zstd" and zstandard is None:
+            logging.warning("zstandard not installed; journal segments will be gzip-compressed.")
+            compress = "gzip"
+        self.directory = directory
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval_ms / 1000.0
+        self.max_segment_bytes = max_segment_bytes
+        self.compress = compress
+        self.buffer_size = buffer_size
+        os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._fh = None
+        self._day = None
+        self._index = 0
+        self._size = 0
+        self._dirty = False
+        self._last_sync = time.monotonic()
+        self._closed = threading.Event()
+        self._syncer = None
+        if fsync == "interval":
+            self._syncer = threading.Thread(target=self._sync_loop, name="journal-fsync", daemon=True)
+            self._syncer.start()
+
+    @property
+    def current_path(self) -> str | None:
+        return self._fh.name if self._fh else None
+
+    def _open(self, day: str):
+        # Resume today's newest plain segment if there's room, else start the next one.
+        index = 0
+        for path in list_segments(self.directory):
+            d, i, comp = parse_segment_name(path)
+            if d == day:
+                index = i if not comp else i + 1
+        path = os.path.join(self.directory, segment_name(day, index))
+        if os.path.exists(path) and os.path.getsize(path) >= self.max_segment_bytes:
+            index += 1
+            path = os.path.join(self.directory, segment_name(day, index))
+        self._fh = open(path, "ab", buffering=self.buffer_size)
+        self._day, self._index = day, index
+        self._size = self._fh.tell()
+
+    def _sync(self):
+        if self._fh and self._dirty:
+            self._fh.flush()
+            os.fsync(self._fh.fileno())
+            self._dirty = False
+        self._last_sync = time.monotonic()
+
+    def _seal(self):
+        if not self._fh:
+            return
+        self._sync()
+        path = self._fh.name
+        self._fh.close()
+        self._fh = None
+        if self.compress:
+            threading.Thread(target=self._compress_quietly, args=(path,), daemon=True).start()
+
+    def _compress_quietly(self, path: str):
+        try:
+            compress_segment(path, self.compress)
+        except Exception as e:
+            logging.error(f"Journal segment compression failed for {path}: {e}")
+
+    def append(self, entry: dict) -> str:
+        """Writes one entry; returns its content hash."""
+        return self.append_many([entry])[0]
+
+    def append_many(self, entries: list[dict]) -> list[str]:
+        lines, hashes = [], []
+        for entry in entries:
+            line, h = entry_line(entry)
+            lines.append(line.encode("utf-8"))
+            hashes.append(h)
+        if not lines:
+            return hashes
+        with self._lock:
+            day = time.strftime("%Y-%m-%d")
+            if self._fh is None:
+                self._open(day)
+            elif day != self._day:
+                self._seal()
+                self._open(day)
+            for data in lines:
+                if self._size and self._size + len(data) > self.max_segment_bytes:
+                    self._seal()
+                    self._fh = open(os.path.join(self.directory, segment_name(day, self._index + 1)),
+                                    "ab", buffering=self.buffer_size)
+                    self._index += 1
+                    self._size = 0
+                self._fh.write(data)
+                self._size += len(data)
+                self._dirty = True
+                if self.fsync == "always":
+                    self._sync()
+        return hashes
+
+    def _sync_loop(self):
+        while not self._closed.wait(self.fsync_interval):
+            with self._lock:
+                if self._dirty and time.monotonic() - self._last_sync >= self.fsync_interval:
+                    self._sync()
+
+    def flush(self):
+        with self._lock:
+            self._sync()
+
+    def close(self):
+        """Flushes + fsyncs the open segment (it stays plain; it's still today's live file)."""
+        self._closed.set()
+        with self._lock:
+            if self._fh:
+                self._sync()
+                self._fh.close()
+                self._fh = None
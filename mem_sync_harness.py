@@ -0,0 +1,113 @@
+# mem_sync_harness.py
+"""
+Local end-to-end check for journal delta sync: runs mem_sync_server's FastAPI app in-process
+(uvicorn on a loopback port, throwaway Chroma DB + journal), then drives the mobile SyncClient
+through a first sync, an incremental sync, a dropped connection and a server-state reload.
+
+    python mem_sync_harness.py
+"""
+import os, sys, time, socket, tempfile, threading, importlib.machinery, importlib.util
+
+WORK = tempfile.mkdtemp(prefix="elysia_sync_")
+os.environ["ELYSIA_DB_PATH"] = os.path.join(WORK, "chroma_db")
+os.environ["ELYSIA_JOURNAL_DIR"] = os.path.join(WORK, "mem_journal")
+os.environ.setdefault("ELYSIA_SYNC_TOKEN", "harness")
+
+import requests
+import uvicorn
+import mem_sync_server as server
+from mem_journal import JournalWriter
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+def _load_client():
+    path = os.path.join(HERE, "mem_sync_client.py.mobile")
+    loader = importlib.machinery.SourceFileLoader("mem_sync_client", path)
+    spec = importlib.util.spec_from_loader("mem_sync_client", loader)
+    mod = importlib.util.module_from_spec(spec)
+    loader.exec_module(mod)
+    return mod
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _serve(port: int) -> uvicorn.Server:
+    srv = uvicorn.Server(uvicorn.Config(server.app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=srv.run, daemon=True).start()
+    while not srv.started:
+        time.sleep(0.05)
+    return srv
+
+class DropAfterSend(requests.Session):
+    """Lets the request reach the server, then loses the response (as if Wi-Fi dropped)."""
+
+    def __init__(self, drops: int):
+        super().__init__()
+        self.drops = drops
+
+    def post(self, *args, **kwargs):
+        r = super().post(*args, **kwargs)
+        if self.drops > 0:
+            self.drops -= 1
+            raise requests.ConnectionError("simulated drop after send")
+        return r
+
+def _write(journal: JournalWriter, start: int, n: int):
+    for i in range(start, start + n):
+        journal.append({"type": "turn", "ts": time.time(), "turn_id": f"t{i // 2}",
+                        "speaker": "user" if i % 2 == 0 else "assistant", "text": f"harness entry {i}"})
+    journal.flush()
+
+def check(name: str, cond: bool, detail=""):
+    print(f"[{'ok' if cond else 'FAIL'}] {name} {detail}")
+    if not cond:
+        check.failed = True
+check.failed = False
+
+def main():
+    client_mod = _load_client()
+    port = _free_port()
+    srv = _serve(port)
+    home = f"http://127.0.0.1:{port}"
+    token = os.environ["ELYSIA_SYNC_TOKEN"]
+    jdir = os.environ["ELYSIA_JOURNAL_DIR"]
+    # tiny segments so the run covers rotation + gzip-sealed segments
+    journal = JournalWriter(jdir, fsync="close", max_segment_bytes=16 * 1024, compress="gzip")
+
+    _write(journal, 0, 400)
+    time.sleep(0.5)  # let background compression of sealed segments finish
+    c = client_mod.SyncClient(home=home, token=token, journal_dir=jdir, device="harness", max_push=8 * 1024)
+    t0 = time.perf_counter()
+    r1 = c.sync_once()
+    check("first sync", r1["reachable"] and not r1["error"] and server.coll.count() == 400,
+          f"{r1} count={server.coll.count()} in {time.perf_counter() - t0:.3f}s")
+
+    before = sum(c._local_size(p) for p in client_mod.list_segments(jdir))
+    _write(journal, 400, 50)
+    after = sum(c._local_size(p) for p in client_mod.list_segments(jdir))
+    r2 = c.sync_once()
+    check("delta sync sends only new bytes", r2["pushed_bytes"] == after - before and server.coll.count() == 450,
+          f"pushed={r2['pushed_bytes']} new={after - before}")
+
+    _write(journal, 450, 50)
+    flaky = client_mod.SyncClient(home=home, token=token, journal_dir=jdir, device="harness",
+                                  session=DropAfterSend(drops=1))
+    r3 = flaky.sync_once()
+    check("dropped connection surfaces as error", r3["error"] is not None, str(r3["error"]))
+    r4 = flaky.sync_once()
+    check("resume after drop, no duplicates", not r4["error"] and server.coll.count() == 500,
+          f"{r4} count={server.coll.count()}")
+
+    server.state = server.IngestState(server.STATE_PATH)  # as if the server restarted
+    r5 = c.sync_once()
+    check("nothing resent after server restart", r5["pushed_bytes"] == 0 and server.coll.count() == 500, str(r5))
+
+    journal.close()
+    srv.should_exit = True
+    print(f"work dir: {WORK}")
+    sys.exit(1 if check.failed else 0)
+
+if __name__ == "__main__":
+    main()
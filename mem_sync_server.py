@@ -1,45 +1,231 @@
 # mem_sync_server.py
-import os, json, time
-from fastapi import FastAPI, Header, HTTPException, UploadFile, File
+import os, json, time, zlib, sqlite3, threading
+from fastapi import FastAPI, Header, HTTPException, UploadFile, File, Request, Query
+from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
 import chromadb
 
 AUTH_TOKEN = os.getenv("ELYSIA_SYNC_TOKEN", "changeme")
 DB_PATH = os.getenv("ELYSIA_DB_PATH", "./chroma_db")
 COLLECTION = os.getenv("ELYSIA_COLLECTION", "persona_memory")
+STATE_PATH = os.getenv("ELYSIA_INGEST_STATE", os.path.join(DB_PATH, "ingest_state.sqlite3"))
+INGEST_BATCH = int(os.getenv("ELYSIA_INGEST_BATCH", "256"))
+READ_CHUNK = 64 * 1024
 
 app = FastAPI()
 client = chromadb.PersistentClient(path=DB_PATH)
 coll = client.get_or_create_collection(name=COLLECTION)
 
-def _ingest_record(r):
-    text = r.get("text","")
-    speaker = r.get("speaker","unknown")
-    tid = r.get("turn_id", f"sys-{int(r.get('ts', time.time()))}")
-    rid = f"{speaker}_{tid}_{abs(hash(text))}"
-    coll.add(
-        documents=[text],
-        metadatas=[{"speaker": speaker, "turn_id": tid, "ts": r.get("ts")}],
-        ids=[rid]
-    )
+class IngestState:
+    """
+    Persistent ingest bookkeeping next to the Chroma DB: journal hashes already ingested,
+    so re-uploads (even after a restart) are skipped instead of duplicated, and per-device
+    high-water marks (bytes of each journal segment already received) for delta sync.
+    """
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS seen (hash TEXT PRIMARY KEY, ts REAL)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS hwm (device TEXT, segment TEXT, offset INTEGER, "
+                         "updated REAL, PRIMARY KEY (device, segment))")
+        self._db.commit()
+        self._lock = threading.Lock()
+
+    def unseen(self, hashes: list[str]) -> set[str]:
+        if not hashes:
+            return set()
+        with self._lock:
+            seen = set()
+            for i in range(0, len(hashes), 500):  # stay under SQLite's host-parameter limit
+                part = hashes[i:i + 500]
+                rows = self._db.execute(
+                    f"SELECT hash FROM seen WHERE hash IN ({','.join('?' * len(part))})", part)
+                seen.update(h for (h,) in rows)
+        return set(hashes) - seen
+
+    def mark(self, hashes: list[str]):
+        now = time.time()
+        with self._lock:
+            self._db.executemany("INSERT OR IGNORE INTO seen (hash, ts) VALUES (?, ?)",
+                                 [(h, now) for h in hashes])
+            self._db.commit()
+
+    def offsets(self, device: str) -> dict[str, int]:
+        with self._lock:
+            rows = self._db.execute("SELECT segment, offset FROM hwm WHERE device = ?", (device,))
+            return {seg: off for seg, off in rows}
+
+    def offset(self, device: str, segment: str) -> int:
+        with self._lock:
+            row = self._db.execute("SELECT offset FROM hwm WHERE device = ? AND segment = ?",
+                                   (device, segment)).fetchone()
+        return row[0] if row else 0
+
+    def advance(self, device: str, segment: str, expected: int, new: int) -> bool:
+        """Compare-and-set the high-water mark; False if someone else moved it first."""
+        with self._lock:
+            cur = self._db.execute("SELECT offset FROM hwm WHERE device = ? AND segment = ?",
+                                   (device, segment)).fetchone()
+            if (cur[0] if cur else 0) != expected:
+                return False
+            self._db.execute("INSERT OR REPLACE INTO hwm (device, segment, offset, updated) VALUES (?, ?, ?, ?)",
+                             (device, segment, new, time.time()))
+            self._db.commit()
+        return True
+
+state = IngestState(STATE_PATH)
+
+def _record_id(r) -> str:
+    # Derived from the journal's content hash, so it's stable across processes (unlike hash()).
+    speaker = r.get("speaker", "unknown")
+    tid = r.get("turn_id", f"sys-{int(r.get('ts') or time.time())}")
+    return f"{speaker}_{tid}_{r['hash'][:16]}"
+
+def _ingest_batch(records: list[dict]) -> tuple[int, int]:
+    """Adds not-yet-seen records in one collection call (one embedding pass). Returns (ingested, skipped)."""
+    fresh = state.unseen([r["hash"] for r in records])
+    batch, taken = [], set()
+    for r in records:
+        h = r["hash"]
+        if h in fresh and h not in taken:
+            taken.add(h)
+            batch.append(r)
+    if batch:
+        # upsert: ids are deterministic, so a batch retried after a crash can't duplicate
+        coll.upsert(
+            documents=[r.get("text", "") for r in batch],
+            metadatas=[{"speaker": r.get("speaker", "unknown"),
+                        "turn_id": r.get("turn_id", f"sys-{int(r.get('ts') or time.time())}"),
+                        "ts": r.get("ts") or time.time()} for r in batch],
+            ids=[_record_id(r) for r in batch],
+        )
+        state.mark([r["hash"] for r in batch])
+    return len(batch), len(records) - len(batch)
+
+class NDJSONStream:
+    """Incremental NDJSON parser; transparently inflates gzip uploads (sealed journal segments)."""
+
+    def __init__(self):
+        self._tail = b""
+        self._inflate = None
+        self._sniffed = False
+        self.invalid = 0
+        self.raw_bytes = 0  # decompressed NDJSON bytes seen (delta sync offsets count these)
+
+    def feed(self, data: bytes) -> list[dict]:
+        if not self._sniffed:
+            self._sniffed = True
+            if data[:2] == b"\x1f\x8b":
+                self._inflate = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        if self._inflate is not None:
+            data = self._inflate.decompress(data)
+        self.raw_bytes += len(data)
+        lines = (self._tail + data).split(b"\n")
+        self._tail = lines.pop()
+        return self._parse(lines)
+
+    def close(self) -> list[dict]:
+        rest = self._inflate.flush() if self._inflate is not None else b""
+        self.raw_bytes += len(rest)
+        lines = (self._tail + rest).split(b"\n")
+        self._tail = b""
+        return self._parse(lines)
+
+    def _parse(self, lines) -> list[dict]:
+        out = []
+        for line in lines:
+            if not line.strip():
+                continue
+            try:
+                r = json.loads(line.decode("utf-8", "ignore"))
+            except ValueError:
+                self.invalid += 1
+                continue
+            if not isinstance(r, dict) or not r.get("hash"):
+                self.invalid += 1
+                continue
+            out.append(r)
+        return out
 
 @app.post("/import-ndjson")
-async def import_ndjson(x_auth: str = Header(None), file: UploadFile = File(...)):
+async def import_ndjson(x_auth: str = Header(None), file: UploadFile = File(...), batch_size: int = Query(INGEST_BATCH, ge=1)):
     if x_auth != AUTH_TOKEN:
         raise HTTPException(401, "bad auth")
-    dedupe = set()
-    n_ok = 0
-    content = (await file.read()).decode("utf-8", "ignore").splitlines()
-    for line in content:
-        if not line.strip(): continue
-        try:
-            r = json.loads(line)
-            h = r.get("hash")
-            if not h or h in dedupe:
-                continue
-            dedupe.add(h)
-            _ingest_record(r)
-            n_ok += 1
-        except Exception:
-            continue
-    return {"ingested": n_ok}
+    t0 = time.perf_counter()
+    parser = NDJSONStream()
+    pending = []
+    n_ok = n_skip = n_bytes = 0
+
+    async def _flush(final=False):
+        nonlocal pending, n_ok, n_skip
+        while pending and (final or len(pending) >= batch_size):
+            batch, pending = pending[:batch_size], pending[batch_size:]
+            ok, skip = await run_in_threadpool(_ingest_batch, batch)
+            n_ok += ok
+            n_skip += skip
+
+    while True:
+        chunk = await file.read(READ_CHUNK)
+        if not chunk:
+            break
+        n_bytes += len(chunk)
+        pending.extend(parser.feed(chunk))
+        await _flush()
+    pending.extend(parser.close())
+    await _flush(final=True)
+
+    elapsed = time.perf_counter() - t0
+    return {
+        "ingested": n_ok,
+        "skipped": n_skip,
+        "invalid": parser.invalid,
+        "bytes": n_bytes,
+        "elapsed_s": round(elapsed, 4),
+        "records_per_s": round((n_ok + n_skip) / elapsed, 1) if elapsed > 0 else None,
+    }
+
+# --- delta sync: clients push only bytes past the server's high-water mark ---
+
+@app.get("/sync/status")
+async def sync_status(device: str, x_auth: str = Header(None)):
+    """Cheap reachability probe + per-segment offsets already received from this device."""
+    if x_auth != AUTH_TOKEN:
+        raise HTTPException(401, "bad auth")
+    return {"device": device, "segments": state.offsets(device), "server_time": time.time()}
+
+@app.post("/sync/push")
+async def sync_push(request: Request, x_auth: str = Header(None), x_device: str = Header(...),
+                    x_segment: str = Header(...), x_offset: int = Header(...)):
+    """
+    Body: NDJSON (optionally gzip) holding bytes [X-Offset, X-Offset + n) of the device's journal
+    segment X-Segment, cut on a line boundary. 409 with the current offset if X-Offset doesn't
+    match the high-water mark, so the client can resume from the right place.
+    """
+    if x_auth != AUTH_TOKEN:
+        raise HTTPException(401, "bad auth")
+    current = state.offset(x_device, x_segment)
+    if x_offset != current:
+        return JSONResponse({"error": "offset mismatch", "offset": current}, status_code=409)
+
+    t0 = time.perf_counter()
+    parser = NDJSONStream()
+    records = []
+    async for chunk in request.stream():
+        records.extend(parser.feed(chunk))
+    records.extend(parser.close())
+
+    n_ok = n_skip = 0
+    for i in range(0, len(records), INGEST_BATCH):
+        ok, skip = await run_in_threadpool(_ingest_batch, records[i:i + INGEST_BATCH])
+        n_ok += ok
+        n_skip += skip
+    # Ingest is idempotent (hash dedupe), so a crash before this line only costs a resend.
+    new_offset = x_offset + parser.raw_bytes
+    if not state.advance(x_device, x_segment, x_offset, new_offset):
+        return JSONResponse({"error": "concurrent push", "offset": state.offset(x_device, x_segment)},
+                            status_code=409)
+    return {"ingested": n_ok, "skipped": n_skip, "invalid": parser.invalid,
+            "offset": new_offset, "elapsed_s": round(time.perf_counter() - t0, 4)}
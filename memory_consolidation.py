@@ -0,0 +1,285 @@
+# memory_consolidation.py
+"""
+Background tiering for persona_memory. Each pass, for memories older than their speaker's
+hot_days:
+  - exact duplicates (same speaker, same text up to case/whitespace) collapse onto one
+    representative: the copies are deleted, the representative's metadata keeps their ids
+    (dup_ids) and count (dups). Paraphrases are archived like any other memory.
+  - user/assistant turns are folded into summary memories, per day and, on busy days, per
+    topic (greedy clustering of the user side); summaries stay in the hot collection
+  - the raw memories move to the cold <collection>_archive collection (upsert there first,
+    then delete from hot, so an interrupted pass just redoes work)
+  - archived memories past their speaker's archive_days are deleted
+  - legacy "(Saved full response to ...)" pointer notes are dropped (see response_store.py)
+Retrieval searches the archive only when the hot tier has nothing close (ARCHIVE_THRESHOLD in
+memory_service_chroma). Not journaled: the journal keeps the raw turns either way.
+"""
+import os, json, time, hashlib, logging, datetime, threading
+from collections import defaultdict
+import numpy as np
+
+from summarizer_service import ExtractiveSummarizer
+
+DAY = 86400.0
+# hot_days: age at which a memory leaves the hot collection (0 = never)
+# archive_days: age at which it is deleted from the archive (0 = never)
+RETENTION = {
+    "user":      {"hot_days": 3, "archive_days": 0},
+    "assistant": {"hot_days": 3, "archive_days": 0},
+    "system":    {"hot_days": 7, "archive_days": 90},
+    "summary":   {"hot_days": 0, "archive_days": 0},
+}
+FOLD_SPEAKERS = ("user", "assistant")   # summarized on the way out; others are just archived
+TOPIC_SIM = float(os.getenv("ELYSIA_TOPIC_SIM", "0.55"))
+TOPIC_MIN_TURNS = int(os.getenv("ELYSIA_TOPIC_MIN_TURNS", "12"))  # split a day by topic past this
+MAX_PER_PASS = int(os.getenv("ELYSIA_CONSOLIDATE_MAX", "5000"))  # per speaker; the rest next pass
+EVERY_S = float(os.getenv("ELYSIA_CONSOLIDATE_EVERY_S", "3600"))  # 0 disables the background job
+FIRST_DELAY_S = float(os.getenv("ELYSIA_CONSOLIDATE_DELAY_S", "300"))
+POINTER_PREFIX = "(Saved full response to "
+
+def load_retention() -> dict:
+    """RETENTION, overridden per speaker by ELYSIA_MEM_RETENTION (JSON, e.g. {"system": {"archive_days": 30}})."""
+    rules = {k: dict(v) for k, v in RETENTION.items()}
+    raw = os.getenv("ELYSIA_MEM_RETENTION")
+    if raw:
+        try:
+            for speaker, rule in json.loads(raw).items():
+                rules.setdefault(speaker, dict(RETENTION["system"])).update(rule)
+        except (ValueError, AttributeError) as e:
+            logging.warning(f"Ignoring bad ELYSIA_MEM_RETENTION: {e}")
+    return rules
+
+def greedy_clusters(vecs: np.ndarray, threshold: float) -> list[list[int]]:
+    """
+    Single pass: each row joins the first cluster whose representative (its first member) is
+    at least threshold cosine-similar, else starts a new one. Rows must be unit-normalized.
+    One matrix-vector product per row against the representatives so far.
+    """
+    vecs = np.asarray(vecs, dtype=np.float32)
+    if vecs.ndim != 2 or not len(vecs):
+        return []
+    # preallocated: at most one representative per row, the first m rows are in use
+    clusters, reps, m = [], np.empty_like(vecs), 0
+    for i, v in enumerate(vecs):
+        if m:
+            sims = reps[:m] @ v
+            j = int(np.argmax(sims))
+            if sims[j] >= threshold:
+                clusters[j].append(i)
+                continue
+        clusters.append([i])
+        reps[m] = v
+        m += 1
+    return clusters
+
+def _strip(doc: str) -> str:
+    for prefix in ("User said: ", "Assistant responded: "):
+        if doc.startswith(prefix):
+            return doc[len(prefix):]
+    return doc
+
+class Consolidator:
+    def __init__(self, memory, retention: dict | None = None, topic_sim: float = TOPIC_SIM,
+                 max_per_pass: int = MAX_PER_PASS, idle=None):
+        self.memory = memory
+        self.retention = retention or load_retention()
+        self.topic_sim = topic_sim
+        self.max_per_pass = max_per_pass
+        self.idle = idle  # fn() -> bool; a pass waits for it between steps (e.g. not mid-reply)
+        self._summarizer = ExtractiveSummarizer(max_sentences=4, max_chars=700)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self.last = {}
+
+    # --- scheduling ---
+    def start(self, every_s: float = EVERY_S, first_delay_s: float = FIRST_DELAY_S):
+        if every_s <= 0:
+            return
+        def _loop():
+            delay = first_delay_s
+            while not self._stop.wait(delay):
+                try:
+                    self.run_once()
+                except Exception as e:
+                    logging.error(f"Memory consolidation failed: {e}")
+                delay = every_s
+        threading.Thread(target=_loop, name="mem-consolidate", daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _wait_idle(self):
+        while self.idle is not None and not self.idle() and not self._stop.wait(0.5):
+            pass
+
+    # --- one pass ---
+    def _old(self, speaker: str, cutoff: float) -> dict:
+        got = self.memory.collection.get(
+            where={"$and": [{"speaker": speaker}, {"ts": {"$lt": cutoff}}]},
+            limit=self.max_per_pass, include=["embeddings", "documents", "metadatas"])
+        vecs = got.get("embeddings")
+        vecs = np.asarray(vecs if vecs is not None else [], dtype=np.float32)
+        if len(vecs):
+            vecs /= np.maximum(np.linalg.norm(vecs, axis=1, keepdims=True), 1e-12)
+        return {"ids": list(got.get("ids") or []), "docs": list(got.get("documents") or []),
+                "metas": list(got.get("metadatas") or []), "vecs": vecs}
+
+    def _summaries(self, turns: dict, now: float) -> list[tuple[str, str, dict, list[str]]]:
+        """turns: turn_id -> {"user": (idx, doc), "assistant": (idx, doc), "ts", "vec", "folded"},
+        folded = how many duplicate turns collapsed onto this one.
+        Returns [(summary id, text, metadata, member memory ids)]."""
+        by_day = defaultdict(list)
+        for tid, t in turns.items():
+            by_day[datetime.date.fromtimestamp(t["ts"]).isoformat()].append(tid)
+        out = []
+        for day, tids in sorted(by_day.items()):
+            tids.sort(key=lambda tid: turns[tid]["ts"])
+            groups = [tids]
+            if len(tids) > TOPIC_MIN_TURNS:
+                vecs = np.vstack([turns[tid]["vec"] for tid in tids])
+                groups = [[tids[i] for i in c] for c in greedy_clusters(vecs, self.topic_sim)]
+            for group in groups:
+                questions = [_strip(turns[tid]["user"]) for tid in group if turns[tid].get("user")]
+                answers = [_strip(turns[tid]["assistant"]) for tid in group if turns[tid].get("assistant")]
+                gist = self._summarizer.summarize("\n".join(answers)) or ""
+                asked = "; ".join(q[:80] for q in questions[:5])
+                n_turns = len(group) + sum(turns[tid].get("folded", 0) for tid in group)
+                text = (f"Summary of {n_turns} earlier conversation turn(s) on {day}. "
+                        + (f"User asked: {asked}. " if asked else "") + (f"Elysia: {gist}" if gist else ""))
+                members = [mid for tid in group for mid in turns[tid]["ids"]]
+                sid = "summary_" + hashlib.sha1("|".join(sorted(members)).encode()).hexdigest()[:16]
+                meta = {"speaker": "summary", "ts": max(turns[tid]["ts"] for tid in group), "day": day,
+                        "turns": n_turns, "turn_ids": ",".join(group)[:2000], "created": now}
+                out.append((sid, text.strip(), meta, members))
+        return out
+
+    def run_once(self, now: float | None = None, dry_run: bool = False) -> dict:
+        """One consolidation pass. Returns counts; dry_run only reports what would happen."""
+        with self._lock:
+            now = time.time() if now is None else now
+            t0 = time.perf_counter()
+            stats = {"archived": 0, "duplicates": 0, "summaries": 0, "pointers_dropped": 0,
+                     "expired": 0, "dry_run": dry_run}
+            hot, archive, lexical = self.memory.collection, self.memory.archive, self.memory.lexical
+
+            turns = {}
+            to_archive = []   # (id, doc, meta, vec)
+            to_drop = []
+            to_collapse = []  # exact duplicates: deleted from hot, counted on their representative
+            folded_into = {}  # turn_id of a fully collapsed turn -> turn_id it was folded into
+            for speaker, rule in self.retention.items():
+                if not rule.get("hot_days"):
+                    continue
+                self._wait_idle()
+                old = self._old(speaker, now - rule["hot_days"] * DAY)
+                if not old["ids"]:
+                    continue
+                keep = []
+                for i, (mid, doc) in enumerate(zip(old["ids"], old["docs"])):
+                    if speaker == "system" and (doc or "").startswith(POINTER_PREFIX):
+                        to_drop.append(mid)
+                    else:
+                        keep.append(i)
+                dup_of, first = {}, {}  # index -> index of the first memory with the same text
+                for i in keep:
+                    text = " ".join((old["docs"][i] or "").lower().split())
+                    if text in first:
+                        dup_of[i] = first[text]
+                    elif text:
+                        first[text] = i
+                stats["duplicates"] += len(dup_of)
+                rep_meta = {}
+                for i in keep:
+                    mid, doc, meta = old["ids"][i], old["docs"][i], dict(old["metas"][i] or {})
+                    tid = meta.get("turn_id")
+                    if i in dup_of:
+                        # same text as the representative: nothing lost, just noted on it
+                        rep = rep_meta[dup_of[i]]
+                        rep["dups"] = rep.get("dups", 0) + 1
+                        rep["dup_ids"] = (rep["dup_ids"] + "," + mid if rep.get("dup_ids") else mid)[:2000]
+                        to_collapse.append(mid)
+                        rep_tid = rep.get("turn_id")
+                        if speaker in FOLD_SPEAKERS and tid in turns:
+                            turns[tid]["ids"].append(mid)
+                        elif speaker in FOLD_SPEAKERS and tid and rep_tid in turns:
+                            folded_into.setdefault(tid, rep_tid)
+                        continue
+                    rep_meta[i] = meta
+                    to_archive.append((mid, doc, meta, old["vecs"][i]))
+                    if speaker in FOLD_SPEAKERS and tid:
+                        t = turns.setdefault(tid, {"ids": [], "ts": meta.get("ts", now), "vec": None})
+                        t["ids"].append(mid)
+                        t[speaker] = doc
+                        if speaker == "user" or t["vec"] is None:
+                            t["vec"] = old["vecs"][i]
+            for tid, rep_tid in folded_into.items():
+                if tid not in turns:
+                    turns[rep_tid]["folded"] = turns[rep_tid].get("folded", 0) + 1
+            stats["pointers_dropped"] = len(to_drop)
+
+            summaries = self._summaries(turns, now) if turns else []
+            stats["summaries"] = len(summaries)
+            stats["archived"] = len(to_archive)
+            summary_of = {mid: sid for sid, _, _, members in summaries for mid in members}
+
+            if not dry_run:
+                if summaries:
+                    self._wait_idle()
+                    vecs = self.memory.embed([text for _, text, _, _ in summaries])
+                    hot.upsert(ids=[s[0] for s in summaries], documents=[s[1] for s in summaries],
+                               metadatas=[s[2] for s in summaries], embeddings=vecs.tolist())
+                    if lexical is not None:
+                        lexical.add([s[0] for s in summaries], [s[1] for s in summaries], [s[2] for s in summaries])
+                for k in range(0, len(to_archive), 500):
+                    self._wait_idle()
+                    batch = to_archive[k:k + 500]
+                    metas = []
+                    for mid, _, meta, _ in batch:
+                        meta = dict(meta, archived_at=now)
+                        if mid in summary_of:
+                            meta["summary_id"] = summary_of[mid]
+                        metas.append(meta)
+                    archive.upsert(ids=[b[0] for b in batch], documents=[b[1] for b in batch],
+                                   metadatas=metas, embeddings=np.vstack([b[3] for b in batch]).tolist())
+                    hot.delete(ids=[b[0] for b in batch])
+                    if lexical is not None:
+                        lexical.remove([b[0] for b in batch])
+                for gone in (to_collapse, to_drop):
+                    if gone:
+                        hot.delete(ids=gone)
+                        if lexical is not None:
+                            lexical.remove(gone)
+                for speaker, rule in self.retention.items():
+                    if rule.get("archive_days"):
+                        cutoff = now - rule["archive_days"] * DAY
+                        expired = archive.get(where={"$and": [{"speaker": speaker}, {"ts": {"$lt": cutoff}}]},
+                                              include=[]).get("ids") or []
+                        if expired:
+                            archive.delete(ids=expired)
+                            stats["expired"] += len(expired)
+                if to_archive or to_collapse or to_drop or summaries:
+                    self.memory.rewarm_hot_index()  # moved-out memories must not linger in RAM
+                    if lexical is not None:
+                        lexical.compact()
+                        lexical.flush()  # the adds/removes above, if compact() didn't rewrite
+
+            stats["elapsed_s"] = round(time.perf_counter() - t0, 3)
+            try:
+                stats["hot_count"], stats["archive_count"] = hot.count(), archive.count()
+            except Exception:
+                pass
+            self.last = stats
+            logging.info(f"Memory consolidation: {json.dumps(stats)}")
+            return stats
+
+if __name__ == "__main__":
+    import argparse
+    from memory_service_chroma import ChromaMemoryService
+    ap = argparse.ArgumentParser(description="Run one memory consolidation pass.")
+    ap.add_argument("--db", default="./chroma_db")
+    ap.add_argument("--dry-run", action="store_true", help="report what would move, change nothing")
+    args = ap.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    mem = ChromaMemoryService(db_path=args.db, write_behind=False)
+    print(json.dumps(Consolidator(mem).run_once(dry_run=args.dry_run), indent=2))
+    mem.close()
@@ -1,52 +1,410 @@
-import chromadb
+import numpy as np
 import uuid
 import logging
+import threading
+from collections import OrderedDict, deque
 
 # NEW: journaling
-import json, hashlib, time, os
+import time, os
+from mem_journal import JournalWriter
 JOURNAL_DIR = os.environ.get("ELYSIA_JOURNAL_DIR", "./mem_journal")
-os.makedirs(JOURNAL_DIR, exist_ok=True)
+JOURNAL_FSYNC = os.environ.get("ELYSIA_JOURNAL_FSYNC", "interval")          # always | interval | close
+JOURNAL_COMPRESS = os.environ.get("ELYSIA_JOURNAL_COMPRESS", "gzip") or None  # gzip | zstd | ""
+# Cold tier (see memory_consolidation.py): only searched when the hot tier's best match is weaker
+ARCHIVE_THRESHOLD = float(os.environ.get("ELYSIA_ARCHIVE_THRESHOLD", "0.45"))
+# Hybrid retrieval: BM25 (lexical_index.py) fused with the vector hits by reciprocal rank
+from lexical_index import LexicalIndex
+HYBRID = os.environ.get("ELYSIA_HYBRID", "1") == "1"
+RRF_K = int(os.environ.get("ELYSIA_RRF_K", "60"))
+# x a rank-1 RRF term, for ts=now; RRF terms are close together, so 0.05 is worth a few ranks
+RECENCY_WEIGHT = float(os.environ.get("ELYSIA_RECENCY_WEIGHT", "0.05"))
+RECENCY_HALF_LIFE_DAYS = float(os.environ.get("ELYSIA_RECENCY_HALF_LIFE_DAYS", "7"))
+# Lexical-only fast path (no query embedding): top hit matches this share of the query's idf
+# mass, at least two query terms or an identifier (main_app.py, persona_memory), scores at
+# least LEX_FAST_SCORE, and the query has a term at least this rare
+LEX_FAST_COVERAGE = float(os.environ.get("ELYSIA_LEX_FAST_COVERAGE", "0.8"))
+LEX_FAST_IDF = float(os.environ.get("ELYSIA_LEX_FAST_IDF", "3.0"))
+LEX_FAST_SCORE = float(os.environ.get("ELYSIA_LEX_FAST_SCORE", "5.0"))
 
-def _journal_path():
-    day = time.strftime("%Y-%m-%d")
-    return os.path.join(JOURNAL_DIR, f"{day}.ndjson")
+def _normalize_query(q: str) -> str:
+    return " ".join(q.lower().split())
 
-def _hash_entry(d: dict) -> str:
-    canon = json.dumps(d, sort_keys=True, ensure_ascii=False)
-    return hashlib.sha256(canon.encode("utf-8")).hexdigest()
+class HotIndex:
+    """
+    In-process ring of the most recent N memory embeddings. Searched with one matrix-vector
+    product, so recent turns are recalled without touching the persistent HNSW/SQLite store.
+    Thread-safe: the memory writer adds while retrievals (speculative, voice, text sessions) search.
+    """
 
-def _append_journal(entry: dict):
-    # idempotent-ish: embed content hash so the home ingester can dedupe
-    entry["hash"] = _hash_entry(entry)
-    with open(_journal_path(), "a", encoding="utf-8") as f:
-        f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._lock = threading.Lock()
+        self._vecs = None          # (capacity, dim) float32, unit-normalized rows
+        self._ids = [None] * capacity
+        self._docs = [None] * capacity
+        self._next = 0
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def add(self, ids, docs, vecs: np.ndarray):
+        if self.capacity <= 0:
+            return
+        with self._lock:
+            if self._vecs is None:
+                self._vecs = np.zeros((self.capacity, vecs.shape[1]), dtype=np.float32)
+            for i, d, v in zip(ids, docs, vecs):
+                self._vecs[self._next] = v
+                self._ids[self._next] = i
+                self._docs[self._next] = d
+                self._next = (self._next + 1) % self.capacity
+                self._size = min(self._size + 1, self.capacity)
+
+    def search(self, q: np.ndarray, k: int) -> list[tuple[float, str, str]]:
+        """Returns [(cosine similarity, id, document)] best first."""
+        with self._lock:
+            if not self._size or k <= 0:
+                return []
+            sims = self._vecs[:self._size] @ q
+            k = min(k, self._size)
+            top = np.argpartition(-sims, k - 1)[:k]
+            top = top[np.argsort(-sims[top])]
+            return [(float(sims[j]), self._ids[j], self._docs[j]) for j in top]
 
 class ChromaMemoryService:
     """A memory service using ChromaDB for persistent conversational memory."""
 
-    def __init__(self, db_path="./chroma_db", collection_name="persona_memory"):
+    def __init__(self, db_path="./chroma_db", collection_name="persona_memory",
+                 query_cache_size: int = 256, hot_index_size: int = 512,
+                 hot_only_threshold: float = 0.75, write_behind: bool = True,
+                 write_batch_max: int = 64, write_linger: float = 0.2,
+                 journal_dir: str = JOURNAL_DIR, journal_fsync: str = JOURNAL_FSYNC,
+                 journal_fsync_ms: int = 1000, journal_segment_bytes: int = 8 * 1024 * 1024,
+                 journal_compress: str | None = JOURNAL_COMPRESS,
+                 archive_threshold: float = ARCHIVE_THRESHOLD, hybrid: bool = HYBRID,
+                 standby: bool = False):
         """
         Initializes the ChromaDB memory service.
         :param db_path: The directory to persist the database.
         :param collection_name: The name of the collection to store memories.
+        :param query_cache_size: LRU size for query embeddings (0 disables).
+        :param hot_index_size: How many recent memory embeddings to keep in RAM (0 disables).
+        :param hot_only_threshold: If the hot index alone returns n_results hits at or above
+            this cosine similarity, Chroma isn't queried at all.
+        :param write_behind: Queue adds and persist them on a background worker (see flush()).
+        :param write_batch_max: Max queued adds folded into one embedding batch + collection.add.
+        :param write_linger: Seconds the worker waits for more adds before writing a batch.
+        :param journal_fsync: "always", "interval" (every journal_fsync_ms) or "close".
+        :param journal_segment_bytes: Roll to a new journal segment past this size (also daily).
+        :param journal_compress: Compress sealed segments with "gzip" or "zstd" (None = keep plain).
+        :param archive_threshold: Also search the archive collection (<name>_archive, filled by
+            memory_consolidation) when the best hot-tier cosine similarity is below this.
+        :param hybrid: Keep a BM25 index (<db_path>/lexical.ndjson) and fuse it with the vector
+            hits; confident keyword matches skip the embedding entirely.
+        :param standby: Load the embedder only; the Chroma store and BM25 log are opened by
+            open() (supervisor.py's standby worker, on promotion).
         """
         logging.info("Initializing ChromaMemoryService...")
         try:
-            self._client = chromadb.PersistentClient(path=db_path)
-            self._collection = self._client.get_or_create_collection(name=collection_name)
-            logging.info(f"ChromaDB client initialized. Using collection '{collection_name}'.")
+            # Deferred: chromadb + onnxruntime are slow to import; only pay for it when built.
+            from chromadb.utils import embedding_functions
+
+            self.db_path, self.collection_name = db_path, collection_name
+            # Same default embedder Chroma would use, but held here so we can embed once
+            # and reuse the vectors for the cache, the hot index and collection.add.
+            self._embed_fn = embedding_functions.DefaultEmbeddingFunction()
         except Exception as e:
             logging.error(f"Failed to initialize ChromaDB: {e}. Ensure SQLite version is >= 3.35.")
             raise
+        self._client = self._collection = self._archive = None  # see open()
+
+        self.query_cache_size = query_cache_size
+        self.hot_only_threshold = hot_only_threshold
+        self.archive_threshold = archive_threshold
+        self._query_cache = OrderedDict()
+        self._query_lock = threading.Lock()  # retrievals can overlap (speculative + final)
+        self._hot = HotIndex(hot_index_size)
+        self._hot_lock = threading.Lock()  # writer's adds vs. rewarm_hot_index's swap
+        self._stats_lock = threading.Lock()
+        self._stats = {"query_cache_hits": 0, "query_cache_misses": 0,
+                       "hot_only": 0, "hot_contributed": 0, "chroma_queries": 0, "archive_queries": 0,
+                       "lexical_fast": 0, "lexical_contributed": 0, "retrievals": 0}
+        self._latencies = deque(maxlen=256)
+        self.hybrid = hybrid
+        self._lexical = None
+
+        self._journal = JournalWriter(journal_dir, fsync=journal_fsync, fsync_interval_ms=journal_fsync_ms,
+                                      max_segment_bytes=journal_segment_bytes, compress=journal_compress)
 
-    def add_memory(self, user_input: str, assistant_response: str):
+        # Write-behind queue: adds land in _pending and a worker persists them in batches.
+        self.write_behind = write_behind
+        self.write_batch_max = write_batch_max
+        self.write_linger = write_linger
+        self._pending = []
+        self._pending_lock = threading.Condition()
+        self._enqueued = 0
+        self._persisted = 0
+        self._closed = False
+        self._writer = None
+        if write_behind:
+            self._writer = threading.Thread(target=self._write_loop, name="memory-writer", daemon=True)
+            self._writer.start()
+
+        self.standby = standby
+        if not standby:
+            self.open()
+
+    def warmup(self):
+        """Dummy embedding so the ONNX embedder is loaded before the first real turn."""
+        self._embed(["warm up"])
+
+    def open(self):
+        """
+        (Re-)opens the Chroma client/collections, seeds the hot index and loads the BM25 log,
+        keeping the loaded embedder. A standby calls it on promotion: Chroma's SQLite store
+        isn't safe to share between processes, and the active worker writes to it until then.
+        """
+        import chromadb
+        if self._client is not None:
+            clear = getattr(self._client, "clear_system_cache", None)
+            if clear:
+                clear()  # chromadb shares one System per path within a process; drop the stale one
+        try:
+            self._client = chromadb.PersistentClient(path=self.db_path)
+            self._collection = self._client.get_or_create_collection(
+                name=self.collection_name, embedding_function=self._embed_fn)
+            self._archive = self._client.get_or_create_collection(
+                name=self.collection_name + "_archive", embedding_function=self._embed_fn)
+            logging.info(f"ChromaDB client initialized. Using collection '{self.collection_name}'.")
+        except Exception as e:
+            logging.error(f"Failed to initialize ChromaDB: {e}. Ensure SQLite version is >= 3.35.")
+            raise
+        self.standby = False
+        self.rewarm_hot_index()
+        if self.hybrid:
+            if self._lexical is not None:
+                self._lexical.close()
+            self._lexical = self._open_lexical()
+
+    def _open_lexical(self) -> "LexicalIndex | None":
+        """Loads the BM25 index from its log, rebuilding it if it doesn't match the collection."""
+        try:
+            lex = LexicalIndex(os.path.join(self.db_path, "lexical.ndjson"))
+            if len(lex) != self._collection.count():
+                lex.rebuild(self._collection)
+            return lex
+        except Exception as e:
+            logging.warning(f"Lexical index unavailable, vector-only retrieval: {e}")
+            return None
+
+    def rewarm_hot_index(self):
+        """Rebuilds the hot index from the collection (on open() or after a consolidation pass
+        moved memories out of it)."""
+        fresh = HotIndex(self._hot.capacity)
+        # the writer waits, so nothing it adds meanwhile lands in the old index and gets lost;
+        # retrievals meanwhile keep searching the old one
+        with self._hot_lock:
+            self._warm_hot_index(fresh)
+            self._hot = fresh
+
+    # For memory_consolidation, which moves memories between the two tiers.
+    @property
+    def collection(self):
+        return self._collection
+
+    @property
+    def archive(self):
+        return self._archive
+
+    @property
+    def lexical(self) -> "LexicalIndex | None":
+        return self._lexical
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        """Unit-normalized embeddings, same embedder as the collections."""
+        return self._embed(texts)
+
+    def _embed(self, texts: list[str]) -> np.ndarray:
+        vecs = np.asarray(self._embed_fn(texts), dtype=np.float32)
+        norms = np.linalg.norm(vecs, axis=1, keepdims=True)
+        return vecs / np.maximum(norms, 1e-12)
+
+    def _embed_query(self, query: str) -> np.ndarray:
+        key = _normalize_query(query)
+        with self._query_lock:
+            vec = self._query_cache.get(key)
+            if vec is not None:
+                self._query_cache.move_to_end(key)
+                self._count("query_cache_hits")
+                return vec
+            self._count("query_cache_misses")
+        vec = self._embed([query])[0]
+        if self.query_cache_size > 0:
+            with self._query_lock:
+                self._query_cache[key] = vec
+                if len(self._query_cache) > self.query_cache_size:
+                    self._query_cache.popitem(last=False)
+        return vec
+
+    def _warm_hot_index(self, hot: "HotIndex | None" = None):
+        """Seeds the hot index (or hot) with the tail of the collection (insertion order ~ recency)."""
+        hot = self._hot if hot is None else hot  # (empty HotIndex is falsy)
+        if hot.capacity <= 0:
+            return
+        try:
+            total = self._collection.count()
+            if not total:
+                return
+            got = self._collection.get(offset=max(0, total - hot.capacity), limit=hot.capacity,
+                                       include=["embeddings", "documents"])
+            vecs = got.get("embeddings")
+            if vecs is None or len(vecs) == 0:
+                return
+            vecs = np.asarray(vecs, dtype=np.float32)
+            vecs /= np.maximum(np.linalg.norm(vecs, axis=1, keepdims=True), 1e-12)
+            hot.add(got["ids"], got["documents"], vecs)
+            logging.info(f"Hot memory index warmed with {len(hot)} recent embeddings.")
+        except Exception as e:
+            logging.warning(f"Hot memory index warm-up skipped: {e}")
+
+    def _add(self, ids: list[str], documents: list[str], metadatas: list[dict], journal: list[dict]):
+        item = {"ids": ids, "documents": documents, "metadatas": metadatas,
+                "journal": journal, "vecs": None, "tries": 0}
+        if self._lexical is not None:
+            self._lexical.add(ids, documents, metadatas)  # searchable at once, no embedding needed
+        if not self.write_behind:
+            self._persist([item])
+            return
+        with self._pending_lock:
+            self._pending.append(item)
+            self._enqueued += 1
+            self._pending_lock.notify_all()
+
+    def _persist(self, batch: list[dict]):
+        """One embedding pass and one collection.add for the whole batch, then one journal append."""
+        todo = [it for it in batch if not it.get("stored")]
+        if todo:
+            missing = [it for it in todo if it["vecs"] is None]
+            if missing:
+                fresh = self._embed([d for it in missing for d in it["documents"]])
+                k = 0
+                for it in missing:
+                    n = len(it["documents"])
+                    it["vecs"], k = fresh[k:k + n], k + n
+            ids = [i for it in todo for i in it["ids"]]
+            docs = [d for it in todo for d in it["documents"]]
+            metas = [m for it in todo for m in it["metadatas"]]
+            vecs = np.vstack([it["vecs"] for it in todo])
+            self._collection.add(ids=ids, documents=docs, metadatas=metas, embeddings=vecs.tolist())
+            with self._hot_lock:
+                self._hot.add(ids, docs, vecs)
+            for it in todo:
+                it["stored"] = True  # a retry after a journal failure won't re-add these
+        self._journal.append_many([e for it in batch for e in it["journal"]])
+        if self._lexical is not None:
+            self._lexical.flush()  # add() only buffered the BM25 ops
+
+    def _write_loop(self):
+        while True:
+            with self._pending_lock:
+                while not self._pending and not self._closed:
+                    self._pending_lock.wait()
+                if not self._pending and self._closed:
+                    return
+            time.sleep(self.write_linger)  # let a turn's user/assistant/system adds coalesce
+            with self._pending_lock:
+                batch = self._pending[:self.write_batch_max]
+            try:
+                self._persist(batch)
+            except Exception as e:
+                logging.error(f"Memory write-behind batch failed ({len(batch)} adds): {e}")
+                for it in batch:
+                    it["tries"] += 1
+                dropped = [it for it in batch if it["tries"] >= 3]
+                if not dropped:
+                    time.sleep(1.0)
+                    continue
+                logging.error(f"Dropping {len(dropped)} memory adds after 3 failed attempts.")
+                batch = dropped
+            with self._pending_lock:
+                for it in batch:
+                    self._pending.remove(it)
+                self._persisted += len(batch)
+                self._pending_lock.notify_all()
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """Blocks until everything queued so far is persisted and the journal is on disk.
+        False if timeout hit first."""
+        if self.write_behind:
+            deadline = None if timeout is None else time.monotonic() + timeout
+            with self._pending_lock:
+                target = self._enqueued
+                while self._persisted < target:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        return False
+                    self._pending_lock.wait(remaining)
+        self._journal.flush()
+        if self._lexical is not None:
+            self._lexical.flush()
+        return True
+
+    def close(self, timeout: float | None = 10.0):
+        """Flushes and stops the write-behind worker, then closes the journal."""
+        self.flush(timeout)
+        with self._pending_lock:
+            self._closed = True
+            self._pending_lock.notify_all()
+        if self._writer is not None:
+            self._writer.join(timeout)
+        self._journal.close()
+        if self._lexical is not None:
+            self._lexical.close()
+
+    def _search_pending(self, q: np.ndarray) -> list[tuple[float, str, str]]:
+        """Queued-but-unwritten adds are searchable too (embedded here, reused by the worker)."""
+        with self._pending_lock:
+            items = list(self._pending)
+        out = []
+        for it in items:
+            if it["vecs"] is None:
+                it["vecs"] = self._embed(it["documents"])
+            sims = it["vecs"] @ q
+            out.extend((float(sim), mid, doc) for sim, mid, doc in zip(sims, it["ids"], it["documents"]))
+        return out
+
+    def _count(self, key: str):
+        with self._stats_lock:  # retrievals overlap, and += on a dict entry isn't atomic
+            self._stats[key] += 1
+
+    def stats(self) -> dict:
+        """Cache hit rates and retrieval latency (ms) since start-up."""
+        with self._stats_lock:
+            st = dict(self._stats)
+        lookups = st["query_cache_hits"] + st["query_cache_misses"]
+        st["query_cache_hit_rate"] = st["query_cache_hits"] / lookups if lookups else 0.0
+        st["hot_only_rate"] = st["hot_only"] / st["retrievals"] if st["retrievals"] else 0.0
+        st["lexical_fast_rate"] = st["lexical_fast"] / st["retrievals"] if st["retrievals"] else 0.0
+        st["hot_index_size"] = len(self._hot)
+        if self._latencies:
+            lat = sorted(self._latencies)
+            st["retrieve_ms_p50"] = lat[len(lat) // 2] * 1000
+            st["retrieve_ms_p95"] = lat[min(len(lat) - 1, int(len(lat) * 0.95))] * 1000
+            st["retrieve_ms_last"] = self._latencies[-1] * 1000
+        return st
+
+    def add_memory(self, user_input: str, assistant_response: str, turn_id: str | None = None) -> str:
         """
         Adds a conversational turn to the memory.
         :param user_input: The text of the user's input.
         :param assistant_response: The text of the assistant's full response.
+        :param turn_id: Id to file the turn under (e.g. the one its full response is stored
+                        with in the ResponseStore); a new one is made up if not given.
+        :return: The turn_id.
         """
-        turn_id = str(uuid.uuid4())
-        self._collection.add(
+        turn_id = turn_id or str(uuid.uuid4())
+        self._add(
             documents=[
                 f"User said: {user_input}",
                 f"Assistant responded: {assistant_response}"
@@ -55,35 +413,56 @@ class ChromaMemoryService:
                 {"speaker": "user", "turn_id": turn_id, "ts": time.time()},
                 {"speaker": "assistant", "turn_id": turn_id, "ts": time.time()}
             ],
-            ids=[f"user_{turn_id}", f"assistant_{turn_id}"]
+            ids=[f"user_{turn_id}", f"assistant_{turn_id}"],
+            # NEW: journal both sides of the turn (append-only, NDJSON)
+            journal=[
+                {"type":"turn", "ts": time.time(), "turn_id": turn_id,
+                 "speaker":"user", "text": user_input},
+                {"type":"turn", "ts": time.time(), "turn_id": turn_id,
+                 "speaker":"assistant", "text": assistant_response},
+            ]
         )
         logging.info(f"Added memory for turn {turn_id}.")
-
-        # NEW: journal both sides of the turn (append-only, NDJSON)
-        _append_journal({
-            "type":"turn", "ts": time.time(), "turn_id": turn_id,
-            "speaker":"user", "text": user_input
-        })
-        _append_journal({
-            "type":"turn", "ts": time.time(), "turn_id": turn_id,
-            "speaker":"assistant", "text": assistant_response
-        })
+        return turn_id
 
     def add_system_memory(self, system_note: str):
         """Adds a system-level memory, like a self-reflection."""
         note_id = str(uuid.uuid4())
-        self._collection.add(
+        self._add(
             documents=[system_note],
             metadatas=[{"speaker": "system", "ts": time.time()}],
-            ids=[f"system_{note_id}"]
+            ids=[f"system_{note_id}"],
+            # NEW: journal system notes too
+            journal=[{"type":"system", "ts": time.time(),
+                      "speaker":"system", "text": system_note}]
         )
         logging.info(f"Added system memory: '{system_note}'")
 
-        # NEW: journal system notes too
-        _append_journal({
-            "type":"system", "ts": time.time(),
-            "speaker":"system", "text": system_note
-        })
+    def _fuse(self, vec_ranked: list[tuple[str, str]], lex: list, ts_of: dict, n_results: int) -> list[tuple[str, str]]:
+        """
+        Reciprocal-rank fusion of the vector ranking [(id, doc)] and the BM25 hits, plus a
+        recency boost from the ts metadata (RECENCY_WEIGHT x a rank-1 term, halving every
+        RECENCY_HALF_LIFE_DAYS). Returns the top [(id, doc)].
+        """
+        scores, docs = {}, {}
+        for rank, (mid, doc) in enumerate(vec_ranked):
+            scores[mid] = scores.get(mid, 0.0) + 1.0 / (RRF_K + rank + 1)
+            docs[mid] = doc
+        for rank, h in enumerate(lex):
+            scores[h.id] = scores.get(h.id, 0.0) + 1.0 / (RRF_K + rank + 1)
+            docs.setdefault(h.id, h.doc)
+            ts_of.setdefault(h.id, h.ts)
+        if RECENCY_WEIGHT:
+            now = time.time()
+            for mid in scores:
+                ts = ts_of.get(mid)
+                if ts is None and self._lexical is not None:
+                    ts = self._lexical.ts(mid)
+                if ts:
+                    age_days = max(0.0, now - ts) / 86400.0
+                    scores[mid] += RECENCY_WEIGHT / (RRF_K + 1) * 0.5 ** (age_days / RECENCY_HALF_LIFE_DAYS)
+        top = sorted(scores, key=scores.get, reverse=True)[:n_results]
+        return [(mid, docs[mid]) for mid in top]
 
     def retrieve_relevant_memories(self, query: str, n_results: int = 5) -> list[str]:
         """
@@ -92,15 +471,74 @@ class ChromaMemoryService:
         :param n_results: The number of results to retrieve.
         :return: A list of the most relevant document strings.
         """
-        results = self._collection.query(query_texts=[query], n_results=n_results)
+        t0 = time.perf_counter()
+        self._count("retrievals")
+        lex = self._lexical.search(query, k=2 * n_results) if self._lexical is not None else []
+
+        # Lexical fast path: the query names something specific and one memory has all of it.
+        # A single plain word isn't enough, whatever its coverage: fuse with the vector hits.
+        if (lex and lex[0].coverage >= LEX_FAST_COVERAGE and (lex[0].terms >= 2 or lex[0].ident)
+                and lex[0].score >= LEX_FAST_SCORE and self._lexical.max_idf(query) >= LEX_FAST_IDF):
+            self._count("lexical_fast")
+            sure = [h for h in lex if h.coverage >= LEX_FAST_COVERAGE]
+            docs = [doc for _, doc in self._fuse([], sure, {}, n_results)]
+            docs += [h.doc for h in lex if h.coverage < LEX_FAST_COVERAGE][:n_results - len(docs)]
+            return self._retrieved(query, docs, t0)
+
+        q = self._embed_query(query)
+        # Hot tier first: recent memories (plus anything still queued), vectorized cosine in RAM.
+        hits, ts_of = {}, {}
+        for sim, mid, doc in self._hot.search(q, n_results) + self._search_pending(q):
+            if mid not in hits or hits[mid][0] < sim:
+                hits[mid] = (sim, doc)
+        strong = sum(1 for sim, _ in hits.values() if sim >= self.hot_only_threshold)
+
+        def _merge(results):
+            # default space is squared L2; on unit vectors that's 2 - 2*cos
+            ids = (results.get("ids") or [[]])[0]
+            docs = (results.get("documents") or [[]])[0]
+            dists = (results.get("distances") or [[]])[0]
+            metas = (results.get("metadatas") or [[]])[0] or [None] * len(ids)
+            for mid, doc, d, meta in zip(ids, docs, dists, metas):
+                sim = 1.0 - d / 2.0
+                if mid not in hits or hits[mid][0] < sim:
+                    hits[mid] = (sim, doc)
+                if meta and "ts" in meta:
+                    ts_of[mid] = meta["ts"]
+            return set(ids)
+
+        if strong >= n_results:
+            self._count("hot_only")
+        else:
+            self._count("chroma_queries")
+            chroma_ids = _merge(self._collection.query(query_embeddings=[q.tolist()], n_results=n_results,
+                                                       include=["documents", "distances", "metadatas"]))
+            if any(mid not in chroma_ids for mid in hits):
+                self._count("hot_contributed")
+
+        # Cold tier: consolidated-away raw turns, only when nothing in the hot tier matches well
+        best = max((sim for sim, _ in hits.values()), default=0.0)
+        if best < self.archive_threshold:
+            self._count("archive_queries")
+            try:
+                _merge(self._archive.query(query_embeddings=[q.tolist()], n_results=n_results,
+                                           include=["documents", "distances", "metadatas"]))
+            except Exception as e:
+                logging.warning(f"Archive query failed: {e}")
 
-        nested_docs = results.get('documents', [])
-        if not nested_docs:
-            return []
+        ranked = sorted(hits.items(), key=lambda kv: kv[1][0], reverse=True)
+        if self._lexical is None:
+            return self._retrieved(query, [doc for _, (_, doc) in ranked[:n_results]], t0)
+        fused = self._fuse([(mid, doc) for mid, (_, doc) in ranked], lex, ts_of, n_results)
+        if any(mid not in hits for mid, _ in fused):
+            self._count("lexical_contributed")
+        return self._retrieved(query, [doc for _, doc in fused], t0)
 
-        retrieved_docs = nested_docs[0]
-        logging.info(f"Retrieved {len(retrieved_docs)} memories for query '{query}'.")
-        return retrieved_docs
+    def _retrieved(self, query: str, docs: list[str], t0: float) -> list[str]:
+        self._latencies.append(time.perf_counter() - t0)
+        logging.info(f"Retrieved {len(docs)} memories for query '{query}' "
+                     f"in {self._latencies[-1]*1000:.1f}ms.")
+        return docs
 
 if __name__ == '__main__':
     # Example usage
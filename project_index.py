@@ -0,0 +1,168 @@
+# project_index.py
+import os, re, math, time, logging, threading
+from collections import defaultdict
+
+INDEX_MAX_FILE_BYTES = int(os.getenv("ELYSIA_INDEX_MAX_FILE_BYTES", str(16 * 1024 * 1024)))
+INDEX_REFRESH_S = float(os.getenv("ELYSIA_INDEX_REFRESH_S", "2.0"))  # min gap between tree walks
+SKIP_DIRS = {".git", "__pycache__", "node_modules", ".venv", "venv", "chroma_db", "tts_cache",
+             "tool_cache", "mem_journal", "traces", "bench_results", ".pytest_cache", "dist", "build"}
+SKIP_SUFFIXES = (".pyc", ".so", ".f32", ".gz", ".zst", ".sqlite3", ".bin", ".onnx", ".pt",
+                 ".png", ".jpg", ".wav", ".mp3", ".zip")
+
+_WORD = re.compile(r"[A-Za-z_][A-Za-z0-9_]+|\d{2,}")
+
+def tokenize(text: str) -> list[str]:
+    """Lowercased identifiers/words; snake_case names also index their parts."""
+    out = []
+    for w in _WORD.findall(text):
+        w = w.lower()
+        out.append(w)
+        if "_" in w.strip("_"):
+            out.extend(p for p in w.split("_") if len(p) > 1)
+    return out
+
+class ProjectIndex:
+    """
+    Inverted index over the text files under root: token -> {path: [line numbers]}.
+    refresh() walks the tree and re-indexes only files whose (mtime, size) changed, dropping
+    deleted ones; search() refreshes (rate-limited) and ranks lines by the idf of the query
+    terms they contain, with a bonus for the literal query.
+    """
+
+    def __init__(self, root: str | None = None):
+        self.root = os.path.abspath(root or os.getcwd())
+        self._lock = threading.Lock()
+        self._files = {}                     # path -> (mtime_ns, size, tokens)
+        self._postings = defaultdict(dict)   # token -> {path: [line, ...]}
+        self._last_refresh = 0.0
+
+    def warmup(self):
+        self.refresh(force=True)
+
+    def _walk(self):
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            dirnames[:] = [d for d in dirnames if d not in SKIP_DIRS and not d.startswith(".")]
+            for name in filenames:
+                if name.endswith(SKIP_SUFFIXES):
+                    continue
+                path = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                if 0 < st.st_size <= INDEX_MAX_FILE_BYTES:
+                    yield path, st.st_mtime_ns, st.st_size
+
+    def refresh(self, force: bool = False) -> dict:
+        """Brings the index up to date with the disk; returns counts of what changed."""
+        with self._lock:
+            if not force and time.monotonic() - self._last_refresh < INDEX_REFRESH_S:
+                return {"indexed": 0, "removed": 0}
+            t0 = time.perf_counter()
+            seen, indexed = set(), 0
+            for path, mtime, size in self._walk():
+                seen.add(path)
+                old = self._files.get(path)
+                if old and old[0] == mtime and old[1] == size:
+                    continue
+                self._drop(path)
+                if self._index_file(path, mtime, size):
+                    indexed += 1
+            removed = [p for p in self._files if p not in seen]
+            for path in removed:
+                self._drop(path)
+            self._last_refresh = time.monotonic()
+        if indexed or removed:
+            logging.info(f"Project index: {indexed} file(s) indexed, {len(removed)} removed, "
+                         f"{len(self._files)} total in {time.perf_counter() - t0:.3f}s")
+        return {"indexed": indexed, "removed": len(removed)}
+
+    def _index_file(self, path: str, mtime: int, size: int) -> bool:
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return False
+        if b"\0" in data[:8192]:
+            return False  # binary
+        tokens = set()
+        # split on "\n" only, so line numbers agree with read_file's line ranges
+        for lineno, line in enumerate(data.decode("utf-8", errors="ignore").split("\n"), 1):
+            for tok in set(tokenize(line)):
+                self._postings[tok].setdefault(path, []).append(lineno)
+                tokens.add(tok)
+        self._files[path] = (mtime, size, tokens)
+        return True
+
+    def _drop(self, path: str):
+        old = self._files.pop(path, None)
+        if not old:
+            return
+        for tok in old[2]:
+            files = self._postings.get(tok)
+            if files is not None:
+                files.pop(path, None)
+                if not files:
+                    del self._postings[tok]
+
+    def search(self, query: str, max_results: int = 20) -> list[tuple[str, int, str, float]]:
+        """[(relative path, line number, line text, score)] best first."""
+        self.refresh()
+        terms = sorted(set(tokenize(query)))
+        if not terms:
+            return []
+        with self._lock:
+            n_files = max(1, len(self._files))
+            scores = defaultdict(float)  # (path, line) -> score
+            for term in terms:
+                files = self._postings.get(term)
+                if not files:
+                    continue
+                idf = math.log(1.0 + n_files / len(files))
+                for path, lines in files.items():
+                    for ln in lines:
+                        scores[(path, ln)] += idf
+        # only the best few candidates get their text read back (and the literal-match bonus)
+        needle = query.strip().lower()
+        top = sorted(scores.items(), key=lambda kv: -kv[1])[:max_results * 5]
+        wanted = defaultdict(set)
+        for (path, ln), _ in top:
+            wanted[path].add(ln)
+        texts = {path: self._lines(path, lines) for path, lines in wanted.items()}
+        hits = []
+        for (path, ln), score in top:
+            text = texts.get(path, {}).get(ln, "")
+            if needle and needle in text.lower():
+                score += 2.0 * len(terms)
+            hits.append((os.path.relpath(path, self.root), ln, text.strip(), round(score, 3)))
+        hits.sort(key=lambda h: (-h[3], h[0], h[1]))
+        return hits[:max_results]
+
+    @staticmethod
+    def _lines(path: str, wanted: set[int]) -> dict[int, str]:
+        out, last = {}, max(wanted)
+        try:
+            with open(path, "rb") as f:
+                for ln, line in enumerate(f, 1):
+                    if ln in wanted:
+                        out[ln] = line.decode("utf-8", errors="ignore")
+                    if ln >= last:
+                        break
+        except OSError:
+            pass
+        return out
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"files": len(self._files), "terms": len(self._postings)}
+
+_INDEX = None
+_INDEX_LOCK = threading.Lock()
+
+def get_index(root: str | None = None) -> ProjectIndex:
+    """Process-wide index (over root, default cwd), built on first use or by main_app's startup."""
+    global _INDEX
+    with _INDEX_LOCK:
+        if _INDEX is None:
+            _INDEX = ProjectIndex(root)
+        return _INDEX
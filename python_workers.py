@@ -0,0 +1,350 @@
+# python_workers.py
+"""
+Warm pool of out-of-process Python workers for ElysiaTools.execute_python.
+
+Each worker is `python python_workers.py --worker`: it pre-imports ELYSIA_PY_PRELOAD, caps its
+address space, then runs one request at a time read as a JSON line on stdin, sending output
+back as JSON lines while the code runs. The parent enforces a wall-clock timeout (kill +
+replace), each call gets a CPU-time budget (RLIMIT_CPU), and workers are recycled after a
+crash or max_uses calls. A session pins one worker and keeps its namespace between calls.
+"""
+import os, sys, json, time, queue, atexit, logging, threading, subprocess, traceback
+from collections import namedtuple, OrderedDict
+
+try:
+    import resource  # POSIX only; without it workers just run unlimited
+except ImportError:
+    resource = None
+
+PY_WORKERS = int(os.getenv("ELYSIA_PY_WORKERS", "2"))
+PY_TIMEOUT = float(os.getenv("ELYSIA_PY_TIMEOUT", "20"))
+PY_CPU_SECONDS = int(os.getenv("ELYSIA_PY_CPU_S", "15"))
+PY_MEMORY_MB = int(os.getenv("ELYSIA_PY_MEM_MB", "1024"))  # on top of what the preloads mapped
+PY_MAX_USES = int(os.getenv("ELYSIA_PY_MAX_USES", "25"))
+PY_MAX_OUTPUT = int(os.getenv("ELYSIA_PY_MAX_OUTPUT", "10000"))
+PY_PRELOAD = [m for m in os.getenv("ELYSIA_PY_PRELOAD", "json,math,re,datetime,collections,numpy").split(",") if m]
+PY_MAX_SESSIONS = 4
+
+ExecResult = namedtuple("ExecResult", "output result error truncated timed_out elapsed")
+
+# --- worker side -----------------------------------------------------------------------------
+
+class _StreamOut:
+    """sys.stdout/sys.stderr stand-in: forwards text to the parent in chunks, up to a cap."""
+
+    def __init__(self, send, cap: int):
+        self._send = send
+        self._cap = cap
+        self._sent = 0
+        self._buf = []
+        self._lock = threading.Lock()
+        self.truncated = False
+
+    def write(self, s):
+        with self._lock:
+            if self._sent >= self._cap:
+                self.truncated = self.truncated or bool(s)
+                return len(s)
+            room = self._cap - self._sent
+            if len(s) > room:
+                s, self.truncated = s[:room], True
+            self._sent += len(s)
+            self._buf.append(s)
+            if "\n" in s or sum(map(len, self._buf)) >= 4096:
+                self._flush()
+        return len(s)
+
+    def _flush(self):
+        if self._buf:
+            self._send({"type": "out", "data": "".join(self._buf)})
+            self._buf = []
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def isatty(self):
+        return False
+
+def _address_space() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[0]) * os.sysconf("SC_PAGE_SIZE")
+    except Exception:
+        return 0
+
+def _worker_main():
+    # The protocol owns the real stdout; fd 1 goes to /dev/null so stray fd-level writes
+    # (e.g. from child processes) can't corrupt it. Python-level prints are streamed.
+    proto = os.fdopen(os.dup(1), "w", buffering=1, encoding="utf-8")
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, 1)
+    send_lock = threading.Lock()
+
+    def send(msg):
+        with send_lock:
+            proto.write(json.dumps(msg) + "\n")
+
+    for mod in PY_PRELOAD:
+        try:
+            __import__(mod)
+        except Exception:
+            pass
+    if resource and PY_MEMORY_MB > 0:
+        try:
+            limit = _address_space() + PY_MEMORY_MB * 1024 * 1024
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+        except (ValueError, OSError):
+            pass
+    # the hard limit stays where it was: an unprivileged process can lower it but never raise
+    # it again, so per-call budgets only ever move the soft limit
+    cpu_hard = resource.getrlimit(resource.RLIMIT_CPU)[1] if resource else None
+    send({"type": "ready", "pid": os.getpid()})
+
+    ns = None
+    for line in sys.stdin:
+        req = json.loads(line)
+        if ns is None or req.get("reset") or not req.get("keep"):
+            ns = {"__name__": "__elysia__", "__builtins__": __builtins__}
+        ns.pop("result", None)  # a result left by an earlier call isn't this call's output
+        if resource and req.get("cpu_s"):
+            used = sum(resource.getrusage(resource.RUSAGE_SELF)[:2])
+            soft = int(used + req["cpu_s"]) + 1
+            if cpu_hard != resource.RLIM_INFINITY:
+                soft = min(soft, cpu_hard)
+            try:
+                resource.setrlimit(resource.RLIMIT_CPU, (soft, cpu_hard))  # SIGXCPU kills us at soft
+            except (ValueError, OSError):
+                pass
+        out = _StreamOut(send, req.get("max_output", PY_MAX_OUTPUT))
+        old = sys.stdout, sys.stderr
+        sys.stdout = sys.stderr = out
+        error = None
+        try:
+            exec(compile(req["code"], "<elysia>", "exec"), ns)
+        except SystemExit:
+            pass
+        except BaseException:
+            error = traceback.format_exc()
+        finally:
+            sys.stdout, sys.stderr = old
+            out.flush()
+        result = None
+        if "result" in ns:
+            try:
+                result = str(ns["result"])[:req.get("max_output", PY_MAX_OUTPUT)]
+            except Exception as e:
+                result = f"[unprintable result: {e}]"
+        send({"type": "done", "error": error, "result": result, "truncated": out.truncated})
+
+# --- parent side -----------------------------------------------------------------------------
+
+class _Worker:
+    def __init__(self, ready_timeout: float = 60.0):
+        self.uses = 0
+        self.reset = False  # next request starts a fresh namespace (set when a session pins us)
+        self.proc = subprocess.Popen(
+            [sys.executable, "-u", os.path.abspath(__file__), "--worker"],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True, encoding="utf-8",
+            start_new_session=True)  # Ctrl+C in the voice loop shouldn't kill the workers
+        self.msgs = queue.Queue()
+        threading.Thread(target=self._read, name=f"pyworker-{self.proc.pid}", daemon=True).start()
+        msg = self.msgs.get(timeout=ready_timeout)
+        if not msg or msg.get("type") != "ready":
+            self.kill()
+            raise RuntimeError("python worker failed to start")
+
+    def _read(self):
+        for line in self.proc.stdout:
+            try:
+                self.msgs.put(json.loads(line))
+            except ValueError:
+                pass
+        self.msgs.put(None)  # EOF: the worker died
+
+    def alive(self) -> bool:
+        return self.proc.poll() is None
+
+    def kill(self):
+        if self.alive():
+            self.proc.kill()
+        try:
+            self.proc.wait(timeout=5)
+        except Exception:
+            pass
+
+    def death_reason(self) -> str:
+        rc = self.proc.wait(timeout=5)
+        if rc == -24:  # SIGXCPU
+            return "CPU time limit exceeded"
+        if rc == -9:
+            return "killed (out of memory?)"
+        return f"worker exited with code {rc}"
+
+class PythonWorkerPool:
+    """Pre-spawned, pre-imported workers; run() borrows one per call (or the session's own)."""
+
+    def __init__(self, size: int = PY_WORKERS, timeout: float = PY_TIMEOUT, cpu_seconds: int = PY_CPU_SECONDS,
+                 max_uses: int = PY_MAX_USES, max_output: int = PY_MAX_OUTPUT):
+        self.size = max(1, size)
+        self.timeout = timeout
+        self.cpu_seconds = cpu_seconds
+        self.max_uses = max_uses
+        self.max_output = max_output
+        self._idle = queue.Queue()
+        self._sessions = OrderedDict()  # session -> _Worker (pinned, keeps its namespace)
+        self._lock = threading.Lock()
+        self._closed = False
+        self.crashes = self.timeouts = self.recycled = 0
+        for _ in range(self.size):
+            self._spawn_async()
+        atexit.register(self.close)
+
+    def _spawn_async(self):
+        def _spawn():
+            try:
+                w = _Worker()
+            except Exception as e:
+                logging.error(f"Python worker spawn failed: {e}")
+                return
+            if self._closed:
+                w.kill()
+            else:
+                self._idle.put(w)
+        threading.Thread(target=_spawn, daemon=True).start()
+
+    def warmup(self, timeout: float = 60.0):
+        """Blocks until the initial workers are up (startup pool calls this)."""
+        deadline = time.monotonic() + timeout
+        while self._idle.qsize() < self.size and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+    def _acquire(self, session: str | None) -> _Worker:
+        if session is not None:
+            with self._lock:
+                w = self._sessions.get(session)
+                if w is not None:
+                    self._sessions.move_to_end(session)
+                    return w
+        w = self._idle.get(timeout=self.timeout)
+        if session is not None:
+            # the worker still holds the globals of its last anonymous call: the session starts
+            # from a clean namespace, and its use count starts at its own first call
+            w.uses, w.reset = 0, True
+            self._spawn_async()  # pinned for good: the pool gets a replacement
+            with self._lock:
+                self._sessions[session] = w
+                while len(self._sessions) > PY_MAX_SESSIONS:
+                    _, old = self._sessions.popitem(last=False)
+                    old.kill()
+        return w
+
+    def _release(self, w: _Worker, session: str | None, broken: bool) -> bool:
+        """Returns True if a session's worker was recycled (its globals are gone)."""
+        if session is not None:
+            spent = not broken and w.uses >= self.max_uses
+            if broken or spent:
+                with self._lock:
+                    if self._sessions.get(session) is w:
+                        del self._sessions[session]
+                w.kill()
+                if spent:
+                    self.recycled += 1  # the session's next call pins a fresh worker
+            return spent
+        if broken or w.uses >= self.max_uses or not w.alive():
+            if not broken and w.uses >= self.max_uses:
+                self.recycled += 1
+            w.kill()
+            self._spawn_async()
+        else:
+            self._idle.put(w)
+        return False
+
+    def run(self, code: str, session: str | None = None, on_output=None) -> ExecResult:
+        """
+        Runs code in a worker. session=None gets a fresh namespace; a session name reuses that
+        session's worker and globals. on_output(text) sees output chunks as they arrive.
+        """
+        t0 = time.perf_counter()
+        try:
+            w = self._acquire(session)
+        except queue.Empty:
+            return ExecResult("", None, "[Error: no Python worker available]", False, True, 0.0)
+        w.uses += 1
+        req = {"code": code, "keep": session is not None, "reset": w.reset,
+               "cpu_s": self.cpu_seconds, "max_output": self.max_output}
+        w.reset = False
+        out, broken, recycled = [], False, False
+        result, error, truncated, timed_out = None, None, False, False
+        try:
+            w.proc.stdin.write(json.dumps(req) + "\n")
+            w.proc.stdin.flush()
+            deadline = t0 + self.timeout
+            while True:
+                try:
+                    msg = w.msgs.get(timeout=max(0.0, deadline - time.perf_counter()))
+                except queue.Empty:
+                    timed_out, broken = True, True
+                    self.timeouts += 1
+                    error = f"[Error: timed out after {self.timeout:g}s]"
+                    break
+                if msg is None:
+                    broken = True
+                    self.crashes += 1
+                    error = f"[Error: Python worker died: {w.death_reason()}]"
+                    break
+                if msg["type"] == "out":
+                    out.append(msg["data"])
+                    if on_output:
+                        on_output(msg["data"])
+                elif msg["type"] == "done":
+                    result, error, truncated = msg["result"], msg["error"], msg["truncated"]
+                    break
+        except (BrokenPipeError, OSError) as e:
+            broken = True
+            self.crashes += 1
+            error = f"[Error: Python worker unavailable: {e}]"
+        finally:
+            recycled = self._release(w, session, broken)
+        if broken and session is not None:
+            error += " (session state was lost)"
+        if recycled:
+            out.append(f"\n[session worker recycled after {w.uses} calls; variables are reset from the next call]")
+        return ExecResult("".join(out), result, error, truncated, timed_out, time.perf_counter() - t0)
+
+    def end_session(self, session: str):
+        with self._lock:
+            w = self._sessions.pop(session, None)
+        if w is not None:
+            w.kill()
+
+    def stats(self) -> dict:
+        return {"idle": self._idle.qsize(), "sessions": len(self._sessions), "crashes": self.crashes,
+                "timeouts": self.timeouts, "recycled": self.recycled}
+
+    def close(self):
+        self._closed = True
+        with self._lock:
+            pinned = list(self._sessions.values())
+            self._sessions.clear()
+        for w in pinned:
+            w.kill()
+        while True:
+            try:
+                self._idle.get_nowait().kill()
+            except queue.Empty:
+                break
+
+_POOL = None
+_POOL_LOCK = threading.Lock()
+
+def get_pool() -> PythonWorkerPool:
+    """Process-wide pool, created on first use (or by main_app's startup)."""
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            _POOL = PythonWorkerPool()
+        return _POOL
+
+if __name__ == "__main__" and "--worker" in sys.argv:
+    _worker_main()
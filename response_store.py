@@ -0,0 +1,249 @@
+# response_store.py
+import os, re, sys, json, time, zlib, struct, bisect, logging, datetime, threading
+from collections import namedtuple
+
+# Segment files hold length-prefixed records, each one zlib-compressed JSON
+# ({"turn_id", "ts", "text", ...}); index.ndjson maps turn_id -> (segment, offset, length).
+# The index is only an accelerator: it can be rebuilt by scanning the segments.
+_SEGMENT = re.compile(r'^seg-(\d{6})\.dat$')
+_FRAME = struct.Struct(">I")
+_LEGACY = re.compile(r'^response_(\d{8}_\d{6})(?:_\d+)?\.txt$')
+
+Record = namedtuple("Record", "turn_id ts text meta")
+_Loc = namedtuple("_Loc", "ts seg off length")
+
+class ResponseStore:
+    """
+    Append-only store for full assistant responses, keyed by the memory turn_id.
+    - get(turn_id): one dict lookup + one seek/read/decompress
+    - scan(since, until): time-ordered records via a sorted (ts, turn_id) list
+    - segments roll over at max_segment_bytes, so a long-running box has a handful of
+      files instead of one per turn
+    """
+
+    def __init__(self, directory: str | None = None, max_segment_bytes: int | None = None,
+                 fsync: bool = False):
+        self.directory = directory or os.getenv("ELYSIA_RESPONSE_DIR", "response_store")
+        self.max_segment_bytes = max_segment_bytes or int(os.getenv("ELYSIA_RESPONSE_SEGMENT_BYTES", str(16 << 20)))
+        self.fsync = fsync
+        os.makedirs(self.directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._index = {}      # turn_id -> _Loc
+        self._by_time = []    # sorted (ts, turn_id)
+        self._readers = {}    # seg -> open file for reads
+        self._index_path = os.path.join(self.directory, "index.ndjson")
+        self._load()
+        self._seg = max(self._segments(), default=1)
+        self._fh = open(self._seg_path(self._seg), "ab")
+        self._idx = open(self._index_path, "a", encoding="utf-8")
+
+    # --- layout ---
+    def _seg_path(self, seg: int) -> str:
+        return os.path.join(self.directory, f"seg-{seg:06d}.dat")
+
+    def _segments(self) -> list[int]:
+        return sorted(int(m.group(1)) for m in map(_SEGMENT.match, os.listdir(self.directory)) if m)
+
+    def _remember(self, turn_id: str, loc: _Loc):
+        old = self._index.get(turn_id)
+        if old is not None:
+            i = bisect.bisect_left(self._by_time, (old.ts, turn_id))
+            if i < len(self._by_time) and self._by_time[i] == (old.ts, turn_id):
+                self._by_time.pop(i)
+        self._index[turn_id] = loc
+        bisect.insort(self._by_time, (loc.ts, turn_id))
+
+    def _load(self):
+        """Reads the index, then recovers records written after its last line (crash between
+        the segment write and the index write) and cuts any torn frame off the last segment."""
+        ends = {}
+        if os.path.exists(self._index_path):
+            with open(self._index_path, encoding="utf-8", errors="ignore") as f:
+                for line in f:
+                    try:
+                        e = json.loads(line)
+                        loc = _Loc(e["ts"], e["seg"], e["off"], e["len"])
+                    except (ValueError, KeyError):
+                        continue  # torn tail line
+                    self._remember(e["id"], loc)
+                    ends[loc.seg] = max(ends.get(loc.seg, 0), loc.off + _FRAME.size + loc.length)
+        segs = self._segments()
+        recovered = 0
+        for seg in segs:
+            path = self._seg_path(seg)
+            size = os.path.getsize(path)
+            pos = ends.get(seg, 0)
+            if pos >= size:
+                continue
+            with open(path, "rb") as f:
+                f.seek(pos)
+                while pos < size:
+                    head = f.read(_FRAME.size)
+                    if len(head) < _FRAME.size:
+                        break
+                    (n,) = _FRAME.unpack(head)
+                    blob = f.read(n)
+                    try:
+                        rec = json.loads(zlib.decompress(blob))
+                    except (zlib.error, ValueError):
+                        break
+                    self._remember(rec["turn_id"], _Loc(rec["ts"], seg, pos, n))
+                    pos += _FRAME.size + n
+                    recovered += 1
+            if pos < size and seg == segs[-1]:
+                logging.warning(f"Response store: dropping {size - pos} torn bytes at the end of {path}")
+                with open(path, "r+b") as f:
+                    f.truncate(pos)
+        if recovered:
+            self._rewrite_index()
+            logging.info(f"Response store: recovered {recovered} unindexed record(s).")
+
+    def _rewrite_index(self):
+        tmp = self._index_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            for ts, turn_id in self._by_time:
+                loc = self._index[turn_id]
+                f.write(json.dumps({"id": turn_id, "ts": loc.ts, "seg": loc.seg, "off": loc.off, "len": loc.length}) + "\n")
+        os.replace(tmp, self._index_path)
+
+    # --- writes ---
+    def put(self, turn_id: str, text: str, ts: float | None = None, **meta) -> str:
+        """Appends a response under turn_id (a later put for the same id wins). Returns turn_id."""
+        ts = time.time() if ts is None else ts
+        blob = zlib.compress(json.dumps({"turn_id": turn_id, "ts": ts, "text": text, **meta},
+                                        ensure_ascii=False).encode("utf-8"), 6)
+        with self._lock:
+            if self._fh.tell() + len(blob) > self.max_segment_bytes and self._fh.tell() > 0:
+                self._fh.close()
+                self._seg += 1
+                self._fh = open(self._seg_path(self._seg), "ab")
+            off = self._fh.tell()
+            self._fh.write(_FRAME.pack(len(blob)) + blob)
+            self._fh.flush()
+            loc = _Loc(ts, self._seg, off, len(blob))
+            # index line after the data: a crash in between is repaired by _load()
+            self._idx.write(json.dumps({"id": turn_id, "ts": ts, "seg": self._seg, "off": off, "len": len(blob)}) + "\n")
+            self._idx.flush()
+            if self.fsync:
+                os.fsync(self._fh.fileno())
+                os.fsync(self._idx.fileno())
+            self._remember(turn_id, loc)
+        return turn_id
+
+    # --- reads ---
+    def _read(self, loc: _Loc) -> Record:
+        fh = self._readers.get(loc.seg)
+        if fh is None:
+            fh = self._readers[loc.seg] = open(self._seg_path(loc.seg), "rb")
+        fh.seek(loc.off + _FRAME.size)
+        rec = json.loads(zlib.decompress(fh.read(loc.length)))
+        text, ts, turn_id = rec.pop("text"), rec.pop("ts"), rec.pop("turn_id")
+        return Record(turn_id, ts, text, rec)
+
+    def get(self, turn_id: str) -> Record | None:
+        with self._lock:
+            loc = self._index.get(turn_id)
+            return self._read(loc) if loc is not None else None
+
+    def __contains__(self, turn_id: str) -> bool:
+        return turn_id in self._index
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def scan(self, since: float | None = None, until: float | None = None, limit: int | None = None):
+        """Yields Records with since <= ts < until, oldest first."""
+        with self._lock:
+            lo = 0 if since is None else bisect.bisect_left(self._by_time, (since, ""))
+            hi = len(self._by_time) if until is None else bisect.bisect_left(self._by_time, (until, ""))
+            keys = self._by_time[lo:hi][:limit]
+        for _, turn_id in keys:
+            rec = self.get(turn_id)
+            if rec is not None:
+                yield rec
+
+    def stats(self) -> dict:
+        with self._lock:
+            segs = self._segments()
+            return {"records": len(self._index), "segments": len(segs),
+                    "bytes": sum(os.path.getsize(self._seg_path(s)) for s in segs)}
+
+    # --- migration ---
+    def migrate_dir(self, legacy_dir: str, remove: bool = True) -> int:
+        """
+        Imports the old one-file-per-response logs (response_YYYYmmdd_HHMMSS.txt). They predate
+        turn ids, so each gets "legacy_<file stem>"; the file's timestamp becomes ts. Files are
+        removed once stored (and synced). Returns how many were imported.
+        """
+        if not os.path.isdir(legacy_dir):
+            return 0
+        moved = []
+        for name in sorted(os.listdir(legacy_dir)):
+            m = _LEGACY.match(name)
+            if not m:
+                continue
+            path = os.path.join(legacy_dir, name)
+            turn_id = "legacy_" + name[:-len(".txt")]
+            if turn_id not in self:
+                ts = datetime.datetime.strptime(m.group(1), "%Y%m%d_%H%M%S").timestamp()
+                with open(path, encoding="utf-8", errors="replace") as f:
+                    self.put(turn_id, f.read(), ts=ts, source=name)
+            moved.append(path)
+        if moved:
+            self.sync()
+            if remove:
+                for path in moved:
+                    os.remove(path)
+                try:
+                    os.rmdir(legacy_dir)
+                except OSError:
+                    pass  # something else lives there; leave it
+            logging.info(f"Response store: migrated {len(moved)} file(s) from {legacy_dir}.")
+        return len(moved)
+
+    def sync(self):
+        with self._lock:
+            self._fh.flush()
+            self._idx.flush()
+            os.fsync(self._fh.fileno())
+            os.fsync(self._idx.fileno())
+
+    def close(self):
+        with self._lock:
+            for fh in (self._fh, self._idx, *self._readers.values()):
+                fh.close()
+            self._readers.clear()
+
+def main(argv=None):
+    import argparse
+    ap = argparse.ArgumentParser(description="Inspect / migrate the Elysia response store.")
+    ap.add_argument("--dir", default=None, help="store directory (default $ELYSIA_RESPONSE_DIR or response_store)")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("get").add_argument("turn_id")
+    r = sub.add_parser("range", help="responses between two ISO dates/times")
+    r.add_argument("since")
+    r.add_argument("until", nargs="?")
+    sub.add_parser("migrate").add_argument("legacy_dir", nargs="?", default="response_logs")
+    sub.add_parser("stats")
+    args = ap.parse_args(argv)
+
+    store = ResponseStore(args.dir)
+    if args.cmd == "get":
+        rec = store.get(args.turn_id)
+        if rec is None:
+            sys.exit(f"no response for {args.turn_id}")
+        print(rec.text)
+    elif args.cmd == "range":
+        since = datetime.datetime.fromisoformat(args.since).timestamp()
+        until = datetime.datetime.fromisoformat(args.until).timestamp() if args.until else None
+        for rec in store.scan(since, until):
+            when = datetime.datetime.fromtimestamp(rec.ts).isoformat(timespec="seconds")
+            print(f"=== {rec.turn_id} {when}\n{rec.text}\n")
+    elif args.cmd == "migrate":
+        print(f"migrated {store.migrate_dir(args.legacy_dir)} file(s)")
+    else:
+        print(json.dumps(store.stats(), indent=2))
+    store.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+# speculation.py
+import os
+import re
+import time
+import logging
+import threading
+from difflib import SequenceMatcher
+
+from tracing import TRACER
+
+# opt-in: costs a second (realtime) whisper pass and extra Ollama prefill calls per utterance
+SPECULATE = os.getenv("ELYSIA_SPECULATE", "0") == "1"
+SPEC_SIMILARITY = float(os.getenv("ELYSIA_SPEC_SIMILARITY", "0.85"))  # final vs partial to keep
+SPEC_MIN_CHARS = int(os.getenv("ELYSIA_SPEC_MIN_CHARS", "12"))         # ignore shorter partials
+SPEC_PREFILL = os.getenv("ELYSIA_SPEC_PREFILL", "1") == "1"
+
+def _normalize(text: str) -> str:
+    return " ".join(re.sub(r"[^\w\s']", " ", text.lower()).split())
+
+def similarity(a: str, b: str) -> float:
+    """0..1, on normalized text (case/punctuation don't count: whisper flips them between passes)."""
+    a, b = _normalize(a), _normalize(b)
+    if not a or not b:
+        return 0.0
+    return SequenceMatcher(None, a, b, autojunk=False).ratio()
+
+class _Spec:
+    def __init__(self, text: str):
+        self.text = text
+        self.norm = _normalize(text)
+        self.started_at = time.perf_counter()
+        self.memories = None
+        self.retrieved = threading.Event()
+        self.retrieve_s = 0.0
+        self.prefilled_at = None
+        self.prefill_s = 0.0
+        self.error = None
+
+class Speculator:
+    """
+    Starts the front of a turn on the stabilized partial transcript while the user is still
+    talking: memory retrieval, then (optionally) prefill(text, memories), a 1-token LLM call on
+    the exact prefix the real turn will send, so Ollama already has it in its KV cache when the
+    final transcript arrives. Only the newest partial is worked on (latest wins); take(final)
+    keeps the result if the final text is close enough to the partial it was based on.
+    Off by default; ELYSIA_SPECULATE=1 turns it on (ELYSIA_SPEC_PREFILL=0 keeps just retrieval).
+    """
+
+    def __init__(self, memory, prefill=None, min_similarity: float = SPEC_SIMILARITY,
+                 min_chars: int = SPEC_MIN_CHARS, use_prefill: bool = SPEC_PREFILL):
+        self.memory = memory
+        self.prefill = prefill if use_prefill else None  # fn(text, memories), e.g. LLMService.prefill
+        self.min_similarity = min_similarity
+        self.min_chars = min_chars
+        self._lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)
+        self._pending = None   # newest partial not picked up by the worker yet
+        self._current = None   # the spec the worker is on / last finished
+        self._stats = {"partials": 0, "started": 0, "kept": 0, "discarded": 0, "saved_ms": 0.0}
+        threading.Thread(target=self._worker, name="speculator", daemon=True).start()
+
+    # --- STT side ---
+    def on_partial(self, text: str):
+        """STT callback with a stabilized partial transcript. Cheap; never blocks on work."""
+        norm = _normalize(text or "")
+        if len(norm) < self.min_chars:
+            return
+        with self._lock:
+            self._stats["partials"] += 1
+            latest = self._pending or self._current
+            if latest is not None and latest.norm == norm:
+                return
+            self._pending = _Spec(text)
+            self._wake.notify()
+
+    def _worker(self):
+        while True:
+            with self._lock:
+                while self._pending is None:
+                    self._wake.wait()
+                spec, self._pending = self._pending, None
+                self._current = spec
+                self._stats["started"] += 1
+            t0 = time.perf_counter()
+            try:
+                spec.memories = self.memory.retrieve_relevant_memories(spec.text)
+            except Exception as e:
+                spec.error = e
+                logging.warning(f"Speculative retrieval failed: {e}")
+            spec.retrieve_s = time.perf_counter() - t0
+            spec.retrieved.set()
+            # prefill only if nothing newer came in meanwhile and the turn hasn't taken this spec
+            # yet; either way it would be stale, competing with the real request for the model
+            with self._lock:
+                fresh = self._pending is None and self._current is spec
+            if spec.error is None and self.prefill and fresh:
+                t1 = time.perf_counter()
+                try:
+                    self.prefill(spec.text, spec.memories)
+                    spec.prefilled_at = time.perf_counter()
+                    spec.prefill_s = spec.prefilled_at - t1
+                except Exception as e:
+                    logging.warning(f"Speculative prefill failed: {e}")
+
+    # --- turn side ---
+    def take(self, final: str, wait: float = 1.0) -> list[str] | None:
+        """
+        Called with the final transcript. Returns the speculatively retrieved memories if they
+        were based on close-enough text (waiting up to `wait` s for retrieval still in flight),
+        else None and the caller retrieves as usual. Records a 'speculation' span either way.
+        """
+        now = time.perf_counter()
+        with self._lock:
+            spec = self._current
+            self._pending = None  # a partial the worker hasn't started on is moot now
+            self._current = None
+        if spec is None:
+            return None
+        sim = similarity(spec.text, final)
+        kept = sim >= self.min_similarity
+        waited = 0.0
+        if kept:
+            kept = spec.retrieved.wait(wait) and spec.error is None and spec.memories is not None
+            waited = time.perf_counter() - now
+        saved_ms = 0.0
+        if kept:
+            # what the turn didn't have to do after the transcript: the retrieval (minus any wait
+            # for it) and the prefix prefill if it finished before the transcript arrived
+            saved_ms = 1000 * max(0.0, spec.retrieve_s - waited)
+            if spec.prefilled_at is not None and spec.prefilled_at <= now:
+                saved_ms += 1000 * spec.prefill_s
+        with self._lock:
+            self._stats["kept" if kept else "discarded"] += 1
+            self._stats["saved_ms"] += saved_ms
+        TRACER.record("speculation", spec.started_at, time.perf_counter(), kept=kept,
+                      similarity=round(sim, 3), lead_ms=round(1000 * (now - spec.started_at)),
+                      saved_ms=round(saved_ms, 1))
+        logging.info(f"Speculation {'kept' if kept else 'discarded'}: similarity={sim:.2f} "
+                     f"saved={saved_ms:.0f} ms (partial '{spec.text}')")
+        return spec.memories if kept else None
+
+    def stats(self) -> dict:
+        with self._lock:
+            s = dict(self._stats)
+        s["saved_ms"] = round(s["saved_ms"], 1)
+        done = s["kept"] + s["discarded"]
+        s["keep_rate"] = round(s["kept"] / done, 3) if done else 0.0
+        return s
@@ -0,0 +1,106 @@
+# speech_segmenter.py
+import re
+
+# Sentence end: . ! ? (optionally followed by quotes/brackets) and then whitespace.
+_SENTENCE_END = re.compile(r'[.!?…]+["\')\]]*\s')
+# Softer clause boundaries used when a sentence runs long (or to get the first audio out early).
+_CLAUSE_END = re.compile(r'[,;:—–]\s')
+# Things that look like sentence ends but aren't (e.g. "e.g. ", "Dr. ", "3. ").
+_NOT_AN_END = re.compile(r'(\b(?:e\.g|i\.e|etc|vs|mr|mrs|ms|dr|st|no)\.|\b\d+\.)$', re.IGNORECASE)
+# Emphasis/heading markers; an underscore only at a word's edge, so main_app.py stays whole.
+_MARKDOWN = re.compile(r'[*#`>]+|(?<!\w)_+|_+(?!\w)')
+
+class SentenceSegmenter:
+    """
+    Turns a stream of LLM text chunks into speakable sentences/clauses.
+    feed() returns whatever is ready to synthesize; flush() returns the tail.
+    Fenced code blocks are dropped — nobody wants Kokoro reading Python aloud.
+    """
+
+    def __init__(self, min_chars: int = 24, max_chars: int = 220, first_clause: bool = True):
+        self.min_chars = min_chars
+        self.max_chars = max_chars
+        self.first_clause = first_clause  # allow an early clause cut for the first segment
+        self._buf = ""
+        self._in_code = False
+        self._ticks = ""  # trailing backticks held back in case a fence is split across chunks
+        self._emitted = 0
+
+    def _strip_code(self, text: str) -> str:
+        text = self._ticks + text
+        held = len(text) - len(text.rstrip("`"))
+        held %= 3
+        self._ticks = text[len(text) - held:] if held else ""
+        text = text[:len(text) - held]
+        out = []
+        parts = text.split("```")
+        for i, part in enumerate(parts):
+            if i > 0:
+                self._in_code = not self._in_code
+            if not self._in_code:
+                out.append(part)
+        return "".join(out)
+
+    def _clean(self, seg: str) -> str:
+        seg = _MARKDOWN.sub("", seg)
+        return " ".join(seg.split())
+
+    def _cut(self) -> str | None:
+        buf = self._buf
+        # Paragraph / list item breaks are natural pauses.
+        nl = buf.find("\n")
+        for m in _SENTENCE_END.finditer(buf, 0, nl + 1 if nl != -1 else len(buf)):
+            head = buf[:m.start() + 1].rstrip()
+            if _NOT_AN_END.search(head):
+                continue
+            if m.end() < self.min_chars:
+                continue
+            return buf[:m.end()]
+        if nl != -1:
+            return buf[:nl + 1]
+
+        limit = self.min_chars * 2 if (self.first_clause and self._emitted == 0) else self.max_chars
+        if len(buf) >= limit:
+            cut = None
+            for m in _CLAUSE_END.finditer(buf, 0, min(len(buf), self.max_chars)):
+                if m.end() >= self.min_chars:
+                    cut = m.end()
+            if cut is None and len(buf) >= self.max_chars:
+                sp = buf.rfind(" ", 0, self.max_chars)
+                cut = sp + 1 if sp > 0 else self.max_chars
+            if cut:
+                return buf[:cut]
+        return None
+
+    def feed(self, chunk: str) -> list[str]:
+        if not chunk:
+            return []
+        self._buf += self._strip_code(chunk)
+        ready = []
+        while True:
+            piece = self._cut()
+            if piece is None:
+                break
+            self._buf = self._buf[len(piece):]
+            seg = self._clean(piece)
+            if seg:
+                ready.append(seg)
+                self._emitted += 1
+        return ready
+
+    def flush(self) -> list[str]:
+        seg = self._clean(self._buf)
+        self._buf = ""
+        if seg:
+            self._emitted += 1
+            return [seg]
+        return []
+
+def segment_stream(chunks, **kwargs):
+    """Generator: LLM text chunks in, speakable segments out."""
+    seg = SentenceSegmenter(**kwargs)
+    for chunk in chunks:
+        for s in seg.feed(chunk):
+            yield s
+    for s in seg.flush():
+        yield s
@@ -1,25 +1,76 @@
-from RealtimeSTT import AudioToTextRecorder
+import os
 import logging
 import traceback
+import threading
+import queue
+import time
+import numpy as np
+
+from speculation import SPECULATE
+
+MIC_RATE = 16000   # what RealtimeSTT's VAD/whisper expect
+MIC_BLOCK = 512    # 32 ms
 
 class SpeechToTextService:
     """A service for real-time speech-to-text transcription."""
 
-    def __init__(self):
+    def __init__(self, full_duplex: bool | None = None, speculative: bool | None = None, standby: bool = False):
         logging.info("Initializing SpeechToTextService...")
 
         # Define the model and language settings first.
         self.model = "tiny.en"
         self.language = "en"
+        self.last_record_stop_at = None  # perf_counter() when VAD ended the last utterance
+        self.last_record_start_at = None
+        # NEW: full duplex = keep VAD/STT running while Elysia talks (barge-in). We own the mic
+        # then, so the TTS echo can be gated out before RealtimeSTT sees it.
+        if full_duplex is None:
+            full_duplex = os.getenv("ELYSIA_FULL_DUPLEX", "0") == "1"
+        self.full_duplex = full_duplex
+        self.on_speech_start = None  # callback(perf_counter) when the user starts talking
+        self.echo = None
+        # NEW: realtime partial transcripts (stabilized text) so the turn can start speculatively.
+        # Off by default (second whisper pass); ELYSIA_SPECULATE=1 turns it on.
+        if speculative is None:
+            speculative = SPECULATE
+        self.speculative = speculative
+        self.on_partial = None  # callback(text) with each stabilized partial transcript
+        # A standby (supervisor.py) must not open the capture device: on a bare ALSA device the
+        # second open fails or steals the stream. So it feeds the recorder from our own input
+        # stream, opened only when promoted (set_active). Full duplex always owns the mic.
+        self.own_mic = full_duplex or standby
+        self._mic_stream = None
 
         try:
+            # Deferred: RealtimeSTT pulls in torch/faster-whisper, so only pay for it when built.
+            from RealtimeSTT import AudioToTextRecorder
+
+            realtime = {}
+            if speculative:
+                realtime = dict(
+                    enable_realtime_transcription=True,
+                    realtime_model_type=self.model,
+                    realtime_processing_pause=0.2,
+                    on_realtime_transcription_stabilized=self._on_partial,
+                )
+
             # Now, use these attributes to initialize the recorder.
             self.recorder = AudioToTextRecorder(
                 model=self.model,
                 language=self.language,
                 early_transcription_on_silence=2000,
+                on_recording_start=self._on_record_start,
+                on_recording_stop=self._on_record_stop,
+                use_microphone=not self.own_mic,
+                **realtime,
             )
-            logging.info(f"SpeechToTextService initialized with model '{self.model}'.")
+            if self.own_mic:
+                self._start_feed()
+                if not standby:
+                    self._open_mic()
+            logging.info(f"SpeechToTextService initialized with model '{self.model}'"
+                         f"{' (full duplex)' if full_duplex else ''}"
+                         f"{' (realtime partials, ELYSIA_SPECULATE=1)' if speculative else ''}.")
 
         except Exception as e:
             logging.error(f"Failed to initialize AudioToTextRecorder: {e}")
@@ -29,10 +80,80 @@ class SpeechToTextService:
     def _on_wakeword(self):
         print("Wake word detected! Listening for your command...")
 
+    def _start_feed(self):
+        """Mic blocks -> (echo gate, full duplex only) -> recorder.feed_audio, on our own threads."""
+        self._mic = queue.Queue(maxsize=256)
+        if self.full_duplex:
+            from echo_suppressor import EchoSuppressor
+            self.echo = EchoSuppressor()
+            self._utterances = queue.Queue()
+
+        def _feed():
+            while True:
+                block, t = self._mic.get()
+                if self.echo is not None:
+                    block, _ = self.echo.process(block, t)
+                self.recorder.feed_audio((np.clip(block, -1.0, 1.0) * 32767).astype(np.int16), original_sample_rate=MIC_RATE)
+
+        def _listen():
+            # one transcription after another, for as long as the app runs
+            while True:
+                try:
+                    self._utterances.put(self.recorder.text())
+                except BaseException as e:
+                    self._utterances.put(e)
+                    return
+
+        threading.Thread(target=_feed, name="stt-feed", daemon=True).start()
+        if self.full_duplex:
+            threading.Thread(target=_listen, name="stt-listen", daemon=True).start()
+
+    def _open_mic(self):
+        if self._mic_stream is not None:
+            return
+        import sounddevice as sd
+
+        def _capture(indata, frames, time_info, status):
+            # audio thread: just hand the block over; gating + feeding happen on stt-feed
+            try:
+                self._mic.put_nowait((indata[:, 0].copy(), time.perf_counter()))
+            except queue.Full:
+                pass
+
+        self._mic_stream = sd.InputStream(samplerate=MIC_RATE, channels=1, dtype="float32",
+                                          blocksize=MIC_BLOCK, callback=_capture)
+        self._mic_stream.start()
+
+    def _close_mic(self):
+        stream, self._mic_stream = self._mic_stream, None
+        if stream is not None:
+            stream.stop()
+            stream.close()  # stop() alone keeps the device open
+
+    def set_active(self, active: bool):
+        """A standby process keeps the models loaded but stays off the microphone until promoted."""
+        if self.own_mic:
+            self._open_mic() if active else self._close_mic()
+            return
+        set_microphone = getattr(self.recorder, "set_microphone", None)
+        if set_microphone:
+            set_microphone(active)
+
     def _on_record_start(self):
+        self.last_record_start_at = time.perf_counter()
         print("Recording started...")
+        if self.on_speech_start:
+            self.on_speech_start(self.last_record_start_at)
+
+    def _on_partial(self, text: str):
+        if self.on_partial:
+            try:
+                self.on_partial(text)
+            except Exception as e:
+                logging.warning(f"Partial transcript callback failed: {e}")
 
     def _on_record_stop(self):
+        self.last_record_stop_at = time.perf_counter()
         print("Recording stopped.")
 
     def listen(self) -> str:
@@ -41,8 +162,14 @@ class SpeechToTextService:
         This is a blocking call.
         """
         print("Listening for wake word...")
-        # The text() method with no callback blocks until a transcription is complete.
-        transcription = self.recorder.text()
+        if self.full_duplex:
+            # the listener thread never stops; this is the next thing it heard
+            transcription = self._utterances.get()
+            if isinstance(transcription, BaseException):
+                raise transcription
+        else:
+            # The text() method with no callback blocks until a transcription is complete.
+            transcription = self.recorder.text()
         print(f"Transcription: '{transcription}'")
         return transcription
 
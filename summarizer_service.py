@@ -0,0 +1,142 @@
+# summarizer_service.py
+import os, re, time, logging, contextlib
+from collections import Counter, namedtuple
+
+from speech_segmenter import segment_stream
+
+SPOKEN_TAG = "SPOKEN:"
+_SPOKEN_LINE = re.compile(r'^\s*\**\s*SPOKEN\s*:\s*\**\s*(.+?)\s*$', re.IGNORECASE | re.MULTILINE)
+_WORD = re.compile(r"[a-z0-9][a-z0-9'_-]*")
+_STOP = set("""
+a an and are as at be been but by can could did do does for from had has have he her here him his how i if in
+into is it its just let me more most my no not now of on or our out so some than that the their them then there
+these they this to too up us was we were what when where which who why will with would you your yours i'm it's
+that's there's you're don't can't won't yes ok okay sure also very really
+""".split())
+
+Summary = namedtuple("Summary", "spoken text strategy elapsed")
+
+def _sentences(text: str) -> list[str]:
+    # Same cuts the TTS streamer uses: code blocks/markdown stripped, one speakable sentence each.
+    return list(segment_stream([text], min_chars=1, first_clause=False))
+
+class ExtractiveSummarizer:
+    """Scores sentences by content-word frequency + position and keeps the best, in order. No model call."""
+
+    def __init__(self, max_sentences: int = 2, max_chars: int = 300):
+        self.max_sentences = max_sentences
+        self.max_chars = max_chars
+
+    def summarize(self, text: str) -> str | None:
+        sents = [s for s in _sentences(text) if len(s) >= 12]
+        if not sents:
+            return None
+        if len(sents) <= self.max_sentences and sum(map(len, sents)) <= self.max_chars:
+            return " ".join(sents)
+
+        tokens = [[w for w in _WORD.findall(s.lower()) if w not in _STOP] for s in sents]
+        freq = Counter(w for ws in tokens for w in ws)
+        if not freq:
+            return sents[0][:self.max_chars]
+        top = freq.most_common(1)[0][1]
+
+        scored = []
+        for i, (s, ws) in enumerate(zip(sents, tokens)):
+            if not ws:
+                continue
+            score = sum(freq[w] / top for w in ws) / (len(ws) ** 0.5)
+            score *= 1.0 + 0.5 / (1 + i)          # answers tend to lead with the point
+            if len(s) > self.max_chars:
+                score *= 0.5                       # too long to say in one breath
+            if s.endswith("?"):
+                score *= 0.7
+            scored.append((score, i))
+
+        picked, used = [], 0
+        for score, i in sorted(scored, reverse=True):
+            if len(picked) >= self.max_sentences:
+                break
+            if picked and used + len(sents[i]) > self.max_chars:
+                continue
+            picked.append(i)
+            used += len(sents[i])
+        if not picked:
+            return None
+        out = " ".join(sents[i] for i in sorted(picked))
+        return out if len(out) <= self.max_chars else out[:self.max_chars].rsplit(" ", 1)[0] + "..."
+
+class SpokenSummarizer:
+    """
+    Picks what to say out loud for a long response. Strategies, cheapest first:
+      tagged     - the main chain was asked to emit a "SPOKEN: ..." line; use it (no extra call)
+      extractive - local sentence scoring over the response (no model call)
+      llm        - the original second LLM pass
+    Each falls back to the next one down; "truncate" is the last resort.
+    """
+
+    MODES = ("tagged", "extractive", "llm")
+
+    def __init__(self, llm_service=None, mode: str | None = None, max_sentences: int = 2, max_chars: int = 300,
+                 slot=None):
+        self.llm = llm_service
+        self.slot = slot  # slot() -> context manager held around the model call (the LLM scheduler)
+        self.mode = (mode or os.getenv("ELYSIA_SUMMARY_MODE", "extractive")).lower()
+        if self.mode not in self.MODES:
+            logging.warning(f"Unknown summary mode '{self.mode}'; using 'extractive'.")
+            self.mode = "extractive"
+        self.max_chars = max_chars
+        self.extractive = ExtractiveSummarizer(max_sentences=max_sentences, max_chars=max_chars)
+
+    def persona_note(self) -> str:
+        """Extra system-prompt line for tagged mode (empty otherwise)."""
+        if self.mode != "tagged":
+            return ""
+        return (f"End every answer with one final line starting with '{SPOKEN_TAG}' that says the gist "
+                "in 1-2 short plain sentences suitable for speech.")
+
+    @staticmethod
+    def split_tagged(text: str) -> tuple[str | None, str]:
+        """Returns (spoken line or None, text with the SPOKEN line removed)."""
+        matches = list(_SPOKEN_LINE.finditer(text))
+        if not matches:
+            return None, text
+        m = matches[-1]
+        spoken = m.group(1).strip().strip("*").strip()
+        cleaned = (text[:m.start()] + text[m.end():]).strip()
+        return spoken or None, cleaned
+
+    def _llm_summary(self, text: str) -> str | None:
+        if self.llm is None:
+            return None
+        try:
+            with self.slot() if self.slot else contextlib.nullcontext():
+                return self.llm.prompt(
+                    "Summarize succinctly in 1-2 sentences for speech:\n\n" + text,
+                    system="Be direct, no fluff."
+                )
+        except Exception as e:
+            logging.error(f"Summary failed: {e}")
+            return None
+
+    def summarize(self, full_response: str) -> Summary:
+        t0 = time.perf_counter()
+        spoken, text = self.split_tagged(full_response)
+        strategy = "tagged"
+        order = self.MODES[self.MODES.index(self.mode):]
+
+        if spoken is None or "tagged" not in order:
+            spoken = None
+            for strategy in order:
+                if strategy == "extractive":
+                    spoken = self.extractive.summarize(text)
+                elif strategy == "llm":
+                    spoken = self._llm_summary(text)
+                if spoken:
+                    break
+        if not spoken:
+            strategy = "truncate"
+            spoken = (text[:150] + "...") if len(text) > 150 else text
+
+        elapsed = time.perf_counter() - t0
+        logging.info(f"Spoken summary: strategy={strategy} took={elapsed*1000:.1f}ms chars={len(spoken)}")
+        return Summary(spoken, text, strategy, elapsed)
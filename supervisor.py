@@ -0,0 +1,252 @@
+# supervisor.py
+"""
+Keeps Elysia up without a cold start per crash. Runs one active worker plus one standby
+worker: a full ConversationalAI(standby=True) with Whisper, Kokoro, the embedder and the LLM
+loaded and warmed, but off the mic/ports and the Chroma store until promoted. When the active worker dies the
+standby is promoted at once and a new standby is built in the background.
+
+- crash report handoff: the dead worker's crash_info.txt (or, if it died too hard to write
+  one, its exit code + the tail of elysia.log) is ingested by the promoted worker via
+  add_system_memory, as before
+- restart backoff: replacements after consecutive crashes wait base * 2^(n-1) (capped)
+- crash-loop detection: CRASH_LOOP_MAX crashes within CRASH_LOOP_WINDOW_S -> give up
+- failover time (death seen -> promoted worker live) goes to the log and supervisor_events.ndjson
+
+Run: python supervisor.py   (watchdog.sh now just starts this)
+"""
+import os, sys, json, time, signal, logging, multiprocessing as mp
+from collections import deque
+from multiprocessing.connection import wait
+
+STANDBY = os.getenv("ELYSIA_STANDBY", "1") == "1"        # 0: no warm spare, plain restarts
+STANDBY_DELAY_S = float(os.getenv("ELYSIA_STANDBY_DELAY_S", "5"))  # let the active worker boot first
+READY_TIMEOUT_S = float(os.getenv("ELYSIA_READY_TIMEOUT_S", "300"))
+BACKOFF_BASE_S = float(os.getenv("ELYSIA_BACKOFF_BASE_S", "2"))
+BACKOFF_MAX_S = float(os.getenv("ELYSIA_BACKOFF_MAX_S", "60"))
+STABLE_S = float(os.getenv("ELYSIA_STABLE_S", "120"))     # up this long -> crash streak resets
+CRASH_LOOP_MAX = int(os.getenv("ELYSIA_CRASH_LOOP_MAX", "5"))
+CRASH_LOOP_WINDOW_S = float(os.getenv("ELYSIA_CRASH_LOOP_WINDOW_S", "300"))
+EVENTS_PATH = "supervisor_events.ndjson"
+CRASH_PATH = "crash_info.txt"
+
+def _worker(conn):
+    """Worker process: build everything, report ready, block until promoted, then serve."""
+    # SIGINT may arrive ignored (started in the background / nohup); the supervisor relies on
+    # it for a clean stop. Service managers SIGTERM the whole group: treat that like Ctrl+C too.
+    signal.signal(signal.SIGINT, signal.default_int_handler)
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    import main_app  # heavy imports happen here, in the child
+    app = main_app.ConversationalAI(standby=True)
+    conn.send({"event": "ready", "startup": app.startup_report})
+    try:
+        msg = conn.recv()
+    except (EOFError, KeyboardInterrupt):
+        return  # supervisor went away / shutdown before we were needed
+    if msg.get("cmd") != "promote":
+        return
+    failover_ms = app.activate(died_at=msg.get("died_at"))
+    conn.send({"event": "active", "failover_ms": failover_ms})
+    sys.exit(0 if app.run() else 1)
+
+class _Worker:
+    def __init__(self, ctx, n: int):
+        self.n = n
+        self.conn, child = ctx.Pipe()
+        self.proc = ctx.Process(target=_worker, args=(child,), name=f"elysia-worker-{n}")
+        self.proc.start()
+        child.close()
+        self.started = time.time()
+        self.ready = False
+        self.promoted_at = None
+
+    def __repr__(self):
+        return f"worker-{self.n}(pid {self.proc.pid})"
+
+    def poll(self):
+        """Drains messages; returns the list received."""
+        got = []
+        try:
+            while self.conn.poll():
+                got.append(self.conn.recv())
+        except (EOFError, OSError):
+            pass
+        for msg in got:
+            if msg.get("event") == "ready":
+                self.ready = True
+        return got
+
+    def stop(self, timeout: float = 10.0):
+        if self.proc.is_alive():
+            self.proc.terminate()
+            self.proc.join(timeout)
+            if self.proc.is_alive():
+                self.proc.kill()
+                self.proc.join()
+
+class Supervisor:
+    def __init__(self, standby: bool = STANDBY):
+        self.use_standby = standby
+        self._ctx = mp.get_context("spawn")  # children must not inherit our (empty) state via fork
+        self._n = 0
+        self.active = None
+        self.standby = None
+        self._spawn_standby_at = None
+        self._crashes = deque()    # time.time() of recent crashes
+        self._streak = 0           # consecutive crashes without a stable run in between
+        self._stopping = False
+        self._gave_up = False
+
+    def _event(self, kind: str, **fields):
+        rec = {"ts": time.time(), "event": kind, **fields}
+        logging.info(f"Supervisor: {kind} {json.dumps(fields)}")
+        try:
+            with open(EVENTS_PATH, "a", encoding="utf-8") as f:
+                f.write(json.dumps(rec) + "\n")
+        except OSError as e:
+            logging.warning(f"Could not write {EVENTS_PATH}: {e}")
+
+    def _spawn(self) -> _Worker:
+        self._n += 1
+        w = _Worker(self._ctx, self._n)
+        self._event("spawned", worker=repr(w))
+        return w
+
+    def _backoff(self) -> float:
+        return 0.0 if self._streak == 0 else min(BACKOFF_MAX_S, BACKOFF_BASE_S * 2 ** (self._streak - 1))
+
+    def _wait_ready(self, w: _Worker) -> bool:
+        deadline = time.time() + READY_TIMEOUT_S
+        while not w.ready and w.proc.is_alive() and time.time() < deadline:
+            wait([w.conn, w.proc.sentinel], timeout=1.0)
+            w.poll()
+        return w.ready
+
+    def _promote(self, w: _Worker, died_at: float | None):
+        w.conn.send({"cmd": "promote", "died_at": died_at})
+        w.promoted_at = time.time()
+        self.active = w
+        # the worker answers once it's live; failover is measured up to that point
+        wait([w.conn, w.proc.sentinel], timeout=30.0)
+        for msg in w.poll():
+            if msg.get("event") == "active":
+                self._event("promoted", worker=repr(w), failover_ms=msg.get("failover_ms"),
+                            after_crash=died_at is not None)
+
+    def _crash_report(self, w: _Worker, code: int | None):
+        """A worker that crashed cleanly wrote crash_info.txt; write one for those that couldn't."""
+        if os.path.exists(CRASH_PATH):
+            return
+        tail = ""
+        try:
+            with open("elysia.log", encoding="utf-8", errors="replace") as f:
+                tail = "".join(deque(f, maxlen=40))
+        except OSError:
+            pass
+        sig = f" (signal {signal.Signals(-code).name})" if code is not None and code < 0 else ""
+        with open(CRASH_PATH, "w", encoding="utf-8") as f:
+            f.write(f"{w!r} exited with code {code}{sig} without a crash report.\n"
+                    f"--- last lines of elysia.log ---\n{tail}")
+
+    def _on_crash(self, w: _Worker, code: int | None, role: str) -> bool:
+        """Books a crash. False if that makes it a crash loop (supervisor gives up)."""
+        now = time.time()
+        if w.promoted_at and now - w.promoted_at >= STABLE_S:
+            self._streak = 0
+        self._streak += 1
+        self._crashes.append(now)
+        while self._crashes and now - self._crashes[0] > CRASH_LOOP_WINDOW_S:
+            self._crashes.popleft()
+        self._event("crash", worker=repr(w), role=role, exit_code=code, streak=self._streak,
+                    recent=len(self._crashes))
+        if len(self._crashes) >= CRASH_LOOP_MAX:
+            self._event("crash_loop", crashes=len(self._crashes), window_s=CRASH_LOOP_WINDOW_S)
+            self._gave_up = True
+            return False
+        return True
+
+    def run(self) -> int:
+        signal.signal(signal.SIGTERM, lambda *_: self._shutdown_signal())
+        first = self._spawn()
+        if not self._wait_ready(first):
+            self._event("startup_failed", worker=repr(first), exit_code=first.proc.exitcode)
+            first.stop()
+            return 1
+        self._promote(first, died_at=None)
+        if self.use_standby:
+            self._spawn_standby_at = time.time() + STANDBY_DELAY_S
+
+        try:
+            while not self._stopping:
+                if self.use_standby and self.standby is None and self._spawn_standby_at is not None \
+                        and time.time() >= self._spawn_standby_at:
+                    self.standby = self._spawn()
+                    self._spawn_standby_at = None
+                watch = [self.active.proc.sentinel]
+                if self.standby is not None:
+                    watch += [self.standby.conn, self.standby.proc.sentinel]
+                wait(watch, timeout=1.0)
+                if self._stopping:
+                    break
+                if self.standby is not None:
+                    self.standby.poll()
+
+                # standby died while waiting (e.g. init failure): rebuild it after a backoff
+                if self.standby is not None and not self.standby.proc.is_alive():
+                    dead, self.standby = self.standby, None
+                    if not self._on_crash(dead, dead.proc.exitcode, "standby"):
+                        break
+                    self._spawn_standby_at = time.time() + max(self._backoff(), STANDBY_DELAY_S)
+
+                if self.active.proc.is_alive():
+                    continue
+                died_at = time.time()
+                dead = self.active
+                dead.proc.join()
+                code = dead.proc.exitcode
+                if code == 0:
+                    self._event("shutdown", worker=repr(dead))
+                    return 0
+                self._crash_report(dead, code)
+                if not self._on_crash(dead, code, "active"):
+                    break
+                nxt = self.standby
+                self.standby = None
+                if nxt is None or not nxt.proc.is_alive():
+                    # no warm spare (disabled or still dying/booting): cold start after a backoff
+                    time.sleep(self._backoff())
+                    nxt = nxt if nxt is not None and nxt.proc.is_alive() else self._spawn()
+                if not self._wait_ready(nxt):
+                    nxt.stop()
+                    self._event("startup_failed", worker=repr(nxt), exit_code=nxt.proc.exitcode)
+                    self.active = nxt  # dead: the next pass books the crash and retries
+                    continue
+                self._promote(nxt, died_at=died_at)
+                if self.use_standby:
+                    self._spawn_standby_at = time.time() + max(self._backoff(), STANDBY_DELAY_S)
+        except KeyboardInterrupt:
+            # Ctrl+C reaches the whole process group: the active worker says goodbye and exits
+            self._event("interrupted")
+            if self.active is not None:
+                self.active.proc.join(15)
+                self.active.stop()
+                self.active = None
+        finally:
+            if self.active is not None and self.active.proc.is_alive():
+                # same path as Ctrl+C in the worker: goodbye, memory flush, clean exit
+                os.kill(self.active.proc.pid, signal.SIGINT)
+            if self.standby is not None:
+                self.standby.stop()
+            if self.active is not None:
+                self.active.proc.join(15)
+                self.active.stop()
+        return 2 if self._gave_up else 0
+
+    def _shutdown_signal(self):
+        self._stopping = True
+        self._event("terminated")
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - supervisor - %(levelname)s - %(message)s",
+                        handlers=[logging.FileHandler("supervisor.log", mode="a", encoding="utf-8"),
+                                  logging.StreamHandler()])
+    sys.exit(Supervisor().run())
@@ -0,0 +1,173 @@
+# tool_cache.py
+import os, json, time, atexit, hashlib, inspect, logging, threading, functools
+from collections import OrderedDict, defaultdict
+
+# "" = memory only. Kept in its own dir, which project_index skips: it holds read_file copies.
+TOOL_CACHE_PATH = os.getenv("ELYSIA_TOOL_CACHE_PATH", "./tool_cache/tool_cache.json")
+TOOL_CACHE_ENTRIES = int(os.getenv("ELYSIA_TOOL_CACHE_ENTRIES", "256"))
+TOOL_CACHE_CHARS = int(os.getenv("ELYSIA_TOOL_CACHE_CHARS", str(4 * 1024 * 1024)))
+GEMINI_CACHE_TTL = float(os.getenv("ELYSIA_GEMINI_CACHE_TTL", "3600"))
+SAVE_DELAY = 2.0  # coalesce saves after a burst of puts
+
+def _file_stamp(path: str):
+    try:
+        st = os.stat(path)
+        return [st.st_mtime_ns, st.st_size]
+    except OSError:
+        return None
+
+class ToolCache:
+    """
+    Memoized tool results, LRU-bounded by entry count and total characters.
+    An entry can depend on a file (valid while its (mtime, size) stamp matches) and/or expire
+    after a TTL. Persisted as JSON so gemini_cli answers survive restarts; file-backed entries
+    are re-validated against the disk on every hit, so stale ones can't come back.
+    """
+
+    def __init__(self, path: str = TOOL_CACHE_PATH, max_entries: int = TOOL_CACHE_ENTRIES,
+                 max_chars: int = TOOL_CACHE_CHARS):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_chars = max_chars
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> {"tool", "value", "file", "stamp", "expires"}
+        self._chars = 0
+        self._hits = defaultdict(int)
+        self._misses = defaultdict(int)
+        self._save_timer = None
+        self._load()
+        atexit.register(self.save)
+
+    @staticmethod
+    def key(tool: str, args: dict) -> str:
+        blob = json.dumps([tool, args], sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha1(blob.encode("utf-8")).hexdigest()
+
+    def get(self, tool: str, key: str):
+        """Returns (hit, value)."""
+        with self._lock:
+            e = self._entries.get(key)
+            if e is not None:
+                stale = (e["expires"] is not None and time.time() >= e["expires"]) or \
+                        (e["file"] is not None and _file_stamp(e["file"]) != e["stamp"])
+                if stale:
+                    self._remove(key)
+                else:
+                    self._entries.move_to_end(key)
+                    self._hits[tool] += 1
+                    return True, e["value"]
+            self._misses[tool] += 1
+            return False, None
+
+    def put(self, tool: str, key: str, value: str, file: str | None = None, stamp=None, ttl: float | None = None):
+        """stamp is the file's (mtime, size) taken *before* the tool read it."""
+        if file and stamp is None:
+            return  # nothing on disk to validate against
+        if len(value) > self.max_chars // 4:
+            return  # one result shouldn't flush the rest
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = {"tool": tool, "value": value, "file": file, "stamp": stamp,
+                                  "expires": time.time() + ttl if ttl else None}
+            self._chars += len(value)
+            while self._entries and (len(self._entries) > self.max_entries or self._chars > self.max_chars):
+                self._remove(next(iter(self._entries)))
+        self._schedule_save()
+
+    def invalidate_path(self, path: str) -> int:
+        """Drops every entry that depends on path (called after write_file/append_file)."""
+        path = os.path.abspath(path)
+        with self._lock:
+            keys = [k for k, e in self._entries.items() if e["file"] == path]
+            for k in keys:
+                self._remove(k)
+        if keys:
+            self._schedule_save()
+        return len(keys)
+
+    def _remove(self, key: str):
+        e = self._entries.pop(key, None)
+        if e is not None:
+            self._chars -= len(e["value"])
+
+    def stats(self) -> dict:
+        with self._lock:
+            tools = sorted(set(self._hits) | set(self._misses))
+            return {"entries": len(self._entries), "chars": self._chars,
+                    "tools": {t: {"hits": self._hits[t], "misses": self._misses[t]} for t in tools}}
+
+    # --- persistence ---
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            now = time.time()
+            for key, e in data.get("entries", []):
+                if e["expires"] is not None and e["expires"] <= now:
+                    continue
+                self._entries[key] = e
+                self._chars += len(e["value"])
+            logging.info(f"Tool cache: loaded {len(self._entries)} entries from {self.path}")
+        except Exception as e:
+            logging.warning(f"Tool cache at {self.path} unreadable, starting empty: {e}")
+            self._entries.clear()
+            self._chars = 0
+
+    def _schedule_save(self):
+        if not self.path:
+            return
+        with self._lock:
+            if self._save_timer is not None:
+                return
+            self._save_timer = threading.Timer(SAVE_DELAY, self.save)
+            self._save_timer.daemon = True
+            self._save_timer.start()
+
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            self._save_timer = None
+            data = {"saved_at": time.time(), "entries": list(self._entries.items())}
+        tmp = self.path + ".tmp"
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp, self.path)
+        except Exception as e:
+            logging.warning(f"Tool cache save failed: {e}")
+
+TOOL_CACHE = ToolCache()  # process-wide
+
+def memoized(tool: str, path_arg: str | None = None, ttl: float | None = None):
+    """
+    Decorator for ElysiaTools methods: serve repeated calls from TOOL_CACHE.
+    path_arg names the argument holding a file path the result depends on (validated by
+    mtime+size); ttl expires the entry. Tool error strings ("[... error ...]") aren't kept.
+    """
+    def deco(fn):
+        sig = inspect.signature(fn)
+
+        @functools.wraps(fn)
+        def wrapper(self, *args, **kwargs):
+            bound = sig.bind(self, *args, **kwargs)
+            bound.apply_defaults()
+            call = {k: v for k, v in bound.arguments.items() if k != "self"}
+            file = stamp = None
+            if path_arg:
+                file = call[path_arg] = os.path.abspath(os.path.expanduser(call[path_arg]))
+                stamp = _file_stamp(file)
+            key = TOOL_CACHE.key(tool, call)
+            hit, value = TOOL_CACHE.get(tool, key)
+            if hit:
+                return value
+            value = fn(self, *args, **kwargs)
+            if isinstance(value, str) and not (value.startswith("[") and "error" in value[:40].lower()):
+                TOOL_CACHE.put(tool, key, value, file=file, stamp=stamp, ttl=ttl)
+            return value
+        return wrapper
+    return deco
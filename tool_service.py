@@ -1,9 +1,12 @@
 # tool_service.py
-import os, io, shlex, subprocess, contextlib, traceback, time, json
+import os, mmap, shlex, subprocess, time, json
 import llm  # needed for Toolbox base
+from tracing import traced
+from python_workers import get_pool
+from tool_cache import TOOL_CACHE, GEMINI_CACHE_TTL, memoized
+from project_index import get_index
 
 PROJECT_ROOT = os.path.abspath(os.getcwd())
-MAX_READ_BYTES = 5 * 1024 * 1024  # 5MB cap per read
 MAX_ECHO_CHARS = 10000            # cap what we return to model
 GEMINI_DEFAULT_MODEL = "gemini-2.5-pro"
 
@@ -14,28 +17,81 @@ def _safe_path(p: str) -> str:
         raise ValueError("Path outside project root not allowed")
     return p
 
+def _skip_lines(mm, pos: int, n: int) -> int:
+    """Offset just past the n-th newline at/after pos (len(mm) if the file ends first)."""
+    for _ in range(n):
+        nl = mm.find(b"\n", pos)
+        if nl < 0:
+            return len(mm)
+        pos = nl + 1
+    return pos
+
+def _read_window(fp: str, start_line: int = 0, end_line: int = 0, byte_offset: int = 0, byte_count: int = 0) -> str:
+    """
+    Slice of a file through mmap, so only the requested window is ever copied out.
+    Lines are 1-based and inclusive; a negative start_line counts back from the end (tail).
+    """
+    size = os.path.getsize(fp)
+    if size == 0:
+        return ""
+    with open(fp, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        if start_line < 0:
+            lo = size - 1 if mm[size - 1:size] == b"\n" else size  # ignore the final newline
+            for _ in range(-start_line):
+                lo = mm.rfind(b"\n", 0, lo)
+                if lo < 0:
+                    break
+            lo, hi = lo + 1, size
+        elif start_line or end_line:
+            start_line = max(1, start_line)
+            lo = _skip_lines(mm, 0, start_line - 1)
+            hi = _skip_lines(mm, lo, end_line - start_line + 1) if end_line >= start_line else size
+        else:
+            lo = min(max(0, byte_offset), size)
+            hi = min(size, lo + byte_count) if byte_count > 0 else size
+        # a UTF-8 char is at most 4 bytes: never copy more than the reply can hold
+        stop = min(hi, lo + 4 * MAX_ECHO_CHARS)
+        text = mm[lo:stop].decode("utf-8", errors="ignore")
+    if len(text) > MAX_ECHO_CHARS or stop < hi:
+        text = text[:MAX_ECHO_CHARS]
+        cont = lo + len(text.encode("utf-8"))
+        return text + f"\n[Content truncated at byte {cont} of {size}; read on with byte_offset={cont}]"
+    return text
+
 class ElysiaTools(llm.Toolbox):
     """
     Multi-tool box available to the model via LLM tool calling.
     Methods are tools. Keep docstrings tight—they become tool docs.
     """
 
-    def read_file(self, path: str) -> str:
-        """Read a UTF-8 text file from disk and return its content (truncated if huge)."""
+    def __init__(self, python_session: str = "elysia"):
+        # execute_python(keep_state=True) worker; one per conversation (turn_engine sessions)
+        self._python_session = python_session
+
+    @traced("tool.read_file")
+    @memoized("read_file", path_arg="path")  # valid while the file's mtime+size are unchanged
+    def read_file(self, path: str, start_line: int = 0, end_line: int = 0, byte_offset: int = 0, byte_count: int = 0) -> str:
+        """Read a UTF-8 text file, whole or a range: start_line/end_line (1-based; start_line=-50 = last 50 lines) or byte_offset/byte_count. Long output is truncated with the offset to continue from."""
         fp = _safe_path(path)
         if not os.path.exists(fp):
             return "[Error: file not found]"
-        if os.path.getsize(fp) > MAX_READ_BYTES:
-            return "[Error: file too large]"
         try:
-            with open(fp, "r", encoding="utf-8", errors="ignore") as f:
-                data = f.read()
-            if len(data) > MAX_ECHO_CHARS:
-                return data[:MAX_ECHO_CHARS] + "\n[Content truncated]"
-            return data
+            return _read_window(fp, start_line, end_line, byte_offset, byte_count)
         except Exception as e:
             return f"[Error reading file: {e}]"
 
+    @traced("tool.search_project")
+    def search_project(self, query: str, max_results: int = 20) -> str:
+        """Search text files under the project (code, notes, logs) for words/identifiers; returns ranked `path:line: text` hits. Follow up with read_file(start_line=...)."""
+        try:
+            hits = get_index(PROJECT_ROOT).search(query, max_results=max(1, min(int(max_results), 100)))
+        except Exception as e:
+            return f"[Search error] {e}"
+        if not hits:
+            return "[No matches]"
+        return "\n".join(f"{p}:{ln}: {text[:200]}" for p, ln, text, _ in hits)
+
+    @traced("tool.write_file")
     def write_file(self, path: str, content: str) -> str:
         """Create or overwrite a UTF-8 text file with provided content. Backs up existing as .bak."""
         fp = _safe_path(path)
@@ -48,39 +104,39 @@ class ElysiaTools(llm.Toolbox):
                     import shutil; shutil.copy(fp, bk)
             with open(fp, "w", encoding="utf-8") as f:
                 f.write(content)
+            TOOL_CACHE.invalidate_path(fp)
             return f"[Wrote {len(content)} chars to {fp}]"
         except Exception as e:
             return f"[Error writing file: {e}]"
 
+    @traced("tool.append_file")
     def append_file(self, path: str, content: str) -> str:
         """Append text to a UTF-8 file, creating it if missing."""
         fp = _safe_path(path)
         try:
             with open(fp, "a", encoding="utf-8") as f:
                 f.write(content)
+            TOOL_CACHE.invalidate_path(fp)
             return f"[Appended {len(content)} chars to {fp}]"
         except Exception as e:
             return f"[Error appending file: {e}]"
 
-    def execute_python(self, code: str) -> str:
-        """Execute Python code in-process; return stdout or error traceback. Use `result = ...` to return values."""
-        try:
-            buf = io.StringIO()
-            ns = {}
-            with contextlib.redirect_stdout(buf):
-                try:
-                    exec(code, ns)
-                except Exception:
-                    return "[Error during execution]\n" + traceback.format_exc()
-            out = buf.getvalue()
-            if (not out.strip()) and ("result" in ns):
-                out = str(ns["result"])
-            if not out.strip():
-                out = "[Executed successfully with no output]"
-            return out[:MAX_ECHO_CHARS] + ("..." if len(out) > MAX_ECHO_CHARS else "")
-        except Exception:
-            return "[Error: execution failed]\n" + traceback.format_exc()
+    @traced("tool.execute_python")
+    def execute_python(self, code: str, keep_state: bool = False) -> str:
+        """Execute Python code in a separate worker process (timeout + CPU/memory limits); return stdout or error traceback. Use `result = ...` to return values. keep_state=True keeps variables between keep_state calls."""
+        # Out of process: a runaway loop or huge allocation kills a worker, not the voice loop.
+        r = get_pool().run(code, session=self._python_session if keep_state else None)
+        out = r.output
+        if r.error:
+            err = r.error if r.error.startswith("[Error") else "[Error during execution]\n" + r.error
+            return (out[-2000:] + "\n" if out.strip() else "") + err
+        if (not out.strip()) and r.result is not None:
+            out = r.result
+        if not out.strip():
+            out = "[Executed successfully with no output]"
+        return out + ("..." if r.truncated else "")
 
+    @traced("tool.execute_shell")
     def execute_shell(self, command: str) -> str:
         """Run a shell command with a short timeout; return stdout or stderr."""
         try:
@@ -98,6 +154,8 @@ class ElysiaTools(llm.Toolbox):
         except Exception as e:
             return f"[Shell error] {e}"
 
+    @traced("tool.gemini_cli")
+    @memoized("gemini_cli", ttl=GEMINI_CACHE_TTL)
     def gemini_cli(self, prompt: str, model: str = GEMINI_DEFAULT_MODEL) -> str:
         """Delegate to GeminiCLI for complex drafting or function creation. Requires GEMINI_API_KEY and `gemini` on PATH."""
         if not os.getenv("GEMINI_API_KEY"):
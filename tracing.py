@@ -0,0 +1,181 @@
+# tracing.py
+import os, json, time, uuid, logging, threading, functools, contextlib
+from collections import defaultdict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+TRACE_DIR = os.getenv("ELYSIA_TRACE_DIR", "./traces")
+METRICS_PORT = int(os.getenv("ELYSIA_METRICS_PORT", "0"))  # 0 = no Prometheus endpoint
+WINDOW = 200  # rolling samples per stage for p50/p95
+
+def _pct(sorted_vals, q):
+    return sorted_vals[min(len(sorted_vals) - 1, int(round(q * (len(sorted_vals) - 1))))]
+
+class Tracer:
+    """
+    Lightweight per-turn spans. One turn is open at a time (the voice loop); spans recorded
+    from any thread attach to it, except inside untraced() (text sessions). end_turn()
+    appends the turn's spans as NDJSON records (one per span, same turn_id) and folds
+    durations into rolling p50/p95 per stage.
+    """
+
+    def __init__(self, trace_dir: str = TRACE_DIR, window: int = WINDOW):
+        self.trace_dir = trace_dir
+        self._lock = threading.Lock()
+        self._turn_id = None
+        self._turn_start = None
+        self._spans = []
+        self._window = defaultdict(lambda: deque(maxlen=window))
+        self._counts = defaultdict(int)
+        self._sums = defaultdict(float)
+        self._collectors = []  # extra /metrics lines, see add_collector()
+        self._server = None
+        self._local = threading.local()  # .off: this thread's work belongs to no voice turn
+
+    @property
+    def turn_id(self) -> str | None:
+        return self._turn_id
+
+    def begin_turn(self, turn_id: str | None = None, started_at: float | None = None) -> str:
+        with self._lock:
+            self._turn_id = turn_id or str(uuid.uuid4())
+            self._turn_start = started_at if started_at is not None else time.perf_counter()
+            self._spans = []
+        return self._turn_id
+
+    def record(self, stage: str, start: float, end: float, **attrs):
+        """Adds a span measured elsewhere (perf_counter() start/end)."""
+        if start is None or end is None or getattr(self._local, "off", False):
+            return
+        with self._lock:
+            if self._turn_id is None:
+                return
+            self._spans.append({"stage": stage, "start": start, "end": end, **attrs})
+
+    @contextlib.contextmanager
+    def untraced(self):
+        """Drops spans recorded on this thread meanwhile, e.g. tool calls of a text session."""
+        prev = getattr(self._local, "off", False)
+        self._local.off = True
+        try:
+            yield
+        finally:
+            self._local.off = prev
+
+    @contextlib.contextmanager
+    def span(self, stage: str, **attrs):
+        t0 = time.perf_counter()
+        err = None
+        try:
+            yield attrs  # callers may add attributes while the span is open
+        except BaseException as e:
+            err = type(e).__name__
+            raise
+        finally:
+            if err:
+                attrs["error"] = err
+            self.record(stage, t0, time.perf_counter(), **attrs)
+
+    def end_turn(self) -> dict | None:
+        """Exports the open turn, updates rolling stats, returns the current summary()."""
+        with self._lock:
+            if self._turn_id is None:
+                return None
+            turn_id, t0, spans = self._turn_id, self._turn_start, self._spans
+            self._turn_id, self._spans = None, []
+            spans.append({"stage": "turn", "start": t0, "end": time.perf_counter()})
+            for sp in spans:
+                d = sp["end"] - sp["start"]
+                self._window[sp["stage"]].append(d)
+                self._counts[sp["stage"]] += 1
+                self._sums[sp["stage"]] += d
+        self._export(turn_id, t0, spans)
+        return self.summary()
+
+    def _export(self, turn_id: str, t0: float, spans: list[dict]):
+        wall = time.time() - (time.perf_counter() - t0)  # wall-clock at turn start
+        lines = []
+        for sp in spans:
+            rec = {k: v for k, v in sp.items() if k not in ("start", "end")}
+            rec.update(turn_id=turn_id, offset_ms=round((sp["start"] - t0) * 1000, 2),
+                       duration_ms=round((sp["end"] - sp["start"]) * 1000, 2),
+                       ts=round(wall + (sp["start"] - t0), 3))
+            lines.append(json.dumps(rec, ensure_ascii=False) + "\n")
+        try:
+            os.makedirs(self.trace_dir, exist_ok=True)
+            path = os.path.join(self.trace_dir, time.strftime("%Y-%m-%d") + ".ndjson")
+            with open(path, "a", encoding="utf-8") as f:
+                f.writelines(lines)
+        except Exception as e:
+            logging.warning(f"Trace export failed: {e}")
+
+    def summary(self) -> dict:
+        """{stage: {"p50_ms", "p95_ms", "n"}} over the rolling window."""
+        with self._lock:
+            out = {}
+            for stage, vals in self._window.items():
+                if not vals:
+                    continue
+                v = sorted(vals)
+                out[stage] = {"p50_ms": round(_pct(v, 0.5) * 1000, 1),
+                              "p95_ms": round(_pct(v, 0.95) * 1000, 1), "n": len(v)}
+            return out
+
+    def prometheus_text(self) -> str:
+        lines = ["# HELP elysia_stage_latency_seconds Per-stage turn latency (rolling window).",
+                 "# TYPE elysia_stage_latency_seconds summary"]
+        with self._lock:
+            for stage, vals in sorted(self._window.items()):
+                if not vals:
+                    continue
+                v = sorted(vals)
+                for q in (0.5, 0.95):
+                    lines.append(f'elysia_stage_latency_seconds{{stage="{stage}",quantile="{q}"}} {_pct(v, q):.6f}')
+                lines.append(f'elysia_stage_latency_seconds_sum{{stage="{stage}"}} {self._sums[stage]:.6f}')
+                lines.append(f'elysia_stage_latency_seconds_count{{stage="{stage}"}} {self._counts[stage]}')
+        for fn in list(self._collectors):
+            try:
+                lines += fn()
+            except Exception as e:
+                logging.warning(f"Metrics collector failed: {e}")
+        return "\n".join(lines) + "\n"
+
+    def add_collector(self, fn):
+        """fn() -> list of Prometheus text lines (HELP/TYPE included) appended to /metrics."""
+        self._collectors.append(fn)
+
+    def serve_prometheus(self, port: int = METRICS_PORT, host: str = "127.0.0.1"):
+        """Optional local /metrics endpoint (Prometheus text format)."""
+        if not port or self._server is not None:
+            return
+        tracer = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = tracer.prometheus_text().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), _Handler)
+        threading.Thread(target=self._server.serve_forever, name="metrics-http", daemon=True).start()
+        logging.info(f"Prometheus metrics on http://{host}:{port}/metrics")
+
+def traced(stage: str):
+    """Decorator: run the function inside TRACER.span(stage). Keeps the signature/docstring."""
+    def deco(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with TRACER.span(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return deco
+
+TRACER = Tracer()  # process-wide
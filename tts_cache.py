@@ -0,0 +1,115 @@
+# tts_cache.py
+import os, json, hashlib, logging, threading
+from collections import OrderedDict
+import numpy as np
+
+TTS_CACHE_DIR = os.getenv("ELYSIA_TTS_CACHE_DIR", "./tts_cache")
+TTS_CACHE_BYTES = int(os.getenv("ELYSIA_TTS_CACHE_BYTES", str(256 * 1024 * 1024)))  # 0 = off
+TTS_CACHE_MAX_CHARS = int(os.getenv("ELYSIA_TTS_CACHE_MAX_CHARS", "160"))  # longer text isn't worth keeping
+
+def cache_key(text: str, voice: str, lang_code: str, sample_rate: int) -> str:
+    """Content address for one utterance: same text/voice/lang/rate -> same audio."""
+    blob = json.dumps([text.strip(), voice, lang_code, int(sample_rate)], ensure_ascii=False)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+class AudioCache:
+    """
+    Synthesized audio on disk, one raw float32 file per utterance (<key>.f32), read back via
+    np.memmap so a hit costs an mmap, not a decode. The directory is the index: on start the
+    files are loaded oldest-mtime first, and a hit touches the file, so LRU order survives
+    restarts. Total size is kept under max_bytes by evicting least recently used entries.
+    """
+
+    SUFFIX = ".f32"
+
+    def __init__(self, directory: str = TTS_CACHE_DIR, max_bytes: int = TTS_CACHE_BYTES,
+                 max_chars: int = TTS_CACHE_MAX_CHARS):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_chars = max_chars
+        self._lock = threading.Lock()
+        self._lru = OrderedDict()  # key -> bytes, least recently used first
+        self._bytes = 0
+        self.hits = self.misses = self.evictions = 0
+        os.makedirs(directory, exist_ok=True)
+        entries = []
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            if name.endswith(".tmp"):
+                os.remove(path)  # half-written by a crash
+            elif name.endswith(self.SUFFIX):
+                st = os.stat(path)
+                entries.append((st.st_mtime, name[:-len(self.SUFFIX)], st.st_size))
+        for _, key, size in sorted(entries):
+            self._lru[key] = size
+            self._bytes += size
+        self._evict()
+        logging.info(f"TTS cache: {len(self._lru)} clips, {self._bytes / 1e6:.1f} MB in {directory}")
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key + self.SUFFIX)
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            return key in self._lru
+
+    def cacheable(self, text: str) -> bool:
+        return bool(text and text.strip()) and len(text) <= self.max_chars
+
+    def get(self, key: str) -> np.ndarray | None:
+        """Read-only memmap of the cached samples, or None."""
+        with self._lock:
+            if key not in self._lru:
+                self.misses += 1
+                return None
+            self._lru.move_to_end(key)
+            self.hits += 1
+        path = self._path(key)
+        try:
+            os.utime(path)  # recency on disk, for the next start
+            return np.memmap(path, dtype=np.float32, mode="r")
+        except (OSError, ValueError) as e:
+            logging.warning(f"TTS cache entry {key[:12]} unreadable, dropping it: {e}")
+            self._drop(key)
+            return None
+
+    def put(self, key: str, audio: np.ndarray):
+        audio = np.ascontiguousarray(audio, dtype=np.float32)
+        if audio.size == 0 or audio.nbytes > self.max_bytes:
+            return
+        path = self._path(key)
+        tmp = path + ".tmp"
+        try:
+            audio.tofile(tmp)
+            os.replace(tmp, path)  # readers never see a partial clip
+        except OSError as e:
+            logging.warning(f"TTS cache write failed: {e}")
+            return
+        with self._lock:
+            self._bytes += audio.nbytes - self._lru.pop(key, 0)
+            self._lru[key] = audio.nbytes
+            self._evict()
+
+    def _drop(self, key: str):
+        with self._lock:
+            self._bytes -= self._lru.pop(key, 0)
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def _evict(self):
+        # caller holds the lock (or is __init__)
+        while self._bytes > self.max_bytes and self._lru:
+            key, size = self._lru.popitem(last=False)
+            self._bytes -= size
+            self.evictions += 1
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"clips": len(self._lru), "bytes": self._bytes, "max_bytes": self.max_bytes,
+                    "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
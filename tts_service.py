@@ -1,8 +1,8 @@
-from kokoro import KPipeline
-import sounddevice as sd
 import numpy as np
 import traceback
 import logging
+import threading
+import queue
 import time  # NEW: timestamps for stream events
 
 # NEW: WS broadcaster for UI
@@ -12,6 +12,13 @@ except Exception:
     WS = None
     logging.warning("tts_ws.WS not available; UI streaming disabled.")
 
+from audio_player import AudioPlayer, PlaybackHandle
+from tracing import TRACER
+from tts_cache import AudioCache, cache_key, TTS_CACHE_BYTES
+from audio_features import FeatureStream
+
+CACHE_CHUNK_SECONDS = 0.25  # cache hits are fed to the player/UI in slices of this length
+
 class TextToSpeechService:
     """A service for generating high-quality speech from text."""
 
@@ -22,67 +29,248 @@ class TextToSpeechService:
         logging.getLogger('torch').setLevel(logging.WARNING)
 
         self.voice = "af_heart"
+        self.lang_code = "a"
         self.sample_rate = 24000  # Hardcoded to match the library's requirement
+        self.last_first_audio_at = None  # perf_counter() when the last utterance started playing
 
         try:
+            # Deferred: kokoro pulls in torch + misaki; keep importing this module cheap.
+            from kokoro import KPipeline
+
             # Provide the library's unique code for American English.
-            self.engine = KPipeline(lang_code="a")
+            self.engine = KPipeline(lang_code=self.lang_code)
 
             logging.info(f"TextToSpeechService initialized for American English ('a').")
             logging.info(f"Sample rate set to {self.sample_rate} Hz.")
 
+            # NEW: content-addressed audio for repeated phrases (ELYSIA_TTS_CACHE_BYTES=0 turns it off)
+            self.cache = None
+            if TTS_CACHE_BYTES > 0:
+                try:
+                    self.cache = AudioCache()
+                except Exception as e:
+                    logging.warning(f"TTS audio cache disabled: {e}")
+
+            # Persistent output stream + ring buffer; one synthesis worker feeds it in order.
+            self.player = AudioPlayer(self.sample_rate)
+            self._live = []  # handles not finished yet, for cancel_all() (barge-in)
+            self._live_lock = threading.Lock()
+            self._jobs = queue.Queue()
+            self._worker = threading.Thread(target=self._synth_loop, daemon=True)
+            self._worker.start()
+
         except Exception as e:
             logging.error(f"Failed to initialize Kokoro TTS engine: {e}")
             logging.error(traceback.format_exc())
             raise
 
-    def speak(self, text: str):
+    def speak(self, text: str) -> PlaybackHandle | None:
         """
-        Generates audio from text and plays it using sounddevice.
+        Generates audio from text and plays it; blocks until playback finishes (or is cancelled).
         Also streams PCM chunks over WS for the UI (if WS is available).
         """
         if not text:
-            return
+            return None
+        handle = self.speak_async(text)
+        handle.wait()
+        self._trace(handle)
+        return handle
 
-        try:
-            logging.info(f"TTS generating audio for: '{text}'")
-            audio_chunks = []  # keep your original name
-
-            msg_id = f"msg_{int(time.time()*1000)}"
-            if WS: WS.tts_begin(self.sample_rate, msg_id)
-
-            # KPipeline yields Result objects which contain the audio (torch.FloatTensor)
-            for result in self.engine(text=text, voice=self.voice):
-                if result.audio is not None:
-                    # Debug prints you had before (optional)
-                    # print(">>> TTS DEBUG — result.audio =", type(result.audio))
-                    # print(">>> requires_grad:", getattr(result.audio, "requires_grad", "N/A"))
-                    # print(">>> is_cuda:", getattr(result.audio, "is_cuda", "N/A"))
-                    # print(">>> device:", getattr(result.audio, "device", "N/A"))
-
-                    # Convert to numpy float32 for sounddevice and WS
-                    audio_chunk = result.audio.detach().cpu().numpy().astype(np.float32)
-                    audio_chunks.append(audio_chunk)
-
-                    # Stream to UI if available
-                    if WS:
-                        WS.tts_chunk(msg_id, time.time(), audio_chunk.tobytes())
+    def speak_async(self, text_or_segments) -> PlaybackHandle:
+        """
+        Non-blocking speak. Accepts a string or an iterable of text segments and returns a
+        PlaybackHandle: handle.wait() blocks until it has played, handle.cancel() cuts it off.
+        Utterances queue up behind each other and play gaplessly.
+        """
+        handle = PlaybackHandle(self.player)
+        with self._live_lock:
+            self._live = [h for h in self._live if not h.done]
+            self._live.append(handle)
+        self._jobs.put((handle, text_or_segments))
+        return handle
 
-            if not audio_chunks:
-                logging.warning("TTS generated no audio chunks.")
-                if WS: WS.tts_end(msg_id)
-                return
+    def cancel_all(self) -> int:
+        """Cuts off everything queued or playing (barge-in). Returns how many were cancelled."""
+        with self._live_lock:
+            live, self._live = [h for h in self._live if not h.done], []
+        for h in live:
+            if WS and h.msg_id:
+                WS.tts_cancel(h.msg_id)  # before cancel(): that releases the tts_end sender
+            h.cancel()
+        return len(live)
+
+    @staticmethod
+    def spoken_text(handle: PlaybackHandle) -> str:
+        """
+        The part of handle's text that actually came out of the speaker. A segment cut off
+        mid-way contributes the same fraction of its words, ending in an ellipsis.
+        """
+        played = handle._player.played_frames(handle)
+        parts = []
+        for text, lo, hi in handle.segments:
+            if played >= hi:
+                parts.append(text)
+                continue
+            if played > lo and hi > lo:
+                words = text.split()
+                keep = int(len(words) * (played - lo) / (hi - lo))
+                if keep:
+                    parts.append(" ".join(words[:keep]) + "...")
+            break
+        return " ".join(parts)
+
+    def speak_stream(self, segments) -> PlaybackHandle:
+        """
+        Speaks an iterable of text segments (e.g. sentences from speech_segmenter) as they arrive.
+        The iterable is drained on a background thread so the LLM keeps generating while Kokoro
+        synthesizes and plays the earlier sentences. Exceptions from the source are re-raised
+        after whatever was already received has been spoken.
+        """
+        pending = queue.Queue()
+        done = object()
+        failure = []
+
+        def _produce():
+            try:
+                for seg in segments:
+                    pending.put(seg)
+            except Exception as e:
+                failure.append(e)
+            finally:
+                pending.put(done)
 
-            full_audio = np.concatenate(audio_chunks, axis=0)
-            sd.play(full_audio, self.sample_rate)
-            sd.wait()
+        def _drain():
+            while True:
+                seg = pending.get()
+                if seg is done:
+                    return
+                yield seg
 
-            if WS: WS.tts_end(msg_id)
+        producer = threading.Thread(target=_produce, daemon=True)
+        producer.start()
+        handle = self.speak_async(_drain())
+        handle.wait()
+        # after a barge-in don't sit out a tool call the (cancelled) chain may still be in
+        producer.join(timeout=1.0 if handle.cancelled else None)
+        self._trace(handle)
 
+        if failure:
+            raise failure[0]
+        return handle
+
+    def _trace(self, handle: PlaybackHandle):
+        self.last_first_audio_at = handle.first_audio_at
+        TRACER.record("tts_first_chunk", handle.queued_at, handle.first_chunk_at)
+        TRACER.record("playback", handle.first_audio_at, handle.finished_at, cancelled=handle.cancelled)
+
+    def warmup(self):
+        """Dummy synthesis (not played) so the first real utterance doesn't pay for lazy init."""
+        for _ in self._synthesize("Warming up."):
+            pass
+
+    def prerender(self, phrases) -> int:
+        """
+        Synthesizes phrases that aren't cached yet (without playing them) so their first use
+        is a cache hit. Returns how many were rendered.
+        """
+        if not self.cache:
+            return 0
+        rendered = 0
+        for text in phrases:
+            if not self.cache.cacheable(text) or self._cache_key(text) in self.cache:
+                continue
+            for _ in self._audio_for(text):
+                pass
+            rendered += 1
+        logging.info(f"TTS pre-rendered {rendered} phrase(s); cache {self.cache.stats()}")
+        return rendered
+
+    def _cache_key(self, text: str) -> str:
+        return cache_key(text, self.voice, self.lang_code, self.sample_rate)
+
+    def _audio_for(self, text: str):
+        """
+        Yields (float32 chunk, tokens) for text: straight from the audio cache on a hit (KPipeline
+        is never touched; tokens None), otherwise from _synthesize, storing the audio once it is complete.
+        """
+        if not self.cache or not self.cache.cacheable(text):
+            yield from self._synthesize(text)
+            return
+        key = self._cache_key(text)
+        cached = self.cache.get(key)
+        if cached is not None:
+            logging.info(f"TTS cache hit for: '{text}'")
+            step = max(1, int(self.sample_rate * CACHE_CHUNK_SECONDS))
+            for i in range(0, len(cached), step):
+                yield cached[i:i + step], None
+            return
+        chunks = []
+        for chunk, tokens in self._synthesize(text):
+            chunks.append(chunk)
+            yield chunk, tokens
+        # only reached if the consumer took every chunk (a cancelled utterance isn't stored)
+        if chunks:
+            self.cache.put(key, np.concatenate(chunks))
+
+    def _synthesize(self, text: str):
+        """Yields (float32 numpy chunk, tokens) for text as KPipeline produces them. tokens are the
+        result's MTokens (phonemes + start_ts/end_ts, for visemes) where the pipeline gives them."""
+        for result in self.engine(text=text, voice=self.voice):
+            if result.audio is not None:
+                yield result.audio.detach().cpu().numpy().astype(np.float32), getattr(result, "tokens", None)
+
+    def _synth_loop(self):
+        while True:
+            handle, source = self._jobs.get()
+            if handle.cancelled:
+                continue
+            self._run_job(handle, [source] if isinstance(source, str) else source)
+
+    def _run_job(self, handle: PlaybackHandle, segments):
+        msg_id = f"msg_{int(time.time()*1000)}"
+        began = False
+        features = None  # intensity/viseme events for the UI; only computed while someone is connected
+        self.player.begin(handle)
+        try:
+            for seg in segments:
+                if handle.cancelled:
+                    break
+                if not seg:
+                    continue
+                logging.info(f"TTS generating audio for: '{seg}'")
+                seg_start = handle.frames_written
+                # KPipeline yields Result objects which contain the audio (torch.FloatTensor);
+                # each chunk goes to the speaker ring and the UI as soon as it exists
+                for audio_chunk, tokens in self._audio_for(seg):
+                    if handle.cancelled:
+                        break
+                    if WS:
+                        if not began:
+                            features = FeatureStream(self.sample_rate) if WS.clients else None
+                            WS.tts_begin(self.sample_rate, msg_id, features=features.info() if features else None)
+                            handle.msg_id = msg_id
+                            began = True
+                        # features first: they describe this chunk's audio, which follows
+                        if features:
+                            WS.features(msg_id, features.push(audio_chunk, tokens))
+                        WS.tts_chunk(msg_id, time.time(), audio_chunk)
+                    if not self.player.write(handle, audio_chunk):
+                        break
+                handle.segments.append((seg, seg_start, handle.frames_written))
+            if handle.frames_written == 0 and not handle.cancelled:
+                logging.warning("TTS generated no audio chunks.")
         except Exception as e:
+            handle.error = e
             logging.error(f"Error in TTS service: {e}")
             logging.error(traceback.format_exc())
             if WS: WS.state("error")
+        finally:
+            self.player.finish(handle)
+            if WS and features and not handle.cancelled:
+                WS.features(msg_id, features.flush())
+            if WS and began:
+                # tts_end once the audio has actually played out, without holding up synthesis
+                threading.Thread(target=lambda: (handle.wait(), WS.tts_end(msg_id)), daemon=True).start()
 
 if __name__ == '__main__':
     # Example usage
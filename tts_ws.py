@@ -1,55 +1,214 @@
 # tts_ws.py
-import asyncio, json, base64, threading
+import asyncio, json, threading, struct, itertools, collections, logging, uuid, re
+from urllib.parse import urlparse, parse_qs
+import numpy as np
 import websockets
 
+# Binary PCM frame: 20-byte little-endian header, then raw PCM.
+#   u8 kind (1 = PCM), u8 fmt (0 = float32, 1 = int16), u16 header version,
+#   u32 mid (numeric message id, announced in tts_begin), u32 seq, f64 ts
+# 20 bytes keeps the PCM 4-byte aligned so clients can view it without copying.
+FRAME_HEADER = struct.Struct("<BBHIId")
+FRAME_VERSION = 1
+KIND_PCM = 1
+PCM_FORMATS = {"f32": 0, "i16": 1}
+
+class _Client:
+    """One connected socket with its own bounded send queue (drop-oldest) and sender task."""
+
+    def __init__(self, ws, fmt: str, max_queue: int, session: str):
+        self.ws = ws
+        self.fmt = fmt
+        self.session = session  # ?session=<id> (reconnects resume it), else one per socket
+        self.max_queue = max_queue
+        self.queue = collections.deque()
+        self.ready = asyncio.Event()
+        self.dropped = 0
+        self.task = None
+
+    def push(self, data, stale_ok: bool | None = None):
+        # stale_ok: fine to shed under backpressure (PCM frames, and the feature events describing them)
+        if stale_ok is None:
+            stale_ok = isinstance(data, bytes)
+        if len(self.queue) >= self.max_queue:
+            # Shed audio first: a late PCM frame is useless, a lost tts_end/state isn't.
+            for i, (_, shed) in enumerate(self.queue):
+                if shed:
+                    del self.queue[i]
+                    break
+            else:
+                self.queue.popleft()
+            self.dropped += 1
+        self.queue.append((data, stale_ok))
+        self.ready.set()
+
+    async def pump(self):
+        try:
+            while True:
+                await self.ready.wait()
+                while self.queue:
+                    await self.ws.send(self.queue.popleft()[0])
+                self.ready.clear()
+        except Exception:
+            pass  # socket gone; _fanout drops us on the next message
+
 class WSBroadcaster:
-    def __init__(self, host="0.0.0.0", port=8765):
+    def __init__(self, host="0.0.0.0", port=8765, max_queue=64):
         self.host, self.port = host, port
+        self.max_queue = max_queue
         self.clients = set()
         self.loop = asyncio.new_event_loop()
         self.server = None
-        self._thread = threading.Thread(target=self._run, daemon=True)
-        self._thread.start()
+        self._mids = {}  # msg_id -> [numeric mid, next seq]
+        self._mid_counter = itertools.count(1)
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._subscribers = []  # fn(session_id, msg) for inbound JSON, see on_message()
+
+    def start(self):
+        """Starts the server thread (idempotent). Not done at import so importing stays side-effect free."""
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="ws-broadcaster", daemon=True)
+                self._thread.start()
 
-    async def _handler(self, ws):
-        self.clients.add(ws)
+    @staticmethod
+    def _query(ws) -> dict:
+        req = getattr(ws, "request", None)
+        path = getattr(req, "path", None) or getattr(ws, "path", "") or ""
+        return parse_qs(urlparse(path).query)
+
+    @staticmethod
+    def _requested_format(ws) -> str:
+        # PCM format is picked per client at connect time: ws://host:8765/?fmt=i16
+        fmt = WSBroadcaster._query(ws).get("fmt", ["f32"])[0]
+        return fmt if fmt in PCM_FORMATS else "f32"
+
+    @staticmethod
+    def _requested_session(ws) -> str:
+        # ws://host:8765/?session=phone keeps one conversation across reconnects
+        sid = re.sub(r"[^\w.-]", "", WSBroadcaster._query(ws).get("session", [""])[0])[:64]
+        return sid or uuid.uuid4().hex[:12]
+
+    async def _handler(self, ws, *_):
+        client = _Client(ws, self._requested_format(ws), self.max_queue, self._requested_session(ws))
+        client.task = asyncio.ensure_future(client.pump())
+        self.clients.add(client)
         try:
-            async for _ in ws:
-                pass
+            async for raw in ws:
+                self._inbound(client, raw)
+        except Exception:
+            pass
         finally:
-            self.clients.discard(ws)
+            self.clients.discard(client)
+            client.task.cancel()
+            if client.dropped:
+                logging.info(f"WS client ({client.fmt}) disconnected; dropped {client.dropped} frames.")
+            if not any(c.session == client.session for c in self.clients):
+                self._dispatch(client.session, {"type": "close"})  # last socket of the session
+
+    def _inbound(self, client: _Client, raw):
+        if isinstance(raw, bytes):
+            return  # no inbound audio (yet)
+        try:
+            msg = json.loads(raw)
+            if not isinstance(msg, dict) or not isinstance(msg.get("type"), str):
+                raise ValueError("expected a JSON object with a 'type'")
+        except ValueError as e:
+            client.push(json.dumps({"type": "error", "error": f"bad message: {e}"}))
+            return
+        if not self._subscribers:
+            client.push(json.dumps({"type": "error", "error": "this server doesn't take input"}))
+            return
+        self._dispatch(client.session, msg)
+
+    def _dispatch(self, session: str, msg: dict):
+        # runs on the WS loop: subscribers must hand off, not block
+        for fn in list(self._subscribers):
+            try:
+                fn(session, msg)
+            except Exception as e:
+                logging.warning(f"WS inbound handler failed: {e}")
+
+    async def _serve(self):
+        # websockets>=14 wants a running loop when serve() is constructed
+        return await websockets.serve(self._handler, self.host, self.port)
 
     def _run(self):
         asyncio.set_event_loop(self.loop)
-        self.server = self.loop.run_until_complete(websockets.serve(self._handler, self.host, self.port))
+        self.server = self.loop.run_until_complete(self._serve())
         self.loop.run_forever()
 
-    def _broadcast(self, obj):
+    def _fanout(self, data=None, pcm=None, stale_ok=False):
+        # runs on the WS loop; every client gets its own copy queued, nobody awaits anybody
+        encoded = {}
+        for client in list(self.clients):
+            if client.task.done():
+                self.clients.discard(client)
+                continue
+            if pcm is not None:
+                if client.fmt not in encoded:
+                    encoded[client.fmt] = self._encode_pcm(client.fmt, *pcm)
+                client.push(encoded[client.fmt])
+            else:
+                client.push(data, stale_ok)
+
+    @staticmethod
+    def _encode_pcm(fmt: str, mid: int, seq: int, ts: float, samples: np.ndarray) -> bytes:
+        if fmt == "i16":
+            body = (np.clip(samples, -1.0, 1.0) * 32767.0).astype("<i2").tobytes()
+        else:
+            body = samples.astype("<f4", copy=False).tobytes()
+        return FRAME_HEADER.pack(KIND_PCM, PCM_FORMATS[fmt], FRAME_VERSION, mid, seq, ts) + body
+
+    def _broadcast(self, obj, stale_ok=False):
         if not self.clients: return
         data = json.dumps(obj)
-        asyncio.run_coroutine_threadsafe(self._broadcast_async(data), self.loop)
+        self.loop.call_soon_threadsafe(self._fanout, data, None, stale_ok)
 
-    async def _broadcast_async(self, data):
-        dead = []
-        for ws in list(self.clients):
-            try:
-                await ws.send(data)
-            except Exception:
-                dead.append(ws)
-        for ws in dead:
-            self.clients.discard(ws)
+    def _unicast(self, session: str, data: str):
+        for client in list(self.clients):
+            if client.session == session and not client.task.done():
+                client.push(data)
 
     # API
-    def tts_begin(self, sr:int, msg_id:str):
-        self._broadcast({"type":"tts_begin","sr":sr,"id":msg_id})
+    def tts_begin(self, sr:int, msg_id:str, features:dict|None=None):
+        # features: frame_ms/band_hz of the intensity+viseme events that will follow (audio_features.py)
+        mid = next(self._mid_counter) & 0xFFFFFFFF
+        self._mids[msg_id] = [mid, 0]
+        self._broadcast({"type":"tts_begin","sr":sr,"id":msg_id,"mid":mid,**(features or {})})
 
     def tts_chunk(self, msg_id:str, ts:float, pcm_f32):
-        # pcm_f32: numpy float32 array
-        b = base64.b64encode(pcm_f32.tobytes()).decode("ascii")
-        self._broadcast({"type":"tts_chunk","id":msg_id,"ts":ts,"pcm":b})
+        # pcm_f32: numpy float32 array -> binary frame (see FRAME_HEADER)
+        if not self.clients: return
+        entry = self._mids.get(msg_id)
+        if entry is None:
+            return
+        mid, seq = entry
+        entry[1] += 1
+        samples = np.asarray(pcm_f32, dtype=np.float32).reshape(-1)
+        self.loop.call_soon_threadsafe(self._fanout, None, (mid, seq, ts, samples))
+
+    def features(self, msg_id:str, events:list):
+        # intensity/viseme events from audio_features.FeatureStream, one message per chunk sent
+        # ahead of the PCM they describe (and shed with it under backpressure); `at` is seconds
+        # into the message's audio
+        if not self.clients or not events: return
+        entry = self._mids.get(msg_id)
+        if entry is None:
+            return
+        for ev in events:
+            ev["mid"] = entry[0]
+        self._broadcast({"type":"features","mid":entry[0],"events":events}, stale_ok=True)
 
     def tts_end(self, msg_id:str):
-        self._broadcast({"type":"tts_end","id":msg_id})
+        entry = self._mids.pop(msg_id, None)
+        self._broadcast({"type":"tts_end","id":msg_id,"mid":entry[0] if entry else None})
+
+    def tts_cancel(self, msg_id:str):
+        # barge-in: clients drop whatever of this message they still have queued
+        entry = self._mids.get(msg_id)
+        self._broadcast({"type":"tts_cancel","id":msg_id,"mid":entry[0] if entry else None})
 
     def state(self, value:str):
         self._broadcast({"type":"state","value":value})
@@ -57,4 +216,27 @@ class WSBroadcaster:
     def emotion(self, value:str):
         self._broadcast({"type":"emotion","value":value})
 
-WS = WSBroadcaster()  # singleton import
+    def metrics(self, stages:dict, turn_id:str|None=None):
+        # rolling per-stage latency: {stage: {"p50_ms", "p95_ms", "n"}}
+        self._broadcast({"type":"metrics","turn_id":turn_id,"stages":stages})
+
+    def sessions(self, stats:dict):
+        # turn_engine: per-session queue depth / waits + LLM scheduler load
+        self._broadcast({"type":"sessions",**stats})
+
+    # inbound
+    def on_message(self, fn):
+        """fn(session_id, msg) for every JSON message a client sends, plus {"type": "close"} when
+        the last socket of a session goes away. Called on the WS loop thread: don't block in it."""
+        self._subscribers.append(fn)
+
+    def off_message(self, fn):
+        if fn in self._subscribers:
+            self._subscribers.remove(fn)
+
+    def send_to(self, session:str, obj:dict):
+        # to the sockets of one session only (text replies), from any thread
+        if not self.clients: return
+        self.loop.call_soon_threadsafe(self._unicast, session, json.dumps(obj))
+
+WS = WSBroadcaster()  # singleton import; call WS.start() to begin serving
@@ -0,0 +1,461 @@
+# turn_engine.py
+"""
+Asyncio turn engine. Every conversation is a Session: its own LLM history (LLMService.fork),
+a FIFO of pending turns and its wait-time stats, served in order by one worker task, with the
+blocking STT/TTS/Chroma/LLM work off the event loop. Sessions:
+  mic   - the voice pipeline (ConversationalAI.voice_turn): listen, reply, listen again
+  <id>  - one per WS client that sends text (?session=<id> keeps it across reconnects);
+          replies stream back to that client only, as text (no TTS). Off unless
+          ELYSIA_TEXT_SESSIONS=1: anyone who can reach the WS port could drive them
+
+Every model request (voice and text turns, speculative prefill, LLM summaries) goes through
+one LLMScheduler: at most ELYSIA_LLM_CONCURRENCY at once (match Ollama's OLLAMA_NUM_PARALLEL),
+voice before text, FIFO within a priority. A spoken turn that finds every slot taken by text
+(always the case with the default single slot) cuts the text reply short rather than waiting
+for it; that client gets reply_end with cancelled and preempted set.
+
+WS messages (JSON), client -> server:
+  {"type": "text", "text": "...", "id": "<optional, echoed back>"}   queue a turn
+  {"type": "cancel"}                                                stop the reply, drop the queue
+  {"type": "stats"}                                                 one "sessions" message back
+server -> that client: queued, reply_begin, reply_delta, reply_end, error (see ui/src/types.ts).
+"sessions" (engine stats) also goes to everyone every ELYSIA_SESSION_STATS_S, and the same
+numbers are on /metrics when ELYSIA_METRICS_PORT is set.
+"""
+import os, json, time, uuid, heapq, logging, asyncio, itertools, threading, traceback, contextlib
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+from tts_ws import WS
+from tracing import TRACER
+from tool_service import ElysiaTools
+from python_workers import get_pool
+
+LLM_CONCURRENCY = int(os.getenv("ELYSIA_LLM_CONCURRENCY", "1"))
+VOICE_RESERVE = int(os.getenv("ELYSIA_LLM_VOICE_RESERVE", "1"))  # slots text can't take (needs concurrency >= 2)
+# The WS server listens on 0.0.0.0 with no auth: text turns (which write to memory) and
+# file/exec tools for them are both opt-in
+TEXT_SESSIONS = os.getenv("ELYSIA_TEXT_SESSIONS", "0") == "1"
+TEXT_TOOLS = os.getenv("ELYSIA_TEXT_TOOLS", "0") == "1"
+MAX_SESSIONS = int(os.getenv("ELYSIA_MAX_TEXT_SESSIONS", "16"))
+MAX_QUEUE = int(os.getenv("ELYSIA_SESSION_QUEUE", "8"))        # pending turns per session
+IDLE_S = float(os.getenv("ELYSIA_SESSION_IDLE_S", "1800"))      # disconnected sessions are kept this long
+STATS_EVERY_S = float(os.getenv("ELYSIA_SESSION_STATS_S", "60"))
+WINDOW = 200  # rolling samples per wait stat, like tracing
+
+PRIORITY_VOICE, PRIORITY_TEXT = 0, 1
+VOICE_SESSION = "mic"
+
+def _pcts(vals) -> dict:
+    v = sorted(vals)
+    if not v:
+        return {"p50_ms": None, "p95_ms": None, "n": 0}
+    at = lambda q: v[min(len(v) - 1, int(round(q * (len(v) - 1))))]
+    return {"p50_ms": round(at(0.5) * 1000, 1), "p95_ms": round(at(0.95) * 1000, 1), "n": len(v)}
+
+class LLMScheduler:
+    """
+    Admission for model requests: at most max_concurrent at once, waiters served by (priority,
+    arrival). With 2+ slots, voice_reserve of them are voice-only so a spoken turn never queues
+    behind text. A waiting request also preempts lower-priority holders that passed preempt=
+    (their cancel is set, so the chain stops at its next chunk): with one slot there is no
+    reserve, and voice would otherwise wait out a whole text generation. The chain is a
+    blocking iterator consumed on worker threads, so this is a Condition, not an asyncio
+    primitive.
+    """
+
+    def __init__(self, max_concurrent: int = LLM_CONCURRENCY, voice_reserve: int = VOICE_RESERVE):
+        self.max_concurrent = max(1, max_concurrent)
+        self.voice_reserve = max(0, min(voice_reserve, self.max_concurrent - 1))
+        self._cv = threading.Condition()
+        self._waiting = []  # heap of (priority, seq)
+        self._seq = itertools.count()
+        self._active = 0
+        self._holders = {}  # ticket -> (cancel, preempt callback) of preemptible slots held
+        self._served = 0
+        self._preempted = 0
+        self._waits = defaultdict(lambda: deque(maxlen=WINDOW))  # session id -> seconds waited
+
+    def _free(self, priority: int) -> bool:
+        limit = self.max_concurrent - (self.voice_reserve if priority > PRIORITY_VOICE else 0)
+        return self._active < limit
+
+    def _preempt(self, priority: int):
+        """Cancels the lowest-priority preemptible holder below priority, newest first."""
+        victims = [t for t, (cancel, _) in self._holders.items() if t[0] > priority and not cancel.is_set()]
+        if not victims:
+            return
+        ticket = max(victims)
+        cancel, on_preempt = self._holders[ticket]
+        if on_preempt is not None:
+            on_preempt()
+        cancel.set()
+        self._preempted += 1
+
+    @contextlib.contextmanager
+    def slot(self, priority: int, who: str = "", cancel: threading.Event | None = None, wait: bool = True,
+             preempt=None):
+        """
+        Holds one model slot for the with-block and yields the seconds spent waiting for it, or
+        None without a slot: cancel was set while queued, or wait=False and none was free.
+        preempt (a callable, may be a no-op) makes the slot preemptible: a higher-priority
+        request that has to wait calls it, then sets cancel (required with preempt).
+        """
+        t0 = time.perf_counter()
+        ticket = (priority, next(self._seq))
+        acquired = False
+        preempted = False
+        with self._cv:
+            heapq.heappush(self._waiting, ticket)
+            while True:
+                if self._waiting[0] == ticket and self._free(priority):
+                    heapq.heappop(self._waiting)
+                    self._active += 1
+                    if preempt is not None and cancel is not None:
+                        self._holders[ticket] = (cancel, preempt)
+                    acquired = True
+                    break
+                if not wait or (cancel is not None and cancel.is_set()):
+                    self._waiting.remove(ticket)
+                    heapq.heapify(self._waiting)
+                    self._cv.notify_all()
+                    break
+                if not preempted and self._waiting[0] == ticket:
+                    self._preempt(priority)  # once per wait; the victim frees its slot shortly
+                    preempted = True
+                # cancel is an Event, not something we can wait on together with the Condition
+                self._cv.wait(timeout=0.1 if cancel is not None else None)
+        if not acquired:
+            yield None
+            return
+        waited = time.perf_counter() - t0
+        with self._cv:
+            self._waits[who].append(waited)
+            self._served += 1
+        try:
+            yield waited
+        finally:
+            with self._cv:
+                self._active -= 1
+                self._holders.pop(ticket, None)
+                self._cv.notify_all()
+
+    def waits(self, who: str) -> dict:
+        with self._cv:
+            return _pcts(self._waits.get(who, ()))
+
+    def forget(self, who: str):
+        with self._cv:
+            self._waits.pop(who, None)
+
+    def stats(self) -> dict:
+        with self._cv:
+            return {"max_concurrent": self.max_concurrent, "voice_reserve": self.voice_reserve,
+                    "active": self._active, "waiting": len(self._waiting), "served": self._served,
+                    "preempted": self._preempted}
+
+class Session:
+    """One conversation: its own LLM history, the turns waiting for it, and how long they waited."""
+
+    def __init__(self, sid: str, kind: str, priority: int, llm):
+        self.id, self.kind, self.priority, self.llm = sid, kind, priority, llm
+        self.queue = asyncio.Queue()  # (text, client id, enqueued at perf_counter())
+        self.cancel = threading.Event()
+        self.preempted = False  # the reply in flight was cut short for a voice turn
+        self.busy = False
+        self.connected = True
+        self.turns = 0
+        self.last_active = time.time()
+        self.queue_waits = deque(maxlen=WINDOW)  # enqueued -> turn started, seconds
+        self.worker = None
+
+    def stats(self, scheduler: LLMScheduler) -> dict:
+        return {"kind": self.kind, "queue_depth": self.queue.qsize(), "busy": self.busy, "turns": self.turns,
+                "queue_wait": _pcts(self.queue_waits), "llm_wait": scheduler.waits(self.id),
+                "idle_s": 0.0 if self.busy else round(time.time() - self.last_active, 1)}
+
+class TurnEngine:
+    """The sessions of one ConversationalAI on one asyncio loop; run() blocks (see ConversationalAI.run)."""
+
+    def __init__(self, app, scheduler: LLMScheduler, text_sessions: bool = TEXT_SESSIONS):
+        self.app = app
+        self.scheduler = scheduler
+        self.text_sessions = text_sessions
+        self.voice = Session(VOICE_SESSION, "voice", PRIORITY_VOICE, app.llm)
+        self.sessions = {VOICE_SESSION: self.voice}
+        self.loop = None
+        self._pool = None
+        self._turn_thread = None           # the daemon thread running the current voice_turn
+        self._text_busy = 0                # text turns still on pool threads (see drain())
+        self._text_cv = threading.Condition()
+        TRACER.add_collector(self._prometheus)
+
+    def run(self):
+        """
+        Serves the mic and the text sessions until the voice pipeline raises (KeyboardInterrupt
+        included); the exception propagates for ConversationalAI.run to handle. Never returns.
+        """
+        asyncio.run(self._main())
+
+    def drain(self, timeout: float = 10.0) -> bool:
+        """
+        After run() raised: cancels the text turns still on pool threads and waits up to timeout
+        for them and the in-flight voice_turn (cancel that one via the app first), so the
+        memory/response stores aren't closed under them. True if everything finished.
+        """
+        deadline = time.monotonic() + timeout
+        for s in list(self.sessions.values()):
+            if s.kind == "text":
+                s.cancel.set()
+        t = self._turn_thread
+        if t is not None:
+            t.join(timeout=max(0.0, deadline - time.monotonic()))
+        with self._text_cv:
+            self._text_cv.wait_for(lambda: not self._text_busy, timeout=max(0.0, deadline - time.monotonic()))
+            return not self._text_busy and not (t is not None and t.is_alive())
+
+    def idle(self) -> bool:
+        """Nothing replying or queued in any session (for background work like consolidation)."""
+        return not any(s.busy or s.queue.qsize() for s in list(self.sessions.values()))
+
+    def stats(self) -> dict:
+        return {"llm": self.scheduler.stats(),
+                "sessions": {sid: s.stats(self.scheduler) for sid, s in list(self.sessions.items())}}
+
+    async def _main(self):
+        self.loop = asyncio.get_running_loop()
+        self._pool = ThreadPoolExecutor(max_workers=max(1, MAX_SESSIONS), thread_name_prefix="text-turn")
+        if self.text_sessions:
+            WS.on_message(self._on_ws)
+        reporter = asyncio.ensure_future(self._report_loop())
+        try:
+            await self._voice_loop()
+        finally:
+            WS.off_message(self._on_ws)
+            reporter.cancel()
+            for s in list(self.sessions.values()):
+                s.cancel.set()
+                if s.worker:
+                    s.worker.cancel()
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self.loop = None
+
+    def _in_daemon(self, fn, *args, turn: bool = False) -> asyncio.Future:
+        """
+        fn(*args) on a fresh daemon thread. Not the pool: stt.listen() blocks until someone
+        speaks and can't be woken, and a pool thread stuck in it would hold up interpreter exit.
+        """
+        loop = self.loop
+        fut = loop.create_future()
+
+        def _settle(result, exc):
+            if fut.done():
+                return
+            if exc is not None:
+                fut.set_exception(exc)
+            else:
+                fut.set_result(result)
+
+        def _run():
+            try:
+                result, exc = fn(*args), None
+            except BaseException as e:  # KeyboardInterrupt too: it's how the voice loop ends
+                result, exc = None, e
+            try:
+                loop.call_soon_threadsafe(_settle, result, exc)
+            except RuntimeError:
+                pass  # loop already closed
+
+        t = threading.Thread(target=_run, name="voice-turn", daemon=True)
+        if turn:
+            self._turn_thread = t  # drain() joins it; a thread stuck in listen() isn't worth waiting for
+        t.start()
+        return fut
+
+    async def _voice_loop(self):
+        s = self.voice
+        while True:
+            user_input = await self._in_daemon(self.app.stt.listen)
+            if not user_input:
+                continue
+            s.busy = True
+            try:
+                await self._in_daemon(self.app.voice_turn, user_input, turn=True)
+            finally:
+                s.busy = False
+                s.turns += 1
+                s.last_active = time.time()
+
+    # --- text sessions ---
+    def _on_ws(self, sid: str, msg: dict):
+        # WS loop thread -> ours
+        loop = self.loop
+        if loop is not None:
+            loop.call_soon_threadsafe(self._handle, sid, msg)
+
+    @staticmethod
+    def _error(sid: str, error: str, cid=None):
+        WS.send_to(sid, {"type": "error", "id": cid, "error": error})
+
+    def _handle(self, sid: str, msg: dict):
+        kind = msg["type"]
+        s = self.sessions.get(sid)
+        if kind == "close":
+            if s is not None and s.kind == "text":
+                s.connected = False
+                self._drop_pending(s)  # nobody left to read the replies
+            return
+        if s is not None and s.kind != "text":
+            self._error(sid, f"session id '{sid}' is reserved", msg.get("id"))
+            return
+        if kind == "stats":
+            WS.send_to(sid, {"type": "sessions", **self.stats()})
+        elif kind == "cancel":
+            if s is not None:
+                self._drop_pending(s)
+        elif kind == "text":
+            cid = msg.get("id")
+            text = str(msg.get("text") or "").strip()
+            if not text:
+                self._error(sid, "empty text", cid)
+                return
+            s = s or self._open(sid)
+            if s is None:
+                self._error(sid, f"too many sessions ({MAX_SESSIONS})", cid)
+                return
+            if s.queue.qsize() >= MAX_QUEUE:
+                self._error(sid, f"queue full ({MAX_QUEUE} turns pending)", cid)
+                return
+            s.connected = True
+            s.last_active = time.time()
+            s.queue.put_nowait((text, cid, time.perf_counter()))
+            WS.send_to(sid, {"type": "queued", "id": cid, "ahead": s.queue.qsize() - 1 + int(s.busy)})
+        else:
+            self._error(sid, f"unknown message type '{kind}'", msg.get("id"))
+
+    def _open(self, sid: str) -> Session | None:
+        self._evict(time.time())
+        if sum(1 for s in self.sessions.values() if s.kind == "text") >= MAX_SESSIONS:
+            return None
+        # own tool box: keep_state Python runs in this session's worker, not the mic's
+        tools = [ElysiaTools(python_session=self._python_session(sid))] if TEXT_TOOLS else []
+        s = Session(sid, "text", PRIORITY_TEXT, self.app.llm.fork(tools=tools))
+        s.worker = asyncio.ensure_future(self._text_worker(s))
+        self.sessions[sid] = s
+        logging.info(f"Text session '{sid}' opened ({len(self.sessions) - 1} text session(s)).")
+        return s
+
+    def _evict(self, now: float):
+        for sid, s in list(self.sessions.items()):
+            if (s.kind == "text" and not s.connected and not s.busy and not s.queue.qsize()
+                    and now - s.last_active > IDLE_S):
+                s.worker.cancel()
+                del self.sessions[sid]
+                self.scheduler.forget(sid)
+                if TEXT_TOOLS:
+                    get_pool().end_session(self._python_session(sid))
+                logging.info(f"Text session '{sid}' closed after {now - s.last_active:.0f}s idle.")
+
+    @staticmethod
+    def _python_session(sid: str) -> str:
+        return f"elysia:{sid}"
+
+    @staticmethod
+    def _drop_pending(s: Session):
+        s.cancel.set()  # the reply in flight, if any; the worker clears it before the next turn
+        while not s.queue.empty():
+            s.queue.get_nowait()
+
+    async def _text_worker(self, s: Session):
+        while True:
+            text, cid, enqueued = await s.queue.get()
+            s.cancel.clear()
+            s.preempted = False
+            s.busy = True
+            queued_s = time.perf_counter() - enqueued
+            s.queue_waits.append(queued_s)
+            try:
+                await self.loop.run_in_executor(self._pool, self._text_turn, s, text, cid, queued_s)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error(f"Text turn failed in session '{s.id}': {e}")
+                logging.error(traceback.format_exc())
+                self._error(s.id, f"turn failed: {e}", cid)
+            finally:
+                s.busy = False
+                s.turns += 1
+                s.last_active = time.time()
+
+    def _text_turn(self, s: Session, text: str, cid, queued_s: float):
+        with self._text_cv:
+            self._text_busy += 1
+        try:
+            with TRACER.untraced():  # the open trace turn is the mic's, whatever runs meanwhile
+                self._text_reply(s, text, cid, queued_s)
+        finally:
+            with self._text_cv:
+                self._text_busy -= 1
+                self._text_cv.notify_all()
+
+    def _text_reply(self, s: Session, text: str, cid, queued_s: float):
+        """One text turn on a pool thread: retrieve, stream the reply to the client, persist."""
+        app = self.app
+        t0 = time.perf_counter()
+        turn_id = str(uuid.uuid4())  # memory/response-store key, like the voice turns' trace id
+        logging.info(f"TEXT [{s.id}]: {text}")
+        WS.send_to(s.id, {"type": "reply_begin", "id": cid, "turn_id": turn_id,
+                          "queued_ms": round(queued_s * 1000, 1)})
+        memories = app.memory.retrieve_relevant_memories(text)
+        parts = []
+        with self.scheduler.slot(s.priority, who=s.id, cancel=s.cancel,
+                                 preempt=lambda: setattr(s, "preempted", True)) as waited:
+            if waited is not None:
+                for chunk in s.llm.stream_turn(text, memories, cancel=s.cancel):
+                    parts.append(chunk)
+                    WS.send_to(s.id, {"type": "reply_delta", "id": cid, "text": chunk})
+        full_response = "".join(parts)
+        cancelled = s.cancel.is_set()
+        if full_response or not cancelled:
+            app._save_response(full_response, turn_id)
+            memory_response = full_response
+            if cancelled:
+                memory_response += " [cut short for a voice turn]" if s.preempted else " [interrupted by user]"
+            app.memory.add_memory(text, memory_response, turn_id=turn_id)
+        WS.send_to(s.id, {"type": "reply_end", "id": cid, "turn_id": turn_id, "text": full_response,
+                          "cancelled": cancelled, "preempted": s.preempted, "queued_ms": round(queued_s * 1000, 1),
+                          "llm_wait_ms": round((waited or 0.0) * 1000, 1),
+                          "total_ms": round((time.perf_counter() - t0) * 1000, 1)})
+
+    # --- reporting ---
+    async def _report_loop(self):
+        while STATS_EVERY_S > 0:
+            await asyncio.sleep(STATS_EVERY_S)
+            self._evict(time.time())
+            if len(self.sessions) > 1:  # only worth a line once text sessions exist
+                stats = self.stats()
+                WS.sessions(stats)
+                logging.info("Sessions: " + json.dumps(stats))
+
+    def _prometheus(self) -> list[str]:
+        st = self.stats()
+        lines = ["# HELP elysia_llm_requests Model requests holding / waiting for a scheduler slot.",
+                 "# TYPE elysia_llm_requests gauge",
+                 f'elysia_llm_requests{{state="active"}} {st["llm"]["active"]}',
+                 f'elysia_llm_requests{{state="waiting"}} {st["llm"]["waiting"]}',
+                 "# HELP elysia_session_queue_depth Turns waiting per session.",
+                 "# TYPE elysia_session_queue_depth gauge"]
+        for sid, s in st["sessions"].items():
+            lines.append(f'elysia_session_queue_depth{{session="{sid}",kind="{s["kind"]}"}} {s["queue_depth"]}')
+        lines += ["# HELP elysia_session_wait_seconds Per-session wait (queue: enqueued to started; "
+                  "llm: for a model slot), rolling window.",
+                  "# TYPE elysia_session_wait_seconds gauge"]
+        for sid, s in st["sessions"].items():
+            for wait in ("queue", "llm"):
+                w = s[wait + "_wait"]
+                if not w["n"]:
+                    continue
+                for q, key in ((0.5, "p50_ms"), (0.95, "p95_ms")):
+                    lines.append(f'elysia_session_wait_seconds{{session="{sid}",kind="{s["kind"]}",'
+                                 f'wait="{wait}",quantile="{q}"}} {w[key] / 1000:.6f}')
+        return lines
@@ -1,6 +1,9 @@
 class PCMBridge extends AudioWorkletProcessor {
   constructor(){ super(); this.q=[]; this.ptr=0; this.cur=null;
-    this.port.onmessage = e => { if(e.data?.type==='push') this.q.push(e.data.buf); };
+    this.port.onmessage = e => {
+      if(e.data?.type==='push') this.q.push(e.data.buf);
+      else if(e.data?.type==='flush'){ this.q=[]; this.cur=null; this.ptr=0; }
+    };
   }
   process(inputs, outputs){
     const out = outputs[0][0]; let i=0;
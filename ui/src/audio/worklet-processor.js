@@ -7,6 +7,8 @@ class PCMBridge extends AudioWorkletProcessor {
     this.port.onmessage = e => {
       if (e.data?.type === 'push') {
         this.queue.push(e.data.buffer);
+      } else if (e.data?.type === 'flush') {
+        this.queue = []; this.current = null; this.ptr = 0;
       }
     }
   }
@@ -2,7 +2,7 @@ import { useEffect, useRef } from "react";
 import { useAudioPipe } from "../hooks/useAudioPipe";
 
 export default function AvatarHost() {
-  const { state, intensity } = useAudioPipe();
+  const { state, intensity, viseme } = useAudioPipe();
   const ref = useRef<HTMLDivElement>(null);
 
   // pseudo: wire to Rive inputs (jawOpen, glow)
@@ -10,8 +10,9 @@ export default function AvatarHost() {
     // if using @rive-app/canvas, grab state machine inputs and set:
     // jawOpen.value = intensity
     // glow.value = intensity
+    // mouth.value = VISEME_INDEX[viseme]   (server-side visemes, see types.ts)
     // and switch a 'mode' input by state
-  }, [state, intensity]);
+  }, [state, intensity, viseme]);
 
   return (
     <div className="avatar">
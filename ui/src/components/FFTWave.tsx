@@ -1,22 +1,27 @@
 import { useEffect, useRef } from "react";
+import type { MutableRefObject } from "react";
+import type { AudioFrame } from "../hooks/useAudioPipe";
 
-export default function FFTWave({ analyser }: { analyser: AnalyserNode | null }) {
+// Band energies come precomputed from the server (intensity events), so this only draws bars.
+export default function FFTWave({ frame }: { frame: MutableRefObject<AudioFrame> }) {
   const canvasRef = useRef<HTMLCanvasElement>(null);
   useEffect(() => {
-    if (!analyser || !canvasRef.current) return;
-    const ctx = canvasRef.current.getContext('2d')!;
-    const data = new Uint8Array(analyser.frequencyBinCount);
+    if (!canvasRef.current) return;
+    const canvas = canvasRef.current;
+    const ctx = canvas.getContext('2d')!;
+    let raf = 0;
     const draw = () => {
-      analyser.getByteFrequencyData(data);
-      ctx.clearRect(0,0,canvasRef.current!.width,canvasRef.current!.height);
-      for (let i=0;i<data.length;i++){
-        const x = (i / data.length) * canvasRef.current!.width;
-        const h = (data[i] / 255) * canvasRef.current!.height;
-        ctx.fillRect(x, canvasRef.current!.height - h, 2, h);
+      const bands = frame.current.bands;
+      ctx.clearRect(0,0,canvas.width,canvas.height);
+      const w = canvas.width / Math.max(1, bands.length);
+      for (let i=0;i<bands.length;i++){
+        const h = bands[i] * canvas.height;
+        ctx.fillRect(i * w, canvas.height - h, w - 2, h);
       }
-      requestAnimationFrame(draw);
+      raf = requestAnimationFrame(draw);
     };
     draw();
-  }, [analyser]);
+    return () => cancelAnimationFrame(raf);
+  }, [frame]);
   return <canvas ref={canvasRef} width={600} height={120} />;
 }
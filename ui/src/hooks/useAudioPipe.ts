@@ -1,55 +1,119 @@
 import { useEffect, useRef, useState } from "react";
-import type { AvatarEvent } from "../types";
+import type { AvatarEvent, PcmFormat, Viseme } from "../types";
+import { PCM_HEADER_BYTES, PCM_FMT_I16 } from "../types";
 
-export function useAudioPipe(wsUrl = "ws://localhost:8765") {
+// What's audible right now, from the server's intensity/viseme events (no analyser/FFT here)
+export type AudioFrame = { rms: number, bands: number[], viseme: Viseme, strength: number };
+
+// One TTS message on the AudioContext clock: start = when its first sample plays
+type Timeline = {
+  start: number | null, frameS: number, nb: number, rms: number[], bands: number[],
+  visemes: { at: number, id: Viseme, strength: number }[], vi: number, ended: boolean,
+};
+
+const SILENT: AudioFrame = { rms: 0, bands: [], viseme: 'sil', strength: 0 };
+
+export function useAudioPipe(wsUrl = "ws://localhost:8765", pcmFormat: PcmFormat = 'f32') {
   const ctxRef = useRef<AudioContext | null>(null);
   const nodeRef = useRef<AudioWorkletNode | null>(null);
-  const analyserRef = useRef<AnalyserNode | null>(null);
+  const frameRef = useRef<AudioFrame>(SILENT);
   const [state, setState] = useState<'idle'|'listening'|'thinking'|'speaking'|'error'>('idle');
   const [intensity, setIntensity] = useState(0);
+  const [viseme, setViseme] = useState<Viseme>('sil');
 
   useEffect(() => {
     let ws: WebSocket;
+    let raf = 0;
+    const timelines = new Map<number, Timeline>();
+    let cursor = 0;  // AudioContext time at which the next pushed sample will play
     (async () => {
       const ctx = new AudioContext({ sampleRate: 24000 });
       ctxRef.current = ctx;
       await ctx.audioWorklet.addModule('/audio/worklet-processor.js');
       const node = new AudioWorkletNode(ctx, 'pcm-bridge', { numberOfInputs: 0, numberOfOutputs: 1, outputChannelCount: [1] });
       nodeRef.current = node;
-      const analyser = ctx.createAnalyser(); analyser.fftSize = 2048;
-      node.connect(analyser); analyser.connect(ctx.destination);
-      analyserRef.current = analyser;
+      node.connect(ctx.destination);
 
-      ws = new WebSocket(wsUrl);
+      // PCM format is chosen at connect time; audio arrives as binary frames (see types.ts)
+      ws = new WebSocket(`${wsUrl}${wsUrl.includes('?') ? '&' : '/?'}fmt=${pcmFormat}`);
+      ws.binaryType = 'arraybuffer';
       ws.onmessage = ev => {
+        if (ev.data instanceof ArrayBuffer) {
+          const view = new DataView(ev.data);
+          const fmt = view.getUint8(1);
+          let f32: Float32Array;
+          if (fmt === PCM_FMT_I16) {
+            const i16 = new Int16Array(ev.data, PCM_HEADER_BYTES);
+            f32 = new Float32Array(i16.length);
+            for (let i = 0; i < i16.length; i++) f32[i] = i16[i] / 32768;
+          } else {
+            f32 = new Float32Array(ev.data, PCM_HEADER_BYTES);
+          }
+          // the worklet plays pushes back to back, so the clock position follows from the sample count
+          cursor = Math.max(cursor, ctx.currentTime);
+          const tl = timelines.get(view.getUint32(4, true));
+          if (tl && tl.start === null) tl.start = cursor;
+          cursor += f32.length / ctx.sampleRate;
+          node.port.postMessage({ type: 'push', buffer: f32 });
+          return;
+        }
         const msg: AvatarEvent = JSON.parse(ev.data);
         if (msg.type === 'state') setState(msg.value);
-        if (msg.type === 'tts_begin') setState('speaking');
-        if (msg.type === 'tts_end') setState('idle');
-        if (msg.type === 'tts_chunk') {
-          const b = atob(msg.pcm);
-          const buf = new Float32Array(b.length / 4);
-          const dv = new DataView(new ArrayBuffer(b.length));
-          for (let i = 0; i < b.length; i++) dv.setUint8(i, b.charCodeAt(i));
-          const f32 = new Float32Array(dv.buffer);
-          node.port.postMessage({ type: 'push', buffer: f32 });
+        if (msg.type === 'tts_begin') {
+          setState('speaking');
+          timelines.set(msg.mid, { start: null, frameS: (msg.frame_ms ?? 20) / 1000, nb: 0, rms: [], bands: [],
+                                   visemes: [], vi: 0, ended: false });
+        }
+        if (msg.type === 'features') {
+          const tl = timelines.get(msg.mid);
+          if (tl) for (const fe of msg.events) {
+            if (fe.type === 'intensity') { tl.nb = fe.nb; tl.rms.push(...fe.rms); tl.bands.push(...fe.bands); }
+            if (fe.type === 'viseme') tl.visemes.push(fe);
+          }
+        }
+        if (msg.type === 'tts_end') {
+          setState('idle');
+          const tl = msg.mid !== null ? timelines.get(msg.mid) : undefined;
+          if (tl) tl.ended = true;
+        }
+        if (msg.type === 'tts_cancel') {
+          node.port.postMessage({ type: 'flush' });
+          timelines.clear();
+          cursor = ctx.currentTime;
         }
       };
 
-      // RMS + sibilant band (2–6kHz)
-      const data = new Float32Array(analyser.frequencyBinCount);
+      // per animation frame: index into the timeline of whatever is playing
       const sample = () => {
-        analyser.getFloatTimeDomainData(data);
-        let sum = 0; for (let i=0;i<data.length;i++) sum += data[i]*data[i];
-        const rms = Math.sqrt(sum / data.length);
-        setIntensity(Math.min(1, rms * 8)); // scale
-
-        requestAnimationFrame(sample);
+        const now = ctx.currentTime - (ctx.outputLatency || 0);
+        let frame = SILENT;
+        for (const [mid, tl] of timelines) {
+          if (tl.start === null || now < tl.start) continue;
+          const idx = Math.floor((now - tl.start) / tl.frameS);
+          if (idx >= tl.rms.length) {
+            if (tl.ended) timelines.delete(mid);
+            continue;
+          }
+          const pos = now - tl.start;
+          while (tl.vi + 1 < tl.visemes.length && tl.visemes[tl.vi + 1].at <= pos) tl.vi++;
+          const v = tl.visemes[tl.vi];
+          frame = {
+            rms: tl.rms[idx] / 100,
+            bands: tl.bands.slice(idx * tl.nb, (idx + 1) * tl.nb).map(b => b / 100),
+            viseme: v && v.at <= pos ? v.id : 'sil',
+            strength: v && v.at <= pos ? v.strength : 0,
+          };
+          break;
+        }
+        frameRef.current = frame;
+        setIntensity(prev => Math.abs(prev - frame.rms) > 0.01 ? frame.rms : prev);
+        setViseme(frame.viseme);
+        raf = requestAnimationFrame(sample);
       };
       sample();
     })();
-    return () => { ws?.close(); ctxRef.current?.close(); }
-  }, [wsUrl]);
+    return () => { cancelAnimationFrame(raf); ws?.close(); ctxRef.current?.close(); }
+  }, [wsUrl, pcmFormat]);
 
-  return { state, intensity, analyser: analyserRef.current };
+  return { state, intensity, viseme, frame: frameRef };
 }
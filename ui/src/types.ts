@@ -1,8 +1,49 @@
 export type AvatarEvent =
   | {type:'state', value:'idle'|'listening'|'thinking'|'speaking'|'error'}
   | {type:'emotion', value:'neutral'|'mischief'|'annoyed'|'warm'|'deadpan'}
-  | {type:'intensity', value:number}
-  | {type:'tts_begin', id:string, sr:number}
-  | {type:'tts_chunk', id:string, ts:number, pcm:string} // base64 Float32
-  | {type:'tts_end', id:string}
-  | {type:'viseme', at:number, id:string, strength:number};
+  | {type:'tts_begin', id:string, sr:number, mid:number, frame_ms?:number, band_hz?:number[]}
+  | {type:'tts_end', id:string, mid:number|null}
+  | {type:'tts_cancel', id:string, mid:number|null}   // barge-in: drop queued audio
+  | {type:'features', mid:number, events:(IntensityEvent|VisemeEvent)[]}   // one per audio chunk
+  | {type:'metrics', turn_id:string|null, stages:Record<string, {p50_ms:number, p95_ms:number, n:number}>};
+
+export type IntensityEvent = {type:'intensity', mid:number, at:number, value:number, rms:number[], nb:number, bands:number[]};
+export type VisemeEvent = {type:'viseme', mid:number, at:number, id:Viseme, strength:number, src:'phoneme'|'audio'};
+
+// intensity/viseme are computed server-side (audio_features.py) and sent just ahead of the
+// PCM they describe, batched per audio chunk in one 'features' message (shed together with that
+// chunk's PCM when a client falls behind). `at` is seconds into the message's audio (sample
+// offset / sr), so a client that knows when the message started playing can animate without
+// its own analyser/FFT.
+//   intensity: per frame (tts_begin.frame_ms) rms 0-100, and nb band energies 0-100 per frame
+//              (row-major; band edges in tts_begin.band_hz). value = the chunk's peak rms 0-1.
+//   viseme:    a change of mouth shape; holds until the next one.
+export type Viseme = 'sil'|'PP'|'FF'|'TH'|'DD'|'kk'|'CH'|'SS'|'nn'|'RR'|'aa'|'E'|'ih'|'oh'|'ou';
+
+// TTS audio arrives as binary WebSocket frames, not JSON:
+//   u8 kind (1 = PCM), u8 fmt (0 = float32, 1 = int16), u16 version,
+//   u32 mid (matches tts_begin.mid), u32 seq, f64 ts, then raw little-endian PCM.
+export type PcmFormat = 'f32' | 'i16';
+export const PCM_HEADER_BYTES = 20;
+export const PCM_FMT_I16 = 1;
+
+// Text sessions (turn_engine.py). Connect with ?session=<id> to keep one conversation across
+// reconnects; replies go to that session's sockets only.
+export type ClientMessage =
+  | {type:'text', text:string, id?:string}   // queue a turn; id is echoed back
+  | {type:'cancel'}                          // stop the reply in flight, drop queued turns
+  | {type:'stats'};                          // answered with one 'sessions' message
+
+export type WaitStats = {p50_ms:number|null, p95_ms:number|null, n:number};
+export type SessionEvent =
+  | {type:'queued', id:string|null, ahead:number}
+  | {type:'reply_begin', id:string|null, turn_id:string, queued_ms:number}
+  | {type:'reply_delta', id:string|null, text:string}
+  | {type:'reply_end', id:string|null, turn_id:string, text:string, cancelled:boolean, preempted:boolean,
+     queued_ms:number, llm_wait_ms:number, total_ms:number}
+  | {type:'error', id?:string|null, error:string}
+  | {type:'sessions',   // also broadcast periodically
+     llm:{max_concurrent:number, voice_reserve:number, active:number, waiting:number, served:number,
+          preempted:number},
+     sessions:Record<string, {kind:'voice'|'text', queue_depth:number, busy:boolean, turns:number,
+                              queue_wait:WaitStats, llm_wait:WaitStats, idle_s:number}>};
@@ -1,17 +1,22 @@
 #!/bin/bash
-# watchdog.sh — restart on crash, capture logs
+# watchdog.sh — start the supervisor (warm-standby failover lives in supervisor.py), capture logs.
+# Worker crashes are handled inside the supervisor; this only restarts the supervisor itself.
 
 while true; do
-  echo "Starting Elysia $(date)" >> watchdog.log
-  python3 main_app.py
+  echo "Starting Elysia supervisor $(date)" >> watchdog.log
+  python3 supervisor.py
   code=$?
-  if [ $code -ne 0 ]; then
-    echo "Crash (exit $code) $(date)" >> watchdog.log
-    tail -n 40 elysia.log > last_crash_snippet.log
-    # main_app writes crash_info.txt; just pause and relaunch
-    sleep 2
-  else
+  if [ $code -eq 0 ]; then
     echo "Normal exit $(date)" >> watchdog.log
     break
+  elif [ $code -eq 2 ]; then
+    # crash loop: restarting would just loop again; see supervisor_events.ndjson
+    echo "Crash loop detected, giving up (exit $code) $(date)" >> watchdog.log
+    tail -n 40 elysia.log > last_crash_snippet.log
+    break
+  else
+    echo "Supervisor died (exit $code) $(date)" >> watchdog.log
+    tail -n 40 elysia.log > last_crash_snippet.log
+    sleep 2
   fi
 done